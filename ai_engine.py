@@ -1,64 +1,66 @@
-import google.generativeai as genai
 import os
-
-WORKING_MODEL_CACHE = {}
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import response_cache
+import model_registry
+import request_scheduler
+import structured_output
+import token_estimator
+from google.api_core import exceptions as api_exceptions
 
 def get_working_model_name(api_key):
     """
-    Configures API and finds a working model name dynamically.
+    Finds a working model name dynamically for this API key.
     Prioritizes 'flash' models, then 'pro', then falls back to any available.
-    Returns the model name string.
+    Returns the model name string. The choice is cached by model_registry
+    (shared by all sessions, persisted on disk with a TTL).
     """
     if not api_key:
         raise ValueError("API Key is empty.")
     
     # Use cached model if available
-    if api_key in WORKING_MODEL_CACHE:
-        return WORKING_MODEL_CACHE[api_key]
-    
-    genai.configure(api_key=api_key)
+    model_name = model_registry.get_model_name(api_key)
+    if model_name:
+        return model_name
     
-    try:
-        models = list(genai.list_models())
-    except Exception as e:
-        raise Exception(f"Failed to list models: {e}")
-
-    # Filter for models that support content generation
-    supported_models = [m for m in models if 'generateContent' in m.supported_generation_methods]
-    
-    if not supported_models:
-        raise Exception("No models found that support content generation.")
-    
-    # Priority logic with caching
-    model_name = None
-    for m in supported_models:
-        if 'flash' in m.name.lower():
-            model_name = m.name
-            break
-    if model_name is None:
-        for m in supported_models:
-            if 'pro' in m.name.lower():
-                model_name = m.name
-                break
-    if model_name is None:
-        model_name = supported_models[0].name
-    # Cache and return
-    WORKING_MODEL_CACHE[api_key] = model_name
-    return model_name
-
-def generate_analysis(prompt_text, api_key):
+    # One lookup per key even when several analysis threads start at once
+    with model_registry.key_lock(api_key):
+        return model_registry.get_model_name(api_key) or model_registry.discover_model_name(api_key)
+
+def generate_analysis(prompt_text, api_key, use_cache=True, priority=request_scheduler.NORMAL, generation_config=None, kind="other", cacheable=None):
     """
     Generate content using a dynamically selected working model.
+    Responses are cached on disk by model + prompt; pass use_cache=False
+    when a fresh answer is wanted (brainstorm variations, connection test).
+    The API call goes through request_scheduler (rate limit, retries,
+    priority: INTERACTIVE edits run before BULK analyses).
+    generation_config is passed to generate_content (e.g. JSON mode).
+    kind labels the call for token_estimator calibration ("creative", "ai_fix"...).
+    cacheable(text) -> bool, if given, keeps unusable responses out of the
+    cache (and ignores such cached entries).
     """
     try:
         # Get the best available model
         model_name = get_working_model_name(api_key)
         
-        # Initialize model
-        model = genai.GenerativeModel(model_name)
+        # Cache hit: no API call, so nothing is added to the cost tracker
+        if use_cache:
+            cached_text = response_cache.get(model_name, prompt_text, extra=generation_config)
+            if cached_text is not None and (cacheable is None or cacheable(cached_text)):
+                return cached_text
+        
+        # Shared model/client for this key (no per-call setup)
+        model = model_registry.get_model(api_key, model_name)
         
-        # Generate
-        response = model.generate_content(prompt_text)
+        # Generate (timed without the queue wait, for latency calibration)
+        timing = {}
+        def call():
+            start = time.perf_counter()
+            result = model.generate_content(prompt_text, generation_config=generation_config)
+            timing["seconds"] = time.perf_counter() - start
+            return result
+        response = request_scheduler.run(call, api_key, priority)
         
         # Capture usage metadata
         try:
@@ -69,17 +71,223 @@ def generate_analysis(prompt_text, api_key):
             
             # Update cost session
             utils.update_cost_session(in_tok, out_tok)
+            token_estimator.observe(prompt_text, in_tok, out_tok, timing.get("seconds"), kind)
         except Exception as e:
             print(f"Failed to capture token usage: {e}")
+        
+        if use_cache and (cacheable is None or cacheable(response.text)):
+            response_cache.put(model_name, prompt_text, response.text, extra=generation_config)
             
         return response.text
     except Exception as e:
         raise e
 
-def analyze_script_creative(script_text, api_key):
+def generate_analysis_stream(prompt_text, api_key, use_cache=True, priority=request_scheduler.NORMAL, kind="other"):
+    """
+    Streaming variant of generate_analysis: yields text chunks as Gemini
+    produces them (for st.write_stream). Token usage is recorded and the
+    full response cached once the stream has finished.
+    """
+    model_name = get_working_model_name(api_key)
+    
+    if use_cache:
+        cached_text = response_cache.get(model_name, prompt_text)
+        if cached_text is not None:
+            yield cached_text
+            return
+    
+    model = model_registry.get_model(api_key, model_name)
+    stream_state = {}
+    
+    def open_stream():
+        stream_state["started"] = time.perf_counter()
+        response = model.generate_content(prompt_text, stream=True)
+        stream_state["response"] = response
+        yield from response
+    
+    parts = []
+    for chunk in request_scheduler.stream(open_stream, api_key, priority):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. a trailing finish_reason chunk)
+            continue
+        if text:
+            parts.append(text)
+            yield text
+    
+    # usage_metadata is complete only after the last chunk
+    try:
+        import utils
+        usage = stream_state["response"].usage_metadata
+        utils.update_cost_session(usage.prompt_token_count, usage.candidates_token_count)
+        token_estimator.observe(prompt_text, usage.prompt_token_count, usage.candidates_token_count,
+                                time.perf_counter() - stream_state["started"], kind)
+    except Exception as e:
+        print(f"Failed to capture token usage: {e}")
+    
+    if use_cache:
+        response_cache.put(model_name, prompt_text, "".join(parts))
+
+def generate_structured(prompt_text, api_key, schema, fallback, use_cache=True, priority=request_scheduler.NORMAL, kind="other"):
+    """
+    JSON output through the structured layer: asks Gemini for JSON matching
+    `schema`, repairs and validates the answer locally (structured_output).
+    Returns the parsed data, or fallback(raw_text, error) when nothing can be
+    recovered. No re-generation is attempted. Only answers that parse and
+    validate are cached, so a broken one is not replayed.
+    """
+    parsed = {}
+    def cacheable(text):
+        try:
+            parsed[text] = structured_output.parse_structured(text, schema)
+        except structured_output.StructuredOutputError as e:
+            parsed[text] = e
+            return False
+        return not parsed[text][1]
+    
+    config = structured_output.generation_config(schema)
+    try:
+        response_text = generate_analysis(prompt_text, api_key, use_cache, priority, generation_config=config,
+                                          kind=kind, cacheable=cacheable)
+    except api_exceptions.InvalidArgument:
+        # Model without schema support: JSON mode only, the local parser does the rest
+        config = structured_output.generation_config(None)
+        response_text = generate_analysis(prompt_text, api_key, use_cache, priority, generation_config=config,
+                                          kind=kind, cacheable=cacheable)
+    
+    result = parsed.get(response_text)
+    if result is None:
+        cacheable(response_text)  # use_cache=False: not parsed yet
+        result = parsed[response_text]
+    if isinstance(result, structured_output.StructuredOutputError):
+        print(f"Structured output error: {result}. Raw: {response_text[:500]}")
+        return fallback(response_text, result)
+    data, errors = result
+    if errors:
+        print(f"Structured output schema issues: {errors[:5]}")
+    return data
+
+def _with_script_context(fn):
+    """
+    Wrap fn so it runs with the caller's Streamlit script context: worker
+    threads can then reach st.session_state (utils.update_cost_session).
+    """
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return fn
+    if ctx is None:
+        return fn
+
+    def run(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+    return run
+
+# ============================================================================
+# MAP-REDUCE FOR LONG SCRIPTS
+# ============================================================================
+
+# Scripts above one chunk are analysed chunk by chunk, then the notes are
+# reduced with the normal prompt, so the output structure stays the same.
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", "30000"))
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+
+def compile_scenes(scenes):
+    """Same layout as app.compile_script_from_scenes."""
+    return "\n\n".join(f"{scene['header']}\n\n{scene['content']}" for scene in scenes).strip()
+
+def chunk_scenes(scenes, max_tokens=None):
+    """
+    Groups consecutive scenes into chunks of about max_tokens. Chunks never
+    split a scene and are balanced, so the last one is not a small remainder.
+    A single scene larger than the budget becomes its own chunk.
+    """
+    max_tokens = max_tokens or ANALYSIS_CHUNK_TOKENS
+    sizes = [token_estimator.count_tokens(f"{scene['header']}\n\n{scene['content']}") for scene in scenes]
+    total = sum(sizes)
+    if total <= max_tokens:
+        return [list(scenes)] if scenes else []
+
+    target = total / -(-total // max_tokens)
+    chunks, current, current_size = [], [], 0
+    for scene, size in zip(scenes, sizes):
+        if current and (current_size + size > max_tokens or current_size >= target):
+            chunks.append(current)
+            current, current_size = [], 0
+        current.append(scene)
+        current_size += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def needs_map_reduce(scenes, max_tokens=None):
+    return bool(scenes) and len(chunk_scenes(scenes, max_tokens)) > 1
+
+def map_scene_chunks(scenes, instruction, api_key, max_tokens=None, concurrency=None):
+    """
+    Map step: runs `instruction` on every chunk in parallel and returns the
+    partial notes, in script order, as one text block for the reduce prompt.
+    """
+    chunks = chunk_scenes(scenes, max_tokens)
+    total = len(chunks)
+
+    def analyze_chunk(number, chunk):
+        label = f"PHẦN {number}/{total} (CẢNH {chunk[0]['id']} → {chunk[-1]['id']})"
+        prompt = f"{instruction}\n\n---\n{label}:\n{compile_scenes(chunk)}"
+        return f"--- {label} ---\n{generate_analysis(prompt, api_key, priority=request_scheduler.BULK, kind='map')}"
+
+    get_working_model_name(api_key)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency or ANALYSIS_CONCURRENCY, total))) as executor:
+        futures = [executor.submit(_with_script_context(analyze_chunk), number, chunk)
+                   for number, chunk in enumerate(chunks, start=1)]
+        return "\n\n".join(future.result() for future in futures)
+
+def build_script_prompt(system_prompt, script_text, scenes, notes_instruction, api_key, max_tokens=None, concurrency=None):
+    """
+    Full prompt for a whole-script analysis: the script itself when it fits
+    in one chunk, otherwise the per-chunk notes (map) to be reduced by the
+    same system prompt.
+    """
+    if scenes is not None and needs_map_reduce(scenes, max_tokens):
+        notes = map_scene_chunks(scenes, notes_instruction, api_key, max_tokens, concurrency)
+        return (f"{system_prompt}\n\n---\nKịch bản quá dài nên đã được phân tích theo từng phần. "
+                f"Dựa trên GHI CHÚ TỪNG PHẦN dưới đây, hãy đưa ra đánh giá cho TOÀN BỘ kịch bản:\n{notes}")
+    return f"{system_prompt}\n\n---\nNỘI DUNG KỊCH BẢN:\n{script_text}"
+
+def estimate_script_pass(script_text, scenes, kind, max_tokens=None, concurrency=None):
+    """
+    Pre-flight estimate for one build_script_prompt analysis: the chunk
+    calls (parallel, map-reduce) followed by the final call, or one call.
+    """
+    if scenes is not None and needs_map_reduce(scenes, max_tokens):
+        maps = token_estimator.combine(
+            (token_estimator.estimate_text_call(compile_scenes(chunk), "map") for chunk in chunk_scenes(scenes, max_tokens)),
+            parallel=True, concurrency=concurrency or ANALYSIS_CONCURRENCY
+        )
+        final = token_estimator.estimate_call(maps["output_tokens"] + token_estimator.PROMPT_OVERHEAD_TOKENS, kind)
+        return token_estimator.combine([maps, final])
+    return token_estimator.estimate_text_call(script_text, kind)
+
+CREATIVE_NOTES_INSTRUCTION = """
+Bạn là Script Doctor. Đây là MỘT PHẦN của một kịch bản dài (Kinh dị/Thriller).
+Ghi chú ngắn gọn (Markdown, tối đa ~400 từ) về phần này: cấu trúc và điểm nút, nhân vật và thoại,
+độ căng thẳng/không khí, các thoại "tell" nên chuyển thành hình ảnh. Luôn ghi kèm Scene ID.
+"""
+
+MARKETING_NOTES_INSTRUCTION = """
+You are Maya, a film marketing strategist. This is ONE PART of a long screenplay.
+Write short notes (Markdown, max ~400 words, in Vietnamese) on this part only: hooks and marketable
+moments, genre signals, target-audience appeal, trailer-worthy scenes (with scene IDs), and risks.
+"""
+
+def analyze_script_creative(script_text, api_key, scenes=None, chunk_tokens=None, concurrency=None):
     """
     Analyzes the full script from the Creative/Script Doctor perspective,
     returning structured JSON data for progressive disclosure on the UI.
+    With `scenes`, long scripts are analysed chunk by chunk (map-reduce).
     """
     system_prompt = """
     Bạn là một Script Doctor chuyên nghiệp.
@@ -112,42 +320,21 @@ def analyze_script_creative(script_text, api_key):
     }
     """
     
-    full_prompt = f"{system_prompt}\n\n---\nNỘI DUNG KỊCH BẢN:\n{script_text}"
-    
-    response_text = generate_analysis(full_prompt, api_key)
+    full_prompt = build_script_prompt(system_prompt, script_text, scenes, CREATIVE_NOTES_INSTRUCTION, api_key, chunk_tokens, concurrency)
     
-    # 1. Clean Markdown code block indicators
-    cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-    
-    # 2. Aggressive cleanup for common JSON escape issues (Crucial fix)
-    # This step replaces problematic newline/tab characters that AI often includes in JSON strings
-    cleaned_text = cleaned_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-    
-    # 3. Attempt to handle escaped double quotes within strings (simple cases)
-    # This is a common issue when AI uses " in a string that is already quoted.
-    try:
-        # A risky but sometimes necessary fix: Load as string, then re-dump to standardize escaping
-        # Note: This requires the AI output to be very close to valid JSON already.
-        import re
-        # Find and replace internal quote escapes (\") which Streamlit's JSON doesn't handle well
-        # This part might need further refinement depending on the AI's exact error pattern
-        # For now, let's trust the AI to reduce \n/t characters due to the prompt instruction
-        pass
-    except Exception as e:
-        print(f"Cleanup adjustment failed: {e}")
+    return generate_structured(
+        full_prompt, api_key, structured_output.CREATIVE_SCHEMA,
+        # Fallback if no JSON can be recovered - return raw text for debugging
+        lambda raw, e: {"error": True, "raw_content": raw, "structure": {"summary": "Lỗi định dạng JSON từ AI", "detail": f"Không thể phân tích cú pháp JSON: {e}"}},
+        priority=request_scheduler.BULK, kind="creative"
+    )
 
-
-    try:
-        return json.loads(cleaned_text)
-    except json.JSONDecodeError as e:
-        print(f"JSON Decode Error at final attempt: {e}")
-        # Fallback if JSON is still invalid - return raw text for debugging
-        return {"error": True, "raw_content": response_text, "structure": {"summary": "Lỗi định dạng JSON từ AI", "detail": f"Không thể phân tích cú pháp JSON: {e}"}}
-
-def analyze_script_marketing(script_text, api_key):
+def analyze_script_marketing(script_text, api_key, scenes=None, chunk_tokens=None, concurrency=None, stream=False):
     """
     Analyzes the full script from the Marketing/Commercial viability perspective.
     Uses Maya persona - a film marketing strategist with 20 years of experience.
+    With `scenes`, long scripts are analysed chunk by chunk (map-reduce).
+    stream=True returns a generator of Markdown chunks instead of the text.
     """
     system_prompt = """
     You are Maya, a film marketing strategist with 20 years of experience who has advised on more than 200 Vietnamese and international theatrical releases.
@@ -236,17 +423,16 @@ def analyze_script_marketing(script_text, api_key):
     - Use Markdown formatting for clear sections.
     """
     
-    full_prompt = f"{system_prompt}\n\n---\nNỘI DUNG KỊCH BẢN:\n{script_text}"
+    full_prompt = build_script_prompt(system_prompt, script_text, scenes, MARKETING_NOTES_INSTRUCTION, api_key, chunk_tokens, concurrency)
     
-    return generate_analysis(full_prompt, api_key)
+    if stream:
+        return generate_analysis_stream(full_prompt, api_key, priority=request_scheduler.BULK, kind="marketing")
+    return generate_analysis(full_prompt, api_key, priority=request_scheduler.BULK, kind="marketing")
 
 def synthesize_analysis_summary(creative_report, marketing_report, api_key):
     """
     Compares the two reports and finds common points for a summary table (JSON).
     """
-    # Import json here if not already imported at top of ai_engine.py
-    import json 
-    
     system_prompt = """
     Bạn là chuyên gia Tổng hợp. Nhiệm vụ của bạn là so sánh 2 bản phân tích dưới đây (Sáng tạo và Marketing) và rút ra các điểm đồng nhất quan trọng nhất (những vấn đề hoặc thế mạnh được nhắc đến trong cả hai báo cáo).
     
@@ -262,37 +448,100 @@ def synthesize_analysis_summary(creative_report, marketing_report, api_key):
     """
     
     full_prompt = f"{system_prompt}\n\n--- BÁO CÁO SÁNG TẠO ---\n{creative_report}\n\n--- BÁO CÁO MARKETING ---\n{marketing_report}"
-    response_text = generate_analysis(full_prompt, api_key)
-    
-    # Clean and parse JSON
-    cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-    
+    return generate_structured(
+        full_prompt, api_key, structured_output.SUMMARY_SCHEMA,
+        lambda raw, e: [{"Dạng vấn đề": "Lỗi định dạng JSON", "Mô tả chi tiết": "Không thể tạo bảng tóm tắt."}],
+        priority=request_scheduler.BULK, kind="summary"
+    )
+
+def _timed(fn, *args):
+    """Returns (result, error, seconds) instead of raising."""
+    start = time.perf_counter()
     try:
-        return json.loads(cleaned_text)
-    except json.JSONDecodeError:
-        print(f"JSON Decode Error in synthesize_analysis_summary. Raw: {cleaned_text}")
-        return [{"Dạng vấn đề": "Lỗi định dạng JSON", "Mô tả chi tiết": "Không thể tạo bảng tóm tắt."}]
+        return fn(*args), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
 
-def run_dual_analysis(script_text, api_key):
+def run_dual_analysis(script_text, api_key, scenes=None, chunk_tokens=None, concurrency=None, render_marketing=None):
     """
     Main entry point for dual analysis.
+    The creative and marketing passes only need the script text, so they run
+    concurrently; the summary starts as soon as both are back. A failed pass
+    is reported in "errors" without discarding the other one.
+    Passing `scenes` enables map-reduce for scripts longer than chunk_tokens.
+    render_marketing(chunks) -> text (e.g. st.write_stream) streams the
+    marketing report; it is called on the caller's thread.
     """
-    creative_report = analyze_script_creative(script_text, api_key)
-    marketing_report = analyze_script_marketing(script_text, api_key)
+    started = time.perf_counter()
+    
+    # Resolve the model once up front so the two threads don't both list models
+    get_working_model_name(api_key)
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        creative_future = executor.submit(_with_script_context(_timed), analyze_script_creative,
+                                          script_text, api_key, scenes, chunk_tokens, concurrency)
+        if render_marketing is None:
+            marketing_future = executor.submit(_with_script_context(_timed), analyze_script_marketing,
+                                               script_text, api_key, scenes, chunk_tokens, concurrency)
+            marketing_report, marketing_error, marketing_seconds = marketing_future.result()
+        else:
+            # UI rendering must stay on the script thread; creative runs meanwhile
+            marketing_report, marketing_error, marketing_seconds = _timed(
+                lambda: render_marketing(analyze_script_marketing(script_text, api_key, scenes, chunk_tokens, concurrency, stream=True))
+            )
+        creative_report, creative_error, creative_seconds = creative_future.result()
+    
+    errors = {}
+    if creative_error:
+        errors["creative"] = str(creative_error)
+    if marketing_error:
+        errors["marketing"] = str(marketing_error)
+    if len(errors) == 2:
+        raise Exception(f"Cả hai lượt phân tích đều lỗi. Sáng tạo: {errors['creative']} | Marketing: {errors['marketing']}")
+    
+    timings = {"creative": round(creative_seconds, 2), "marketing": round(marketing_seconds, 2)}
     
     # Run synthesis only if both reports are valid text
     if creative_report and marketing_report:
-        summary_table = synthesize_analysis_summary(creative_report, marketing_report, api_key)
+        summary_table, summary_error, summary_seconds = _timed(synthesize_analysis_summary, creative_report, marketing_report, api_key)
+        timings["summary"] = round(summary_seconds, 2)
+        if summary_error:
+            errors["summary"] = str(summary_error)
+            summary_table = [{"Dạng vấn đề": "Lỗi Tổng hợp", "Mô tả chi tiết": str(summary_error)}]
     else:
         summary_table = [{"Dạng vấn đề": "Lỗi Phân tích", "Mô tả chi tiết": "Một trong hai báo cáo chi tiết không thể tạo."}]
+    
+    timings["total"] = round(time.perf_counter() - started, 2)
         
     return {
         "creative": creative_report,
         "marketing": marketing_report,
-        "summary": summary_table
+        "summary": summary_table,
+        "timings": timings,
+        "errors": errors
     }
 
-import json
+def estimate_dual_analysis(script_text, scenes=None, chunk_tokens=None, concurrency=None):
+    """
+    Pre-flight estimate for run_dual_analysis: both passes in parallel, then
+    the summary, capped below by the scheduler's rate limit.
+    """
+    creative = estimate_script_pass(script_text, scenes, "creative", chunk_tokens, concurrency)
+    marketing = estimate_script_pass(script_text, scenes, "marketing", chunk_tokens, concurrency)
+    summary = token_estimator.estimate_call(
+        creative["output_tokens"] + marketing["output_tokens"] + token_estimator.PROMPT_OVERHEAD_TOKENS, "summary"
+    )
+    total = token_estimator.combine([token_estimator.combine([creative, marketing], parallel=True), summary])
+    scheduler = request_scheduler.scheduler
+    return token_estimator.with_rate_limit(total, scheduler.requests_per_minute, scheduler.burst)
+
+def estimate_action_plan(scene_list, user_strategy):
+    """Pre-flight estimate for generate_action_plan (one call over every scene)."""
+    return token_estimator.estimate_text_call(f"{user_strategy}\n{compile_scenes(scene_list)}", "action_plan")
+
+def estimate_scene_action(scene_text, kind):
+    """Pre-flight estimate for a single-scene call (brainstorm, ai_fix, dialogue_fix...)."""
+    return token_estimator.estimate_text_call(scene_text, kind)
 
 def generate_action_plan(scene_list, user_strategy, api_key):
     """
@@ -340,17 +589,12 @@ def generate_action_plan(scene_list, user_strategy, api_key):
     
     full_prompt = f"{system_prompt}\n\n---\nNỘI DUNG KỊCH BẢN ĐÃ ĐÁNH DẤU:\n{formatted_script}"
     
-    response_text = generate_analysis(full_prompt, api_key)
-    
-    # Clean response to ensure valid JSON
-    cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-    
-    try:
-        return json.loads(cleaned_text)
-    except json.JSONDecodeError:
-        # Fallback if JSON is invalid
-        print(f"JSON Decode Error. Raw text: {cleaned_text}")
-        return [{"task_name": "Lỗi định dạng JSON từ AI", "related_scenes": [], "raw_content": response_text}]
+    return generate_structured(
+        full_prompt, api_key, structured_output.ACTION_PLAN_SCHEMA,
+        # Fallback if no JSON can be recovered
+        lambda raw, e: [{"task_name": "Lỗi định dạng JSON từ AI", "related_scenes": [], "raw_content": raw}],
+        priority=request_scheduler.BULK, kind="action_plan"
+    )
 
 def brainstorm_scene(scene_text, instruction, api_key):
     """
@@ -377,16 +621,12 @@ def brainstorm_scene(scene_text, instruction, api_key):
     """
     
     full_prompt = f"{system_prompt}\n\n---\nSCENE GỐC:\n{scene_text}"
-    response_text = generate_analysis(full_prompt, api_key)
-    
-    # Clean and parse JSON
-    cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-    
-    try:
-        return json.loads(cleaned_text)
-    except json.JSONDecodeError:
-        print(f"JSON Decode Error in brainstorm_scene. Raw: {cleaned_text}")
-        return [{"title": "Lỗi JSON", "content": response_text}]
+    # Re-running a brainstorm should give new options, not the cached ones
+    return generate_structured(
+        full_prompt, api_key, structured_output.BRAINSTORM_SCHEMA,
+        lambda raw, e: [{"title": "Lỗi JSON", "content": raw}],
+        use_cache=False, priority=request_scheduler.INTERACTIVE, kind="brainstorm"
+    )
 
 def convert_dialogue_to_visual(scene_text, api_key):
     """
@@ -415,21 +655,16 @@ def convert_dialogue_to_visual(scene_text, api_key):
     """
     
     full_prompt = f"{system_prompt}\n\n---\nNỘI DUNG SCENE:\n{scene_text}"
-    response_text = generate_analysis(full_prompt, api_key)
-    
-    # Clean and parse JSON
-    cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-    
-    try:
-        return json.loads(cleaned_text)
-    except json.JSONDecodeError:
-        print(f"JSON Decode Error in convert_dialogue_to_visual. Raw: {cleaned_text}")
-        return []
+    return generate_structured(
+        full_prompt, api_key, structured_output.DIALOGUE_FIX_SCHEMA,
+        lambda raw, e: [],
+        priority=request_scheduler.INTERACTIVE, kind="dialogue_fix"
+    )
 
-def refine_generated_option(current_option_text, user_instruction, context_scene, api_key):
+def refine_generated_option(current_option_text, user_instruction, context_scene, api_key, stream=False):
     """
     Refines a specific generated option based on user instruction.
-    Returns the refined text string.
+    Returns the refined text string (or a chunk generator with stream=True).
     """
     system_prompt = """
     Bạn là trợ lý biên tập. 
@@ -440,12 +675,14 @@ def refine_generated_option(current_option_text, user_instruction, context_scene
     
     full_prompt = f"{system_prompt}\n\nBỐI CẢNH GỐC:\n{context_scene}\n\nNỘI DUNG HIỆN TẠI:\n{current_option_text}\n\nYÊU CẦU CHỈNH SỬA:\n{user_instruction}\n\n---\nNỘI DUNG ĐÃ SỬA:"
     
-    return generate_analysis(full_prompt, api_key)
+    if stream:
+        return generate_analysis_stream(full_prompt, api_key, use_cache=False, priority=request_scheduler.INTERACTIVE, kind="refine")
+    return generate_analysis(full_prompt, api_key, use_cache=False, priority=request_scheduler.INTERACTIVE, kind="refine")
 
-def ai_fix_scene(scene_id, scene_content, instruction, api_key):
+def ai_fix_scene(scene_id, scene_content, instruction, api_key, stream=False):
     """
     Refines a scene based on a specific instruction from the Action Plan.
-    Returns the refined text string.
+    Returns the refined text string (or a chunk generator with stream=True).
     """
     system_prompt = """
     Bạn là Script Doctor chuyên nghiệp, được giao nhiệm vụ thực thi một lệnh chỉnh sửa kịch bản.
@@ -457,4 +694,6 @@ def ai_fix_scene(scene_id, scene_content, instruction, api_key):
     
     full_prompt = f"{system_prompt}\n\n---BỐI CẢNH & LỆNH SỬA CHO CẢNH {scene_id}--- \n\nLỆNH SỬA: {instruction}\n\nNỘI DUNG CẢNH GỐC:\n{scene_content}\n\n---KẾT QUẢ ĐÃ SỬA:"
     
-    return generate_analysis(full_prompt, api_key)
+    if stream:
+        return generate_analysis_stream(full_prompt, api_key, use_cache=False, priority=request_scheduler.INTERACTIVE, kind="ai_fix")
+    return generate_analysis(full_prompt, api_key, use_cache=False, priority=request_scheduler.INTERACTIVE, kind="ai_fix")
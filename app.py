@@ -3,21 +3,24 @@ import utils
 import os
 import time
 import pandas as pd
+from scene_store import SceneStore
 
 from dotenv import load_dotenv
 load_dotenv()
 
 # Helper function for auto-save
 def auto_save():
-    """Auto-save to both local storage and database (if enabled)"""
+    """Auto-save to local storage, and to the database in the background (if enabled)"""
     # Save to local storage
     utils.save_session_state(st.session_state)
     
-    # Save to database if enabled
+    # Queue a database save: bursts are coalesced and written by save_queue's thread
     try:
         import database
-        if database.is_supabase_enabled() and st.session_state.get('current_project_id'):
-            database.save_current_project()
+        project_id = st.session_state.get('current_project_id')
+        if database.is_supabase_enabled() and project_id:
+            import save_queue
+            save_queue.get_queue().submit(project_id, database.get_project_payload())
     except Exception as e:
         print(f"Database auto-save error: {e}")
 
@@ -562,6 +565,40 @@ def compile_script_from_scenes():
         
     return full_script.strip()
 
+def preflight(estimate):
+    """
+    Shows the pre-flight estimate (tokens, cost, time) for an AI action.
+    Returns False, with an error, when it would exceed the project budget.
+    """
+    import token_estimator
+    allowed, spend = token_estimator.check_budget(token_estimator.ledger_key(st.session_state), estimate)
+    st.caption(
+        f"🧮 Ước tính: ~{estimate['input_tokens']:,} tokens vào · ~{estimate['output_tokens']:,} tokens ra · "
+        f"~${estimate['cost_usd']:.4f} · ~{estimate['seconds']:.0f}s ({estimate['calls']} lượt gọi AI)"
+    )
+    if not allowed:
+        st.error(
+            f"Vượt ngân sách dự án: còn ${max(spend['remaining_usd'], 0):.4f} / ${spend['budget_usd']:.2f}. "
+            "Tăng ngân sách trong Sidebar (💸 Chi phí) để tiếp tục."
+        )
+    return allowed
+
+def cached_estimate(name, compute):
+    """
+    Whole-script estimates shown on every rerun: recomputed only when the
+    scene list changes (SceneStore.version), not on each rerun.
+    """
+    key = (st.session_state['scene_list'].version, st.session_state.get('edit_timestamp'))
+    cache = st.session_state.setdefault('estimate_cache', {})
+    if name not in cache or cache[name][0] != key:
+        cache[name] = (key, compute())
+    return cache[name][1]
+
+def scene_preflight(scene_text, kind):
+    """preflight() for a single-scene AI call (brainstorm, dialogue_fix, ai_fix)."""
+    import ai_engine
+    return preflight(ai_engine.estimate_scene_action(scene_text, kind))
+
 # 1. Config & Init
 st.set_page_config(
     page_title="Script Doctor Pro",
@@ -583,10 +620,18 @@ if saved_data:
         if key not in st.session_state:
             st.session_state[key] = value
 
+# Scenes live in a SceneStore (O(1) lookup by id); saved sessions hold plain dicts
+if st.session_state.get('scene_list') is not None and not isinstance(st.session_state['scene_list'], SceneStore):
+    st.session_state['scene_list'] = SceneStore.from_dicts(st.session_state['scene_list'])
+
 # Default API key from environment if not loaded
 if not st.session_state.get('gemini_api_key'):
     st.session_state['gemini_api_key'] = os.getenv('GEMINI_API_KEY', '')
 
+# Resolve the Gemini model for this key in the background (disk-cached, non-blocking)
+import model_registry
+model_registry.warm_up(st.session_state.get('gemini_api_key'))
+
 # Initialize edit timestamp for UI reactivity
 if 'edit_timestamp' not in st.session_state:
     st.session_state['edit_timestamp'] = 0
@@ -714,6 +759,31 @@ with st.sidebar:
                         if st.button("Hủy", use_container_width=True):
                             st.session_state['show_delete_confirm'] = False
                             st.rerun()
+        
+        # Background save state of the current project (save_queue)
+        if st.session_state.get('current_project_id'):
+            import save_queue
+            save_status = save_queue.get_queue().get_status(st.session_state['current_project_id'])
+            if save_status['state'] == 'pending':
+                st.caption(f"⏳ Đang chờ lưu ({save_status['pending_seconds']:.0f}s, gộp {save_status['coalesced']} lần lưu)")
+            elif save_status['state'] == 'error':
+                retry_text = f", thử lại sau {save_status['retry_in']:.0f}s" if save_status['retry_in'] is not None else ""
+                st.caption(f"⚠️ Lưu lỗi: {save_status['error']}{retry_text}")
+            elif save_status['state'] == 'saved':
+                st.caption(f"✅ Đã lưu lúc {time.strftime('%H:%M:%S', time.localtime(save_status['saved_at']))}")
+        
+        # Shared Supabase client: reuse and request latency
+        db_stats = database.get_client_metrics()
+        st.caption(
+            f"🗃️ Supabase: {db_stats['requests']} request · TB {db_stats['avg_request_seconds'] * 1000:,.0f} ms · "
+            f"client dùng lại {db_stats['reuse_rate']:.0%} · reconnect {db_stats['reconnects']}"
+        )
+        load_stats = database.get_project_load_metrics()
+        if load_stats['loads']:
+            st.caption(
+                f"📂 Mở dự án: {load_stats['last_load_seconds'] * 1000:,.0f} ms ({load_stats['last_method']}) · "
+                f"TB {load_stats['avg_load_seconds'] * 1000:,.0f} ms / {load_stats['loads']} lần"
+            )
     else:
         # Fallback to local storage
         st.warning("⚠️ Supabase chưa được cấu hình")
@@ -771,6 +841,7 @@ with st.sidebar:
         if "gemini_api_key" in st.session_state and st.session_state["gemini_api_key"]:
             try:
                 import ai_engine
+                import request_scheduler
                 # Reload module to ensure latest code is used if modified while running
                 import importlib
                 importlib.reload(ai_engine)
@@ -781,7 +852,8 @@ with st.sidebar:
                 model_name = ai_engine.get_working_model_name(api_key)
                 
                 # Test generation
-                response = ai_engine.generate_analysis("Chào Gemini", api_key)
+                response = ai_engine.generate_analysis("Chào Gemini", api_key, use_cache=False,
+                                                      priority=request_scheduler.INTERACTIVE)
                 
                 st.success(f"Kết nối thành công! 🚀\nModel đang dùng: **{model_name}**")
                 st.toast(f"Gemini ({model_name}): {response}")
@@ -808,8 +880,10 @@ with st.sidebar:
         original_content_map = st.session_state.get('original_content_map', {})
         if not original_content_map:
             # Recreate original content map from the first time the script was loaded
+            # (scenes of a lazily opened project are added on their first edit)
             for scene in scenes:
-                original_content_map[scene['id']] = scene['content']
+                if scene['content'] is not None:
+                    original_content_map[scene['id']] = scene['content']
             st.session_state['original_content_map'] = original_content_map
 
         # Create formatted labels with icons
@@ -821,7 +895,7 @@ with st.sidebar:
             scene_id = s['id']
             # Determine status: 
             # 1. Check if the scene content is different from the original import
-            is_edited = s['content'] != original_content_map.get(scene_id)
+            is_edited = scene_id in original_content_map and s['content'] != original_content_map[scene_id]
             # 2. Check if the scene has been marked as complete in the Action Plan (using a placeholder logic for now)
             is_completed = st.session_state.get('task_completion', {}).get(f"subtask_{scene_id}", False)
             
@@ -843,12 +917,16 @@ with st.sidebar:
         
         # Get selected scene
         selected_index = scene_labels.index(selected_label)
-        selected_scene = scenes[selected_index]
+        # Lazily opened projects fetch the content of this scene's page now
+        selected_scene = scenes.ensure_loaded(selected_index)
         
         # Update target_scene_id to sync
         st.session_state['target_scene_id'] = selected_scene['id']
         
-        st.caption(f"Total: {len(scenes)} scenes")
+        if scenes.fully_loaded:
+            st.caption(f"Total: {len(scenes)} scenes")
+        else:
+            st.caption(f"Total: {len(scenes)} scenes · đã tải nội dung {scenes.loaded_count()} cảnh")
     else:
         st.info("Chưa có kịch bản. Vui lòng Import ở Tab 1.")
     
@@ -866,6 +944,52 @@ with st.sidebar:
         col2.metric("Output", f"{stats['total_output']:,}")
         
         st.metric("Tổng chi phí (Ước tính)", f"${stats['total_usd']:.5f}", help="Dựa trên đơn giá Flash: $0.075/$0.30 per 1M tokens")
+        
+        # Per-project budget: actions whose estimate exceeds what is left are refused
+        import token_estimator
+        budget_project = token_estimator.ledger_key(st.session_state)
+        project_spend = token_estimator.get_spend(budget_project)
+        new_budget = st.number_input(
+            "Ngân sách dự án (USD)", min_value=0.0, step=0.5, format="%.2f",
+            value=float(project_spend['budget_usd']),
+            key=f"project_budget_{budget_project}",
+            help="0 = không giới hạn. Các thao tác AI có chi phí ước tính vượt phần còn lại sẽ bị chặn."
+        )
+        if new_budget != project_spend['budget_usd']:
+            token_estimator.set_budget(budget_project, new_budget)
+            project_spend = token_estimator.get_spend(budget_project)
+        st.caption(
+            f"💼 Dự án đã dùng ${project_spend['spent_usd']:.4f}"
+            + (f" · còn ${max(project_spend['remaining_usd'], 0):.4f}" if project_spend['budget_usd'] else "")
+        )
+        
+        # Response cache: hits are served from disk and cost nothing
+        import response_cache
+        cache_stats = response_cache.get_stats()
+        st.caption(
+            f"🗄️ Cache: {cache_stats['hits']} hit / {cache_stats['misses']} miss "
+            f"({cache_stats['hit_rate']:.0%}) · {cache_stats['entries']} mục, {cache_stats['bytes'] / 1024:,.0f} KB"
+        )
+        
+        # Shared Gemini clients (model_registry): reuse instead of per-call setup
+        import model_registry
+        client_stats = model_registry.get_metrics()
+        st.caption(
+            f"🔌 Client: {client_stats['models_created']} tạo mới / {client_stats['model_reuses']} dùng lại "
+            f"({client_stats['reuse_rate']:.0%})"
+        )
+        
+        # Request scheduler: queue / retries across all sessions
+        import request_scheduler
+        queue_stats = request_scheduler.get_metrics()
+        st.caption(
+            f"🚦 Hàng đợi: {queue_stats['queue_depth']} chờ · {queue_stats['in_flight']} đang chạy · "
+            f"chờ TB {queue_stats['avg_wait_seconds']:.1f}s (p95 {queue_stats['p95_wait_seconds']:.1f}s) · "
+            f"retry {queue_stats['retries']}"
+        )
+        if st.button("Xóa cache AI", use_container_width=True, type="secondary"):
+            response_cache.clear()
+            st.toast("Đã xóa cache phản hồi AI.")
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -882,6 +1006,7 @@ with st.sidebar:
                 try:
                     import export_engine
                     output_docx = "script_export.docx"
+                    st.session_state['scene_list'].load_all()
                     export_engine.create_screenplay_docx(st.session_state['scene_list'], output_docx)
                     
                     with open(output_docx, "rb") as f:
@@ -908,25 +1033,87 @@ with tab1:
     
     # 1. IMPORT SECTION (Only visible if no script is loaded)
     if 'scene_list' not in st.session_state or not st.session_state['scene_list']:
-        st.info("Chưa có kịch bản. Vui lòng tải lên file PDF để bắt đầu dự án.")
-        uploaded_file = st.file_uploader("Upload file PDF", type=["pdf"])
+        st.info("Chưa có kịch bản. Vui lòng tải lên file PDF, Fountain hoặc Final Draft (.fdx) để bắt đầu dự án.")
+        uploaded_file = st.file_uploader("Upload kịch bản (PDF / Fountain / FDX)", type=["pdf", "fountain", "fdx"])
         
         if uploaded_file is not None:
-            # Replicate existing import logic
-            with st.spinner(f"Đang xử lý file: {uploaded_file.name}"):
+            import script_parser
+            import import_cache
+            import page_store
+            import screenplay_formats
+            import import_worker
+            
+            file_bytes = uploaded_file.getvalue()
+            upload_key = f"{uploaded_file.name}:{len(file_bytes)}:{getattr(uploaded_file, 'file_id', '')}"
+            pages_path = page_store.page_store_path(st.session_state.get('current_project_id'), utils.get_session_id(st.session_state))
+            structured = screenplay_formats.is_structured_file(uploaded_file.name)
+            
+            # A different file was uploaded while an import was running
+            import_job = st.session_state.get('import_job')
+            if import_job is not None and st.session_state.get('import_job_key') != upload_key:
+                import_job.cancel()
+                st.session_state.pop('import_job', None)
+                import_job = None
+            
+            cached_import = None if (structured or import_job) else import_cache.get_cached_import(file_bytes)
+            imported = None
+            
+            if cached_import:
+                # Known draft: skip extraction and parsing entirely
+                imported = (cached_import['scenes'], cached_import['pages'])
+            elif st.session_state.get('import_stopped_key') == upload_key:
+                st.warning(f"Đã dừng import file: {uploaded_file.name}. Tải lên file khác hoặc thử lại.")
+                if st.button("🔄 Thử lại", key="retry_import"):
+                    st.session_state.pop('import_stopped_key', None)
+                    st.rerun()
+            else:
+                # Parsing runs in an isolated worker process (timeout + memory cap);
+                # this script only polls it and reruns until it finishes
+                if import_job is None:
+                    import_job = import_worker.ImportJob(uploaded_file.name, file_bytes)
+                    st.session_state['import_job'] = import_job
+                    st.session_state['import_job_key'] = upload_key
+                
+                status = import_job.poll(wait=0.5)
+                
+                if status == "running":
+                    if import_job.total_pages:
+                        st.progress(import_job.pages_done / import_job.total_pages,
+                                    text=f"Đang đọc trang {import_job.pages_done}/{import_job.total_pages}...")
+                    else:
+                        st.progress(0.0, text=f"Đang xử lý file: {uploaded_file.name}")
+                    if import_job.scenes:
+                        latest = import_job.scenes[-1]
+                        st.caption(f"Đã bóc tách {len(import_job.scenes)} cảnh... Mới nhất: {latest['id']}: {latest['header']}")
+                    st.caption(f"⏱️ {import_job.elapsed:.0f}s / tối đa {import_job.timeout}s")
+                    
+                    if st.button("⏹️ Hủy import", key="cancel_import"):
+                        import_job.cancel()
+                        st.session_state.pop('import_job', None)
+                        st.session_state['import_stopped_key'] = upload_key
+                    st.rerun()
+                
+                st.session_state.pop('import_job', None)
+                if status == "done":
+                    if not structured:
+                        import_cache.save_import(file_bytes, import_job.pages, import_job.scenes)
+                    imported = (import_job.scenes, import_job.pages)
+                else:
+                    st.session_state['import_stopped_key'] = upload_key
+                    st.error(f"Lỗi Import: {import_job.error}")
+            
+            if imported:
+                scenes, pages = imported
                 try:
-                    import script_parser
-                    # Extract text
-                    script_text = script_parser.extract_text_from_pdf(uploaded_file)
+                    # Keep the raw pages so detection settings can be re-run without the PDF
+                    if pages is not None:
+                        page_store.write_pages(pages_path, pages)
+                    elif os.path.exists(pages_path):
+                        os.remove(pages_path)  # stale pages from an earlier PDF import
                     
-                    # Auto-parse scenes
-                    scenes = script_parser.parse_scenes(script_text)
-                    st.session_state['scene_list'] = scenes
+                    st.session_state['scene_list'] = SceneStore(scenes)
                     st.success(f"Đã bóc tách thành công {len(scenes)} cảnh!")
                     
-                    # Store full text for initial analysis
-                    st.session_state['full_script_text_on_import'] = script_text
-                    
                     # Auto-save after parsing
                     auto_save()
                     st.rerun() # Rerun to switch to the review mode
@@ -935,7 +1122,17 @@ with tab1:
                     st.error(f"Lỗi Import: {str(e)}")
         
     # 2. REVIEW & RE-ANALYZE SECTION (Visible if script is loaded)
-    if 'scene_list' in st.session_state and st.session_state['scene_list']:
+    if 'scene_list' in st.session_state and st.session_state['scene_list'] and not st.session_state['scene_list'].fully_loaded:
+        # Large project opened without scene content: the full-script views need all of it
+        st.divider()
+        scene_store = st.session_state['scene_list']
+        st.info(f"Dự án lớn: mới tải nội dung {scene_store.loaded_count()}/{len(scene_store)} cảnh. "
+                "Tải toàn bộ để xem kịch bản hoàn chỉnh và phân tích.")
+        if st.button("📥 Tải toàn bộ nội dung kịch bản", type="primary"):
+            with st.spinner("Đang tải nội dung các cảnh..."):
+                scene_store.load_all()
+            st.rerun()
+    elif 'scene_list' in st.session_state and st.session_state['scene_list']:
         
         # Full Script Preview Section
         st.divider()
@@ -947,6 +1144,55 @@ with tab1:
         with st.expander("Xem nội dung Kịch bản Hoàn chỉnh (Text)", expanded=False):
             # Use custom CSS class for screenplay formatting
             st.markdown(f'<div class="script-container">{current_script_text}</div>', unsafe_allow_html=True)
+        
+        # Parser tuning: re-run scene detection on the stored pages (no PDF re-read)
+        import page_store
+        pages_path = page_store.page_store_path(st.session_state.get('current_project_id'), utils.get_session_id(st.session_state))
+        if os.path.exists(pages_path):
+            with st.expander("⚙️ Tùy chỉnh bóc tách cảnh", expanded=False):
+                import script_parser
+                
+                col_l1, col_l2, col_l3 = st.columns(3)
+                with col_l1:
+                    layer1 = st.checkbox("Layer 1: Số trùng (NIGHT11 11)", value=True, key="parser_layer1")
+                with col_l2:
+                    layer2 = st.checkbox("Layer 2: Từ khóa (CẢNH, INT., ...)", value=True, key="parser_layer2")
+                with col_l3:
+                    layer3 = st.checkbox("Layer 3: CHỮ HOA có số", value=True, key="parser_layer3")
+                extra_keywords = st.text_input(
+                    "Từ khóa bổ sung (cách nhau bởi dấu phẩy)",
+                    key="parser_extra_keywords",
+                    placeholder="VD: FLASHBACK, MONTAGE"
+                )
+                
+                parser_settings = {
+                    "layer1": layer1,
+                    "layer2": layer2,
+                    "layer3": layer3,
+                    "extra_keywords": extra_keywords.split(",")
+                }
+                
+                if st.button("🔁 Bóc tách lại", use_container_width=True, type="secondary"):
+                    with page_store.PageStore(pages_path) as pages:
+                        st.session_state['reparse_preview'] = list(script_parser.iter_scenes_from_pages(pages, settings=parser_settings))
+                
+                reparse_preview = st.session_state.get('reparse_preview')
+                if reparse_preview:
+                    st.caption(f"Kết quả: {len(reparse_preview)} cảnh (hiện tại: {len(st.session_state['scene_list'])} cảnh)")
+                    st.dataframe(
+                        pd.DataFrame([{"ID": s['id'], "Header": s['header']} for s in reparse_preview]),
+                        use_container_width=True,
+                        height=200,
+                        hide_index=True
+                    )
+                    st.warning("⚠️ Áp dụng sẽ thay thế toàn bộ danh sách cảnh hiện tại (mất các chỉnh sửa).")
+                    if st.button("✓ Áp dụng kết quả", type="primary"):
+                        st.session_state['scene_list'] = SceneStore(reparse_preview)
+                        st.session_state.pop('reparse_preview', None)
+                        st.session_state.pop('original_content_map', None)
+                        st.session_state['edit_timestamp'] = time.time()
+                        auto_save()
+                        st.rerun()
             
         st.divider()
         
@@ -957,18 +1203,35 @@ with tab1:
         if 'analysis_results' not in st.session_state:
             st.session_state['analysis_results'] = {}
         
-        if st.button("🔍 Phân tích Lại Kịch bản (Dual View)", type="primary"):
+        import ai_engine
+        analysis_allowed = preflight(cached_estimate('dual_analysis', lambda: ai_engine.estimate_dual_analysis(
+            compile_script_from_scenes(), scenes=st.session_state['scene_list']
+        )))
+        
+        if st.button("🔍 Phân tích Lại Kịch bản (Dual View)", type="primary", disabled=not analysis_allowed):
             if "gemini_api_key" not in st.session_state or not st.session_state["gemini_api_key"]:
                 st.error("Vui lòng nhập API Key trong Sidebar trước!")
             else:
-                with st.spinner("AI đang đọc lại và phân tích kịch bản dưới 2 góc độ... (Có thể mất 20-30s)"):
+                with st.spinner("AI đang phân tích song song kịch bản dưới 2 góc độ... (Có thể mất 10-20s)"):
                     try:
                         import ai_engine
                         api_key = st.session_state["gemini_api_key"]
                         
                         # Use the re-compiled script text for analysis
                         current_script_text = compile_script_from_scenes() # Assumes this helper is defined
-                        results = ai_engine.run_dual_analysis(current_script_text, api_key)
+                        
+                        # The marketing report streams in live while the creative pass runs
+                        live_marketing = st.empty()
+                        with live_marketing.container(border=True):
+                            st.caption("💰 Báo cáo Marketing (đang tạo...)")
+                            
+                            # Long scripts are split into token-budgeted chunks (map-reduce) by scene
+                            results = ai_engine.run_dual_analysis(
+                                current_script_text, api_key,
+                                scenes=st.session_state['scene_list'],
+                                render_marketing=st.write_stream
+                            )
+                        live_marketing.empty()  # the full report is rendered below
                         
                         # Save results to session state
                         st.session_state['analysis_results'] = results
@@ -978,7 +1241,10 @@ with tab1:
                         
                         auto_save()
                         
-                        st.success("Đã hoàn tất phân tích lại dưới góc nhìn kép!")
+                        if results.get('errors'):
+                            st.warning("Đã hoàn tất phân tích, nhưng có lượt bị lỗi (xem chi tiết bên dưới).")
+                        else:
+                            st.success("Đã hoàn tất phân tích lại dưới góc nhìn kép!")
                         
                     except Exception as e:
                         st.error(f"Lỗi phân tích: {str(e)}")
@@ -987,6 +1253,16 @@ with tab1:
         if st.session_state['analysis_results']:
             results = st.session_state['analysis_results']
             
+            # Per-pass timings and errors (creative / marketing run in parallel)
+            timings = results.get('timings')
+            if timings:
+                st.caption(
+                    f"⏱️ Sáng tạo: {timings.get('creative', 0):.1f}s · Marketing: {timings.get('marketing', 0):.1f}s · "
+                    f"Tổng hợp: {timings.get('summary', 0):.1f}s · Tổng: {timings.get('total', 0):.1f}s"
+                )
+            for pass_name, pass_error in (results.get('errors') or {}).items():
+                st.error(f"Lượt phân tích '{pass_name}' bị lỗi: {pass_error}")
+            
             st.markdown("---")
             st.markdown("### 📊 Bảng Tóm tắt Các Điểm Đồng nhất")
             
@@ -1031,6 +1307,8 @@ with tab1:
                 with st.expander(f"🗣️ Show vs Tell: {svt.get('summary', 'Đang phân tích...')}", expanded=False):
                     st.markdown(svt.get('detail', 'Không có chi tiết.'))
                 
+            elif creative_data is None:
+                st.warning("Không có báo cáo Sáng tạo.")
             elif isinstance(creative_data, dict) and creative_data.get('error'):
                 st.error("Lỗi định dạng JSON từ AI cho báo cáo Sáng tạo. Xem nội dung thô bên dưới:")
                 st.code(creative_data.get('raw_content', 'Không có nội dung thô.'))
@@ -1044,7 +1322,7 @@ with tab1:
             
             # Báo cáo Marketing vẫn là Markdown, hiển thị trong expander đơn giản
             with st.expander("Báo cáo Chi tiết Marketing", expanded=False):
-                st.markdown(results['marketing'])
+                st.markdown(results['marketing'] or "Không có báo cáo Marketing.")
 
         else:
             st.info("Nhấn 'Phân tích Lại Kịch bản (Dual View)' để nhận báo cáo review Act-by-Act và tổng thể từ 2 góc nhìn.")
@@ -1133,17 +1411,35 @@ with tab2:
                     st.session_state['undo_stack'][selected_scene['id']].append(current_saved_content)
                 
                 # Update scene content
-                for scene in st.session_state['scene_list']:
-                    if scene['id'] == selected_scene['id']:
-                        scene['content'] = scene_content
-                        # Update original content map if this is the first edit (basic version tracking)
-                        if scene['id'] not in st.session_state.get('original_content_map', {}):
-                            st.session_state['original_content_map'][scene['id']] = current_saved_content
-                        break
+                if st.session_state['scene_list'].update_content(selected_scene['id'], scene_content):
+                    # Update original content map if this is the first edit (basic version tracking)
+                    if selected_scene['id'] not in st.session_state.get('original_content_map', {}):
+                        st.session_state['original_content_map'][selected_scene['id']] = current_saved_content
                 
                 auto_save()
                 st.toast("Đã lưu nội dung cảnh! ✅")
             
+            # Explicit split: scene headings typed into the content start new scenes
+            if st.button("✂️ Tách cảnh tại tiêu đề", use_container_width=True, type="secondary",
+                         help="Tách các tiêu đề cảnh (INT., EXT., CẢNH...) trong nội dung đang sửa thành cảnh mới ngay sau cảnh này."):
+                import script_parser
+                scene_store = st.session_state['scene_list']
+                position = scene_store.position(selected_scene['id'])
+                previous_content = selected_scene['content']
+                split_scenes = script_parser.split_scene(scene_store, position, scene_content)
+                
+                if split_scenes is None:
+                    st.toast("Không tìm thấy tiêu đề cảnh nào trong nội dung.")
+                else:
+                    # The shortened scene shows as edited in the navigator
+                    st.session_state.setdefault('original_content_map', {}).setdefault(selected_scene['id'], previous_content)
+                    new_scene_count = len(split_scenes) - len(scene_store)
+                    st.session_state['scene_list'] = scene_store.with_scenes(split_scenes)
+                    st.session_state['edit_timestamp'] = time.time()
+                    auto_save()
+                    st.toast(f"Đã tách thêm {new_scene_count} cảnh mới! ✂️")
+                    st.rerun()
+            
             # Undo button
             has_undo = 'undo_stack' in st.session_state and \
                        selected_scene['id'] in st.session_state['undo_stack'] and \
@@ -1153,10 +1449,7 @@ with tab2:
                 if st.button("↩️ Undo", use_container_width=True, type="secondary"):
                     last_content = st.session_state['undo_stack'][selected_scene['id']].pop()
                     
-                    for scene in st.session_state['scene_list']:
-                        if scene['id'] == selected_scene['id']:
-                            scene['content'] = last_content
-                            break
+                    st.session_state['scene_list'].update_content(selected_scene['id'], last_content)
                     
                     st.session_state['edit_timestamp'] = time.time()
                     utils.save_session_state(st.session_state)
@@ -1192,7 +1485,7 @@ with tab2:
             if btn_brainstorm:
                 if "gemini_api_key" not in st.session_state or not st.session_state["gemini_api_key"]:
                     st.error("Chưa có API Key!")
-                else:
+                elif scene_preflight(f"{selected_scene['header']}\n\n{scene_content}", "brainstorm"):
                     with st.spinner("AI đang viết lại scene..."):
                         try:
                             import ai_engine
@@ -1260,10 +1553,8 @@ with tab2:
 
                         with col_apply:
                             if st.button(f"✓ Apply", key=f"apply_opt_{i}", use_container_width=True, type="primary"):
-                                for scene in st.session_state['scene_list']:
-                                    if scene['id'] == selected_scene['id']:
-                                        scene['content'] = edited_content # Use the potentially edited content
-                                        break
+                                # Use the potentially edited content
+                                st.session_state['scene_list'].update_content(selected_scene['id'], edited_content)
                                 
                                 st.session_state['edit_timestamp'] = time.time()
                                 utils.save_session_state(st.session_state)
@@ -1288,15 +1579,17 @@ with tab2:
                                     if not refine_instruction:
                                         st.warning("Nhập yêu cầu trước!")
                                     else:
-                                        with st.spinner("AI đang chỉnh sửa..."):
+                                        with st.container(border=True):
                                             try:
                                                 import ai_engine
-                                                refined_text = ai_engine.refine_generated_option(
+                                                # Show the refined text as it is generated
+                                                refined_text = st.write_stream(ai_engine.refine_generated_option(
                                                     edited_content, 
                                                     refine_instruction, 
                                                     f"{selected_scene['header']}\n\n{selected_scene['content']}",
-                                                    st.session_state["gemini_api_key"]
-                                                )
+                                                    st.session_state["gemini_api_key"],
+                                                    stream=True
+                                                ))
                                                 
                                                 st.session_state['brainstorm_options'][i]['content'] = refined_text
                                                 st.session_state['option_updates'][i] = time.time()
@@ -1350,7 +1643,7 @@ with tab2:
             if st.button("😶 Show, Don't Tell", use_container_width=True, type="secondary"):
                 if "gemini_api_key" not in st.session_state or not st.session_state["gemini_api_key"]:
                     st.error("Chưa có API Key!")
-                else:
+                elif scene_preflight(f"{selected_scene['header']}\n\n{scene_content}", "dialogue_fix"):
                     with st.spinner("AI đang phân tích thoại..."):
                         try:
                             import ai_engine
@@ -1409,10 +1702,7 @@ with tab2:
                                     current_content = current_content.replace(original, replacement, 1)
                                     replaced_count += 1
                             
-                            for scene in st.session_state['scene_list']:
-                                if scene['id'] == selected_scene['id']:
-                                    scene['content'] = current_content
-                                    break
+                            st.session_state['scene_list'].update_content(selected_scene['id'], current_content)
                             
                             st.session_state['edit_timestamp'] = time.time()
                             utils.save_session_state(st.session_state)
@@ -1447,22 +1737,25 @@ with tab3:
             if "gemini_api_key" not in st.session_state or not st.session_state["gemini_api_key"]:
                 st.error("Chưa có API Key!")
             else:
+                import ai_engine
                 user_strategy = f"LỜI KHUYÊN AI:\n{strategy_ai}\n\nCHỈ ĐẠO ĐẠO DIỄN:\n{strategy_user}"
-                with st.spinner("AI đang xây dựng kế hoạch hành động chi tiết..."):
-                    try:
-                        import ai_engine
-                        api_key = st.session_state["gemini_api_key"]
-                        
-                        plan = ai_engine.generate_action_plan(st.session_state['scene_list'], user_strategy, api_key)
-                        st.session_state['action_plan'] = plan
-                        st.session_state['user_strategy'] = user_strategy
-                        st.session_state['task_completion'] = {} # New tracking for completion
-                        
-                        auto_save()
-                        
-                        st.success("Đã lập kế hoạch thành công!")
-                    except Exception as e:
-                        st.error(f"Lỗi: {str(e)}")
+                st.session_state['scene_list'].load_all()
+                if preflight(ai_engine.estimate_action_plan(st.session_state['scene_list'], user_strategy)):
+                    with st.spinner("AI đang xây dựng kế hoạch hành động chi tiết..."):
+                        try:
+                            import ai_engine
+                            api_key = st.session_state["gemini_api_key"]
+                            
+                            plan = ai_engine.generate_action_plan(st.session_state['scene_list'], user_strategy, api_key)
+                            st.session_state['action_plan'] = plan
+                            st.session_state['user_strategy'] = user_strategy
+                            st.session_state['task_completion'] = {} # New tracking for completion
+                            
+                            auto_save()
+                            
+                            st.success("Đã lập kế hoạch thành công!")
+                        except Exception as e:
+                            st.error(f"Lỗi: {str(e)}")
 
         # 2. Display Action Plan
         if 'action_plan' in st.session_state:
@@ -1592,19 +1885,23 @@ with tab3:
                                 if "gemini_api_key" not in st.session_state or not st.session_state["gemini_api_key"]:
                                     st.error("Chưa có API Key!")
                                 else:
-                                    target_scene = next((s for s in st.session_state['scene_list'] if str(s['id']) == str(scene_id)), None)
-                                    if target_scene:
-                                        with st.spinner(f"AI đang viết lại Scene {scene_id}..."):
+                                    scene_store = st.session_state['scene_list']
+                                    target_position = scene_store.position(scene_id)
+                                    target_scene = scene_store.ensure_loaded(target_position) if target_position is not None else None
+                                    if target_scene and scene_preflight(target_scene['content'], "ai_fix"):
+                                        with st.container(border=True):
                                             try:
                                                 import ai_engine
                                                 api_key = st.session_state["gemini_api_key"]
                                                 
-                                                fixed_content = ai_engine.ai_fix_scene(
+                                                st.caption(f"AI đang viết lại Scene {scene_id}...")
+                                                fixed_content = st.write_stream(ai_engine.ai_fix_scene(
                                                     scene_id, 
                                                     target_scene['content'], 
                                                     instruction, 
-                                                    api_key
-                                                )
+                                                    api_key,
+                                                    stream=True
+                                                ))
                                                 
                                                 st.session_state['temp_ai_fix_content'] = {
                                                     'scene_id': scene_id,
@@ -1659,10 +1956,7 @@ with tab3:
                             with col_apply:
                                 if st.button("✅ Áp dụng & Lưu Thay đổi", type="primary", key=f"apply_fix_{scene_id}", use_container_width=True):
                                     # Find and update scene content
-                                    for scene in st.session_state['scene_list']:
-                                        if str(scene['id']) == str(result['scene_id']):
-                                            scene['content'] = edited_fixed_content
-                                            break
+                                    st.session_state['scene_list'].update_content(result['scene_id'], edited_fixed_content)
                                             
                                     st.session_state['edit_timestamp'] = time.time()
                                     st.session_state['task_completion'][subtask_key] = True # Mark as complete
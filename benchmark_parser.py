@@ -0,0 +1,265 @@
+"""
+Benchmark suite for script_parser
+Generates synthetic Vietnamese / English screenplays (with the PDF quirks the
+parser handles) and times clean_text, parse_scenes and extract_text_from_pdf
+separately. Results are saved as JSON so runs can be compared.
+
+Usage:
+    python benchmark_parser.py --scenes 2000 --lang vi
+    python benchmark_parser.py --scenes 2000 --compare data/benchmarks/parser-20251201-120000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+import script_parser
+import utils
+
+RESULTS_DIR = os.path.join(utils.DATA_DIR, "benchmarks")
+LINES_PER_PAGE = 50
+
+# ============================================================================
+# SYNTHETIC SCREENPLAY GENERATOR
+# ============================================================================
+
+VOCAB = {
+    "vi": {
+        "int": ["NỘI.", "CẢNH {n}: NỘI."],
+        "ext": ["NGOẠI.", "CẢNH {n}: NGOẠI."],
+        "places": ["NHÀ BÀ NĂM", "SÂN ĐÌNH", "BỜ SÔNG", "CHỢ LÀNG", "RỪNG TRE", "BẾP"],
+        "times": ["NGÀY", "ĐÊM", "CHIỀU", "SÁNG SỚM"],
+        "characters": ["KHẢI", "BÀ NĂM", "LINH", "ÔNG TƯ"],
+        "action": ["Gió rít qua hàng tre.", "Khải bước chậm, tay cầm đèn pin.",
+                   "Tiếng chó sủa vọng lại từ xa.", "Bà Năm ngồi bên bếp lửa, mắt đỏ hoe.",
+                   "Ánh trăng hắt qua khe cửa.", "Mặt nước đen ngòm, không một gợn sóng."],
+        "dialogue": ["Có ai ở đó không?", "Con về rồi đó hả?", "Đừng nhìn vào mắt nó.",
+                     "Tối nay đừng ra khỏi nhà.", "Bà biết chuyện gì đã xảy ra mà."],
+    },
+    "en": {
+        "int": ["INT.", "SCENE {n}: INT."],
+        "ext": ["EXT.", "SCENE {n}: EXT."],
+        "places": ["WAREHOUSE", "RICE FIELD", "OLD HOUSE", "HIGHWAY", "POLICE STATION", "KITCHEN"],
+        "times": ["DAY", "NIGHT", "DAWN", "CONTINUOUS"],
+        "characters": ["JOHN", "MARY", "DETECTIVE LEE", "THE STRANGER"],
+        "action": ["Rain hammers the roof.", "John steps inside, flashlight trembling.",
+                   "A dog barks somewhere far away.", "Mary sits by the stove, eyes red.",
+                   "Moonlight cuts through the blinds.", "The water is black and still."],
+        "dialogue": ["Is anyone there?", "You came back.", "Don't look it in the eye.",
+                     "Stay inside tonight.", "You know what happened here."],
+    },
+}
+
+def generate_header(rng, vocab, n):
+    """Scene header in one of the layouts the parser detects."""
+    prefix = rng.choice(vocab["int"] + vocab["ext"]).format(n=n)
+    place = rng.choice(vocab["places"])
+    when = rng.choice(vocab["times"])
+    style = rng.random()
+    if style < 0.3:
+        return f"{prefix} {place} - {when}{n} {n}"      # PDF quirk: "NIGHT11 11"
+    if style < 0.6:
+        return f"{prefix} {place} - {when} {n}"         # trailing scene number
+    if style < 0.8:
+        return f"{place} - {when} {n} {n}"              # duplicated numbers, no keyword
+    return f"{prefix} {place} - {when}"                 # no number -> AUTO_n
+
+def generate_script_lines(n_scenes, lang="vi", seed=0):
+    """Yields screenplay lines, including page-number artifacts."""
+    rng = random.Random(seed)
+    vocab = VOCAB[lang]
+    line_count = 0
+    page = 1
+
+    def emit(line):
+        nonlocal line_count, page
+        line_count += 1
+        if line_count % LINES_PER_PAGE == 0:
+            page += 1
+            return [line, "", rng.choice([str(page), f"Page {page}"])]
+        return [line]
+
+    yield from emit("TITLE PAGE" if lang == "en" else "KỊCH BẢN PHIM")
+    for n in range(1, n_scenes + 1):
+        yield from emit(generate_header(rng, vocab, n))
+        for _ in range(rng.randint(2, 8)):
+            yield from emit(rng.choice(vocab["action"]))
+            if rng.random() < 0.6:
+                yield from emit(rng.choice(vocab["characters"]))
+                yield from emit(rng.choice(vocab["dialogue"]))
+            yield from emit("")
+
+def generate_script(n_scenes, lang="vi", seed=0):
+    return "\n".join(generate_script_lines(n_scenes, lang, seed))
+
+# ============================================================================
+# MINIMAL PDF WRITER (base-14 Courier, no external dependencies)
+# ============================================================================
+
+def _pdf_codes(lines):
+    """
+    Single-byte codes for the text: ASCII as-is, every other character
+    (Vietnamese diacritics) gets a code from 128 up, mapped back to Unicode
+    by the font's ToUnicode CMap so extraction returns the original text.
+    """
+    extra = sorted({c for line in lines for c in line if not 32 <= ord(c) < 127})
+    if len(extra) > 128:
+        raise ValueError(f"Too many distinct non-ASCII characters for one PDF font: {len(extra)}")
+    return {c: 128 + i for i, c in enumerate(extra)}
+
+def _pdf_string(line, codes):
+    return "".join("\\%03o" % codes[c] if c in codes else "\\" + c if c in "\\()" else c for c in line)
+
+def _to_unicode_cmap(codes):
+    entries = [f"<{code:02X}> <{c.encode('utf-16-be').hex().upper()}>" for c, code in codes.items()]
+    blocks = "".join(f"{len(chunk)} beginbfchar\n" + "\n".join(chunk) + "\nendbfchar\n"
+                     for chunk in (entries[i:i + 100] for i in range(0, len(entries), 100)))
+    return ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<00> <FF>\nendcodespacerange\n"
+            "1 beginbfrange\n<20> <7E> <0020>\nendbfrange\n" + blocks +
+            "endcmap\nCMapName currentdict /CMapResource defineresource pop\nend\nend").encode("ascii")
+
+def write_pdf(lines, path):
+    """
+    Write lines to a text PDF, LINES_PER_PAGE lines per page. Text
+    extraction gives back the same lines (blank ones are written as a space:
+    extractors drop empty strings), so the PDF parses to the same scenes as
+    the text.
+    """
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    codes = _pdf_codes(lines)
+    differences = " ".join(f"{code} /uni{ord(c):04X}" for c, code in codes.items())
+    cmap = _to_unicode_cmap(codes)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{5 + 2 * i} 0 R" for i in range(len(pages))), len(pages))).encode(),
+        (f"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding << /Type /Encoding "
+         f"/BaseEncoding /WinAnsiEncoding /Differences [{differences}] >> /ToUnicode 4 0 R >>").encode(),
+        b"<< /Length %d >>\nstream\n" % len(cmap) + cmap + b"\nendstream",
+    ]
+    for i, page_lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 12 TL 72 760 Td " + " ".join(f"({_pdf_string(line or ' ', codes)}) Tj T*" for line in page_lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {6 + 2 * i} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_start = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_start)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def measure(fn, repeat):
+    """Best wall time over `repeat` runs, then one traced run for peak memory."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def run_benchmarks(n_scenes, lang, repeat, workers, pdf_path=None):
+    text = generate_script(n_scenes, lang)
+    n_lines = text.count("\n") + 1
+
+    synthetic_pdf = pdf_path is None
+    if synthetic_pdf:
+        pdf_path = os.path.join(RESULTS_DIR, f"synthetic-{lang}-{n_scenes}.pdf")
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        write_pdf(text.split("\n"), pdf_path)
+    pdf_bytes = script_parser.read_pdf_bytes(pdf_path)
+    pdf_text = script_parser.extract_text_from_pdf(pdf_bytes, workers=1)
+    pdf_lines = pdf_text.count("\n") + 1
+    # Scenes of the PDF that is timed, not of the generated text
+    detected_scenes = len(script_parser.parse_scenes(pdf_text))
+    if synthetic_pdf and detected_scenes != n_scenes:
+        raise SystemExit(f"Synthetic PDF parses to {detected_scenes} scenes, expected {n_scenes}")
+
+    stages = {
+        "clean_text": (lambda: script_parser.clean_text(text), n_lines),
+        "parse_scenes": (lambda: script_parser.parse_scenes(text), n_lines),
+        "extract_text_from_pdf": (lambda: script_parser.extract_text_from_pdf(pdf_bytes, workers=workers), pdf_lines),
+    }
+
+    results = {}
+    for name, (fn, lines) in stages.items():
+        seconds, peak = measure(fn, repeat)
+        results[name] = {
+            "seconds": round(seconds, 6),
+            "lines": lines,
+            "lines_per_sec": round(lines / seconds, 1) if seconds else None,
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {"scenes": n_scenes, "lang": lang, "repeat": repeat, "workers": workers,
+                   "pdf": pdf_path, "detected_scenes": detected_scenes},
+        "results": results,
+    }
+
+def print_report(report, baseline=None):
+    print(f"{report['config']['scenes']} scenes ({report['config']['lang']}), "
+          f"{report['config']['detected_scenes']} detected")
+    print(f"{'stage':<24} {'seconds':>10} {'lines/s':>12} {'peak KB':>10} {'vs base':>9}")
+    for name, stage in report["results"].items():
+        delta = ""
+        if baseline and name in baseline.get("results", {}):
+            base_seconds = baseline["results"][name]["seconds"]
+            delta = f"{base_seconds / stage['seconds']:.2f}x" if stage["seconds"] else ""
+        print(f"{name:<24} {stage['seconds']:>10.4f} {stage['lines_per_sec']:>12,.0f} {stage['peak_memory_kb']:>10,.0f} {delta:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark script_parser throughput.")
+    parser.add_argument("--scenes", type=int, default=1000, help="Number of synthetic scenes")
+    parser.add_argument("--lang", choices=sorted(VOCAB), default="vi", help="Screenplay language")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is reported)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for PDF extraction")
+    parser.add_argument("--pdf", default=None, help="Use this PDF instead of a synthetic one for extraction")
+    parser.add_argument("--output", default=None, help="JSON results file (default: data/benchmarks/parser-<time>.json)")
+    parser.add_argument("--compare", default=None, help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scenes, args.lang, args.repeat, args.workers, args.pdf)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"parser-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Saved: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: PDF text extraction speed vs. worker count
+Usage: python benchmark_pdf_extraction.py path/to/script.pdf --workers 1,2,4,8 --repeat 3
+"""
+
+import argparse
+import os
+import time
+
+import script_parser
+
+
+def time_extraction(pdf_bytes, workers, repeat):
+    """Best-of-N wall time and the per-page texts for extracting with `workers` processes."""
+    best = None
+    pages = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = list(script_parser.iter_pdf_page_texts(pdf_bytes, workers=workers, min_pages=0))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how PDF extraction scales with core count.")
+    parser.add_argument("pdf", help="PDF file to extract")
+    parser.add_argument("--workers", default=None, help="Comma-separated worker counts (default: 1,2,4,... up to CPU count)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per worker count (best time is reported)")
+    args = parser.parse_args()
+
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(",")]
+    else:
+        cpu_count = os.cpu_count() or 1
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpu_count:
+            worker_counts.append(worker_counts[-1] * 2)
+
+    pdf_bytes = script_parser.read_pdf_bytes(args.pdf)
+    print(f"File: {args.pdf} ({len(pdf_bytes) / 1024:.0f} KB), CPUs: {os.cpu_count()}")
+    print(f"{'workers':>8} {'seconds':>10} {'pages/s':>10} {'speedup':>8}")
+
+    baseline = None
+    reference_pages = list(script_parser.iter_pdf_page_texts(pdf_bytes, workers=1))
+    for workers in worker_counts:
+        elapsed, pages = time_extraction(pdf_bytes, workers, args.repeat)
+        # Same text for every page, in the same order, as the serial path
+        if pages != reference_pages:
+            mismatch = next((i for i, (a, b) in enumerate(zip(pages, reference_pages)) if a != b),
+                            min(len(pages), len(reference_pages)))
+            raise SystemExit(f"{workers} workers: page {mismatch + 1} differs from serial extraction "
+                             f"({len(pages)} vs {len(reference_pages)} pages)")
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>10.3f} {len(pages) / elapsed:>10.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
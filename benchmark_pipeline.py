@@ -0,0 +1,197 @@
+"""
+End-to-end benchmark for the AI pipeline
+Drives import -> run_dual_analysis -> generate_action_plan -> ai_fix_scene
+against the record/replay backend (replay_backend) and reports wall time per
+stage. Replay needs no network or API key; unknown prompts get synthetic
+responses unless --strict is given.
+
+Usage:
+    python benchmark_pipeline.py --scenes 300
+    python benchmark_pipeline.py --script my_script.pdf --mode record --api-key ...
+    python benchmark_pipeline.py --script my_script.pdf --strict --latency-scale 0
+    python benchmark_pipeline.py --compare data/benchmarks/pipeline-20251201-120000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import ai_engine
+import benchmark_parser
+import import_worker
+import replay_backend
+import request_scheduler
+import response_cache
+import token_estimator
+import utils
+
+RESULTS_DIR = benchmark_parser.RESULTS_DIR
+DEFAULT_STRATEGY = "Tăng độ căng thẳng ở Hồi 2 và giảm thoại giải thích."
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+def import_script(filename, file_bytes):
+    """Same worker-process import the app uses."""
+    job = import_worker.ImportJob(filename, file_bytes)
+    while not job.finished:
+        job.poll(wait=0.05)
+    if job.status != "done":
+        raise RuntimeError(f"Import {job.status}: {job.error}")
+    return job.scenes
+
+def run_stage(results, name, fn):
+    """Time one stage; the number of Gemini calls comes from the scheduler."""
+    requests_before = request_scheduler.get_metrics()["requests"]
+    start = time.perf_counter()
+    value = fn()
+    results[name] = {
+        "seconds": round(time.perf_counter() - start, 4),
+        "calls": request_scheduler.get_metrics()["requests"] - requests_before,
+    }
+    return value
+
+def fix_scenes(scenes, plan, api_key, limit):
+    """Stream AI fixes for the first `limit` planned scenes, as the Action Plan tab does."""
+    by_id = {scene["id"]: scene for scene in scenes}
+    targets = [(item.get("scene_id"), item.get("instruction", ""))
+               for task in plan for item in task.get("related_scenes", [])
+               if item.get("scene_id") in by_id][:limit]
+
+    first_chunk_times = []
+    for scene_id, instruction in targets:
+        start = time.perf_counter()
+        first_chunk = None
+        for _ in ai_engine.ai_fix_scene(scene_id, by_id[scene_id]["content"], instruction, api_key, stream=True):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+        first_chunk_times.append(first_chunk or 0.0)
+    return first_chunk_times
+
+def run_pipeline(filename, file_bytes, api_key, chunk_tokens, fix_limit, strategy):
+    results = {}
+    scenes = run_stage(results, "import", lambda: import_script(filename, file_bytes))
+    script_text = ai_engine.compile_scenes(scenes)
+
+    estimate = ai_engine.estimate_dual_analysis(script_text, scenes=scenes, chunk_tokens=chunk_tokens)
+    analysis = run_stage(results, "dual_analysis", lambda: ai_engine.run_dual_analysis(
+        script_text, api_key, scenes=scenes, chunk_tokens=chunk_tokens))
+    results["dual_analysis"]["estimate"] = estimate
+    results["dual_analysis"]["passes"] = analysis["timings"]
+    results["dual_analysis"]["errors"] = analysis["errors"]
+
+    plan = run_stage(results, "action_plan", lambda: ai_engine.generate_action_plan(scenes, strategy, api_key))
+    results["action_plan"]["tasks"] = len(plan)
+
+    first_chunks = run_stage(results, "ai_fix", lambda: fix_scenes(scenes, plan, api_key, fix_limit))
+    results["ai_fix"]["scenes"] = len(first_chunks)
+    results["ai_fix"]["avg_first_chunk_seconds"] = (
+        round(sum(first_chunks) / len(first_chunks), 4) if first_chunks else None)
+
+    return scenes, results
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def print_report(report, baseline=None):
+    config = report["config"]
+    print(f"{config['source']}: {config['detected_scenes']} scenes, backend {config['mode']} "
+          f"(latency {config['latency']} x{config['latency_scale']})")
+    print(f"{'stage':<16} {'seconds':>10} {'calls':>7} {'vs base':>9}")
+    for name, stage in report["results"].items():
+        delta = ""
+        if baseline and name in baseline.get("results", {}):
+            base_seconds = baseline["results"][name]["seconds"]
+            delta = f"{base_seconds / stage['seconds']:.2f}x" if stage["seconds"] else ""
+        print(f"{name:<16} {stage['seconds']:>10.3f} {stage['calls']:>7} {delta:>9}")
+    print(f"{'total':<16} {report['total_seconds']:>10.3f}")
+    print(f"backend: {report['backend']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI pipeline against recorded or synthetic responses.")
+    parser.add_argument("--script", default=None, help="PDF / Fountain / FDX to import (default: synthetic PDF)")
+    parser.add_argument("--scenes", type=int, default=200, help="Synthetic scenes when no --script is given")
+    parser.add_argument("--lang", choices=sorted(benchmark_parser.VOCAB), default="vi", help="Synthetic screenplay language")
+    parser.add_argument("--mode", choices=("replay", "record"), default="replay", help="Backend (record makes real calls)")
+    parser.add_argument("--fixtures", default=replay_backend.CONFIG["path"], help="Fixture file (JSON lines)")
+    parser.add_argument("--api-key", default=os.getenv("GEMINI_API_KEY", ""), help="Gemini key (record mode only)")
+    parser.add_argument("--latency", default="recorded", help="'recorded' or a fixed delay in seconds per call")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every simulated delay")
+    parser.add_argument("--strict", action="store_true", help="Fail on prompts without a fixture instead of synthesizing")
+    parser.add_argument("--chunk-tokens", type=int, default=None, help="Map-reduce chunk size (default: ai_engine setting)")
+    parser.add_argument("--fix-limit", type=int, default=5, help="Scenes to run through ai_fix_scene")
+    parser.add_argument("--rpm", type=int, default=None, help="Override the scheduler's requests per minute")
+    parser.add_argument("--strategy", default=DEFAULT_STRATEGY, help="Director strategy for the action plan")
+    parser.add_argument("--output", default=None, help="JSON results file (default: data/benchmarks/pipeline-<time>.json)")
+    parser.add_argument("--compare", default=None, help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    if args.mode == "record" and not args.api_key:
+        parser.error("--mode record needs --api-key or GEMINI_API_KEY")
+    api_key = args.api_key or "replay"
+
+    replay_backend.configure(mode=args.mode, path=args.fixtures, latency=args.latency,
+                             latency_scale=args.latency_scale, synthetic=not args.strict)
+    if args.rpm:
+        request_scheduler.scheduler = request_scheduler.RequestScheduler(requests_per_minute=args.rpm)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # Keep the app's cache, session, calibration and spend files out of the measurement
+        response_cache.CACHE_PATH = os.path.join(scratch, "ai_response_cache.sqlite")
+        utils.SESSION_FILE = os.path.join(scratch, "current_session.json")
+        token_estimator.CALIBRATION_PATH = os.path.join(scratch, "token_calibration.json")
+        token_estimator.SPEND_PATH = os.path.join(scratch, "project_spend.json")
+
+        if args.script:
+            filename = os.path.basename(args.script)
+            with open(args.script, "rb") as f:
+                file_bytes = f.read()
+        else:
+            filename = f"synthetic-{args.lang}-{args.scenes}.pdf"
+            pdf_path = os.path.join(scratch, filename)
+            benchmark_parser.write_pdf(benchmark_parser.generate_script(args.scenes, args.lang).split("\n"), pdf_path)
+            with open(pdf_path, "rb") as f:
+                file_bytes = f.read()
+
+        start = time.perf_counter()
+        scenes, results = run_pipeline(filename, file_bytes, api_key, args.chunk_tokens, args.fix_limit, args.strategy)
+        total_seconds = time.perf_counter() - start
+
+    # Per-scene numbers are only meaningful if the whole synthetic script was detected
+    if not args.script and len(scenes) != args.scenes:
+        raise SystemExit(f"Synthetic script parsed to {len(scenes)} scenes, expected {args.scenes}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {"source": args.script or filename, "detected_scenes": len(scenes), "mode": args.mode,
+                   "latency": args.latency, "latency_scale": args.latency_scale, "strict": args.strict,
+                   "chunk_tokens": args.chunk_tokens, "fix_limit": args.fix_limit, "rpm": args.rpm},
+        "results": results,
+        "total_seconds": round(total_seconds, 4),
+        "backend": replay_backend.get_stats(),
+        "scheduler": request_scheduler.get_metrics(),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Saved: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import ai_engine
+import request_scheduler
 
-def analyze_character(full_script, character_name, api_key):
+def analyze_character(full_script, character_name, api_key, scenes=None, chunk_tokens=None, concurrency=None, stream=False):
     """
     Analyzes a specific character's arc and presence in the script.
+    With `scenes`, long scripts are analysed chunk by chunk (map-reduce).
+    stream=True returns a generator of Markdown chunks.
     """
     prompt = f"""
     Bạn là một Script Doctor. Hãy phân tích nhân vật "{character_name}" trong kịch bản sau.
@@ -11,16 +14,25 @@ def analyze_character(full_script, character_name, api_key):
     1. **Tóm tắt Hành trình (Arc)**: Mô tả sự phát triển/thay đổi của nhân vật từ đầu đến cuối.
     2. **Vai trò**: Chính diện, phản diện, hay hỗ trợ? Mục tiêu của họ là gì?
     3. **Danh sách Scene xuất hiện**: Liệt kê các Scene ID mà nhân vật này có thoại hoặc hành động quan trọng (Dựa trên context).
-    
-    ---
-    NỘI DUNG KỊCH BẢN:
-    {full_script}
     """
-    return ai_engine.generate_analysis(prompt, api_key)
+    notes_instruction = f"""
+    Bạn là Script Doctor. Đây là MỘT PHẦN của một kịch bản dài.
+    Ghi chú ngắn gọn (Markdown) về nhân vật "{character_name}" trong phần này: hành động, thoại quan trọng,
+    thay đổi tâm lý và mục tiêu, kèm Scene ID. Nếu nhân vật không xuất hiện, chỉ ghi "Không xuất hiện".
+    """
+    full_prompt = ai_engine.build_script_prompt(prompt, full_script, scenes, notes_instruction, api_key, chunk_tokens, concurrency)
+    if stream:
+        return ai_engine.generate_analysis_stream(full_prompt, api_key, priority=request_scheduler.BULK, kind="character")
+    return ai_engine.generate_analysis(full_prompt, api_key, priority=request_scheduler.BULK, kind="character")
+
+def estimate_character_analysis(full_script, scenes=None, chunk_tokens=None, concurrency=None):
+    """Pre-flight estimate for analyze_character."""
+    return ai_engine.estimate_script_pass(full_script, scenes, "character", chunk_tokens, concurrency)
 
-def fix_character_issue(character_name, issue_description, related_scenes_content, api_key):
+def fix_character_issue(character_name, issue_description, related_scenes_content, api_key, stream=False):
     """
     Suggests fixes for a specific character logic issue.
+    stream=True returns a generator of Markdown chunks.
     """
     prompt = f"""
     Bạn là Script Doctor. Đang xử lý vấn đề logic của nhân vật "{character_name}".
@@ -36,4 +48,6 @@ def fix_character_issue(character_name, issue_description, related_scenes_conten
     - **Scene [ID]**: [Nội dung cần sửa/thêm/bớt]
     - **Lý do**: Tại sao sửa như vậy giải quyết được vấn đề.
     """
+    if stream:
+        return ai_engine.generate_analysis_stream(prompt, api_key)
     return ai_engine.generate_analysis(prompt, api_key)
@@ -3,32 +3,197 @@ Database module for Supabase integration
 Handles all database operations for project management
 """
 
+import functools
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 import streamlit as st
-from supabase import create_client, Client
+from postgrest.types import ReturnMethod
+from supabase import create_client, Client, ClientOptions
 from typing import List, Dict, Optional
 import json
 from datetime import datetime
+from scene_store import Scene, SceneStore
 
-def get_supabase_client() -> Optional[Client]:
-    """
-    Get Supabase client from Streamlit secrets.
-    Returns None if Supabase is not configured (fallback to local storage).
-    """
+# ============================================================================
+# CLIENT (one per process, shared by every session)
+# ============================================================================
+
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "30"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "10"))
+# A client idle for longer than this is probed before its next use
+SUPABASE_HEALTH_CHECK_SECONDS = int(os.getenv("SUPABASE_HEALTH_CHECK_SECONDS", "300"))
+
+# Failures while connecting: the request was never sent, so any operation
+# can be retried on a new client
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Also a keep-alive connection dropped by the server. The request may have
+# been committed already, so only idempotent operations are retried on these
+RECONNECT_ERRORS = CONNECT_ERRORS + (httpx.RemoteProtocolError, ConnectionError)
+
+# Kept across reloads of this module
+_CLIENT_STATE = globals().get("_CLIENT_STATE") or {
+    "lock": threading.RLock(),
+    "client": None,
+    "http": None,
+    "credentials": None,
+    "last_used": 0.0,
+    "metrics": {
+        "clients_created": 0,
+        "client_reuses": 0,
+        "health_checks": 0,
+        "reconnects": 0,
+        "requests": 0,
+        "failures": 0,
+        "request_seconds": 0.0,
+        "last_request_seconds": 0.0,
+    },
+}
+
+def _get_credentials():
+    """(url, key) from Streamlit secrets, or None when not configured."""
     try:
         url = st.secrets.get("SUPABASE_URL")
         key = st.secrets.get("SUPABASE_KEY")
-        
-        if not url or not key:
-            return None
-            
-        return create_client(url, key)
     except Exception as e:
         print(f"Supabase not configured: {e}")
         return None
+    return (url, key) if url and key else None
+
+def _count(name, amount=1):
+    with _CLIENT_STATE["lock"]:
+        _CLIENT_STATE["metrics"][name] += amount
+
+def _close_client():
+    http = _CLIENT_STATE["http"]
+    _CLIENT_STATE["client"] = _CLIENT_STATE["http"] = None
+    if http is not None:
+        try:
+            http.close()
+        except Exception as e:
+            print(f"Error closing Supabase connections: {e}")
+
+def _create_client(credentials):
+    """New client on a keep-alive connection pool."""
+    http = httpx.Client(
+        timeout=SUPABASE_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+        ),
+    )
+    url, key = credentials
+    try:
+        options = ClientOptions(httpx_client=http, postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS)
+    except TypeError:
+        # Older supabase-py: no shared httpx client, the client keeps its own pool
+        options = ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS)
+    client = create_client(url, key, options=options)
+    _CLIENT_STATE.update(client=client, http=http, credentials=credentials, last_used=time.time())
+    _CLIENT_STATE["metrics"]["clients_created"] += 1
+    return client
+
+def _is_healthy(client):
+    _count("health_checks")
+    try:
+        client.table("projects").select("id").limit(1).execute()
+        return True
+    except Exception as e:
+        print(f"Supabase health check failed: {e}")
+        return False
+
+def get_supabase_client() -> Optional[Client]:
+    """
+    Shared Supabase client (created on first use, rebuilt if the secrets
+    change or it fails a health check after being idle).
+    Returns None if Supabase is not configured (fallback to local storage).
+    """
+    credentials = _get_credentials()
+    if credentials is None:
+        return None
+    
+    with _CLIENT_STATE["lock"]:
+        client = _CLIENT_STATE["client"]
+        try:
+            if client is None or _CLIENT_STATE["credentials"] != credentials:
+                _close_client()
+                return _create_client(credentials)
+        except Exception as e:
+            print(f"Supabase client error: {e}")
+            return None
+        
+        # Only the first caller after an idle period probes the client
+        needs_check = time.time() - _CLIENT_STATE["last_used"] > SUPABASE_HEALTH_CHECK_SECONDS
+        _CLIENT_STATE["metrics"]["client_reuses"] += 1
+        _CLIENT_STATE["last_used"] = time.time()
+    
+    # Network round-trip outside the lock: other callers are not held up
+    if needs_check and not _is_healthy(client):
+        with _CLIENT_STATE["lock"]:
+            if _CLIENT_STATE["client"] is client:
+                _count("reconnects")
+                _close_client()
+                try:
+                    return _create_client(credentials)
+                except Exception as e:
+                    print(f"Supabase client error: {e}")
+                    return None
+            return _CLIENT_STATE["client"]
+    return client
+
+def reset_supabase_client():
+    """Drop the shared client; the next call reconnects."""
+    with _CLIENT_STATE["lock"]:
+        _close_client()
+
+def _run(operation, idempotent=True):
+    """
+    Run operation(client) -> result on the shared client, timing it and
+    reconnecting once on a network-level failure. Other errors propagate.
+    Pass idempotent=False for inserts: they are only retried when the
+    connection failed before the request was sent.
+    """
+    retry_errors = RECONNECT_ERRORS if idempotent else CONNECT_ERRORS
+    for attempt in range(2):
+        client = get_supabase_client()
+        if client is None:
+            raise RuntimeError("Supabase is not configured")
+        start = time.perf_counter()
+        try:
+            return operation(client)
+        except retry_errors as e:
+            if attempt:
+                _count("failures")
+                raise
+            print(f"Supabase connection error ({e}), reconnecting")
+            _count("reconnects")
+            reset_supabase_client()
+        except Exception:
+            _count("failures")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with _CLIENT_STATE["lock"]:
+                _CLIENT_STATE["metrics"]["requests"] += 1
+                _CLIENT_STATE["metrics"]["request_seconds"] += elapsed
+                _CLIENT_STATE["metrics"]["last_request_seconds"] = elapsed
+
+def get_client_metrics() -> Dict:
+    with _CLIENT_STATE["lock"]:
+        metrics = dict(_CLIENT_STATE["metrics"])
+    lookups = metrics["clients_created"] + metrics["client_reuses"]
+    metrics["reuse_rate"] = metrics["client_reuses"] / lookups if lookups else 0.0
+    metrics["avg_request_seconds"] = metrics["request_seconds"] / metrics["requests"] if metrics["requests"] else 0.0
+    return metrics
 
 def is_supabase_enabled() -> bool:
-    """Check if Supabase is configured and available"""
-    return get_supabase_client() is not None
+    """Check if Supabase is configured (secrets only, no connection)"""
+    return _get_credentials() is not None
 
 # ============================================================================
 # PROJECT OPERATIONS
@@ -36,8 +201,7 @@ def is_supabase_enabled() -> bool:
 
 def create_project(name: str, description: str = "") -> Optional[Dict]:
     """Create a new project"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return None
     
     try:
@@ -49,7 +213,7 @@ def create_project(name: str, description: str = "") -> Optional[Dict]:
             "metadata": {}
         }
         
-        result = supabase.table("projects").insert(data).execute()
+        result = _run(lambda supabase: supabase.table("projects").insert(data).execute(), idempotent=False)
         return result.data[0] if result.data else None
     except Exception as e:
         st.error(f"Error creating project: {e}")
@@ -57,17 +221,16 @@ def create_project(name: str, description: str = "") -> Optional[Dict]:
 
 def get_projects() -> List[Dict]:
     """Get all projects for current user"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return []
     
     try:
         user_id = st.session_state.get("user_id", "default_user")
-        result = supabase.table("projects")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .order("updated_at", desc=True)\
-            .execute()
+        result = _run(lambda supabase: supabase.table("projects")
+            .select("*")
+            .eq("user_id", user_id)
+            .order("updated_at", desc=True)
+            .execute())
         
         return result.data if result.data else []
     except Exception as e:
@@ -76,26 +239,18 @@ def get_projects() -> List[Dict]:
 
 def get_project(project_id: str) -> Optional[Dict]:
     """Get a specific project by ID"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return None
     
     try:
-        result = supabase.table("projects")\
-            .select("*")\
-            .eq("id", project_id)\
-            .single()\
-            .execute()
-        
-        return result.data if result.data else None
+        return _run(lambda supabase: _query_project(supabase, project_id))
     except Exception as e:
         st.error(f"Error fetching project: {e}")
         return None
 
 def update_project(project_id: str, name: str = None, description: str = None, metadata: Dict = None) -> bool:
     """Update project details"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return False
     
     try:
@@ -108,7 +263,7 @@ def update_project(project_id: str, name: str = None, description: str = None, m
         if metadata:
             data["metadata"] = metadata
         
-        supabase.table("projects").update(data).eq("id", project_id).execute()
+        _run(lambda supabase: supabase.table("projects").update(data).eq("id", project_id).execute())
         return True
     except Exception as e:
         st.error(f"Error updating project: {e}")
@@ -116,12 +271,14 @@ def update_project(project_id: str, name: str = None, description: str = None, m
 
 def delete_project(project_id: str) -> bool:
     """Delete a project and all related data"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return False
     
     try:
-        supabase.table("projects").delete().eq("id", project_id).execute()
+        _run(lambda supabase: supabase.table("projects").delete().eq("id", project_id).execute())
+        _set_scene_snapshot(project_id, None)
+        import save_queue
+        save_queue.get_queue().discard(project_id)
         return True
     except Exception as e:
         st.error(f"Error deleting project: {e}")
@@ -131,50 +288,238 @@ def delete_project(project_id: str) -> bool:
 # SCENE OPERATIONS
 # ============================================================================
 
+# Last known database state of each project's scenes, in row order:
+# [{"row_id", "scene_id", "header", "hash", "original_index"}]. save_scenes diffs
+# against it so only changed rows are written. Kept across reloads.
+_SCENE_SNAPSHOTS = globals().get("_SCENE_SNAPSHOTS") or {}
+_SNAPSHOT_LOCK = globals().get("_SNAPSHOT_LOCK") or threading.Lock()
+
+SCENE_SNAPSHOT_COLUMNS = "id, scene_id, header, original_index, content_hash"
+# What the navigator needs when a project is opened lazily (no content)
+SCENE_METADATA_COLUMNS = "id, scene_id, header, original_index, content_hash"
+# Row ids per request when fetching scene content
+SCENE_CONTENT_BATCH = 200
+# Projects with more scenes than this open without scene content (loaded on demand)
+SCENE_EAGER_LOAD_LIMIT = int(os.getenv("SCENE_EAGER_LOAD_LIMIT", "300"))
+
+def scene_hash(header: str, content: str) -> str:
+    return hashlib.sha1(f"{header}\0{content}".encode("utf-8")).hexdigest()
+
+def _snapshot_from_rows(rows: List[Dict]) -> List[Dict]:
+    return [{
+        "row_id": row["id"],
+        "scene_id": row["scene_id"],
+        "header": row.get("header"),
+        # Full rows are hashed locally; older rows may have no stored hash
+        "hash": scene_hash(row["header"], row["content"]) if "content" in row else row.get("content_hash"),
+        "original_index": row.get("original_index", 0)
+    } for row in rows]
+
+def _get_scene_snapshot(project_id: str) -> List[Dict]:
+    with _SNAPSHOT_LOCK:
+        snapshot = _SCENE_SNAPSHOTS.get(project_id)
+    if snapshot is None:
+        # First save in this process: row ids and hashes only, no content
+        result = _run(lambda supabase: supabase.table("scenes")
+            .select(SCENE_SNAPSHOT_COLUMNS)
+            .eq("project_id", project_id)
+            .order("original_index")
+            .execute())
+        snapshot = _snapshot_from_rows(result.data or [])
+    return snapshot
+
+def _set_scene_snapshot(project_id: str, snapshot: Optional[List[Dict]]) -> None:
+    with _SNAPSHOT_LOCK:
+        if snapshot is None:
+            _SCENE_SNAPSHOTS.pop(project_id, None)
+        else:
+            _SCENE_SNAPSHOTS[project_id] = snapshot
+
+def diff_scenes(snapshot: List[Dict], scenes: List[Dict]) -> Dict:
+    """
+    Compares the stored rows with the current scene list. Scenes loaded from
+    the database are matched by row_id, others by scene_id (duplicates pair
+    up in order). Returns: upserts (new or edited rows, full columns),
+    reorders (row_id -> index), renames (scenes whose content is not loaded
+    but whose id or header changed: row_id -> columns to update, content
+    untouched), deletes (row ids), the snapshot after applying them and the
+    scenes it describes (kept).
+    """
+    rows_by_id = {row["row_id"]: row for row in snapshot}
+    claimed = {}
+    for position, scene in enumerate(scenes):
+        row_id = scene.get("row_id")
+        if row_id in rows_by_id and row_id not in claimed:
+            claimed[row_id] = position
+    row_at = {position: rows_by_id[row_id] for row_id, position in claimed.items()}
+    
+    by_scene_id = {}
+    for row in snapshot:
+        if row["row_id"] not in claimed:
+            by_scene_id.setdefault(row["scene_id"], []).append(row)
+    
+    upserts, reorders, renames, new_snapshot, kept = [], {}, {}, [], []
+    for position, scene in enumerate(scenes):
+        header, content = scene["header"], scene["content"]
+        index = scene.get("original_index", 0)
+        row = row_at.get(position)
+        if row is None:
+            candidates = by_scene_id.get(scene["id"])
+            row = candidates.pop(0) if candidates else None
+        
+        if content is None:
+            # Not loaded (lazily opened project), so not edited either
+            if row is None:
+                print(f"Scene {scene['id']} has no content and no stored row, not saved")
+                continue
+            content_hash = row["hash"]
+            # Snapshots taken before headers were recorded can't tell
+            header_changed = row.get("header") is not None and row["header"] != header
+            if header_changed:
+                # The hash covers the header: recomputed once the content is loaded and saved
+                content_hash = None
+            if row["scene_id"] != scene["id"] or header_changed:
+                renames[row["row_id"]] = {
+                    "scene_id": scene["id"],
+                    "header": header,
+                    "original_index": index,
+                    "content_hash": content_hash
+                }
+            elif row["original_index"] != index:
+                reorders[row["row_id"]] = index
+        else:
+            content_hash = scene_hash(header, content)
+            if row is None or row["hash"] != content_hash or row["scene_id"] != scene["id"]:
+                upserts.append({
+                    "id": row["row_id"] if row else str(uuid.uuid4()),
+                    "scene_id": scene["id"],
+                    "header": header,
+                    "content": content,
+                    "original_index": index,
+                    "content_hash": content_hash
+                })
+            elif row["original_index"] != index:
+                reorders[row["row_id"]] = index
+        new_snapshot.append({
+            "row_id": row["row_id"] if row else upserts[-1]["id"],
+            "scene_id": scene["id"],
+            "header": header,
+            "hash": content_hash,
+            "original_index": index
+        })
+        kept.append(scene)
+    
+    deletes = [row["row_id"] for rows in by_scene_id.values() for row in rows]
+    return {"upserts": upserts, "reorders": reorders, "renames": renames,
+            "deletes": deletes, "snapshot": new_snapshot, "kept": kept}
+
+def _query_scene_contents(supabase, project_id: str, row_ids: List[str]) -> Dict[str, str]:
+    contents = {}
+    for start in range(0, len(row_ids), SCENE_CONTENT_BATCH):
+        result = (supabase.table("scenes").select("id, content").eq("project_id", project_id)
+                  .in_("id", row_ids[start:start + SCENE_CONTENT_BATCH]).execute())
+        contents.update({row["id"]: row["content"] for row in result.data or []})
+    return contents
+
+def get_scene_contents(project_id: str, row_ids: List[str]) -> Dict[str, str]:
+    """Content of some scene rows ({row_id: content}), for lazily opened projects"""
+    if not is_supabase_enabled() or not row_ids:
+        return {}
+    
+    try:
+        return _run(lambda supabase: _query_scene_contents(supabase, project_id, list(row_ids)))
+    except Exception as e:
+        st.error(f"Error fetching scene content: {e}")
+        return {}
+
+def _reorder_scenes(project_id: str, reorders: Dict[str, int], scenes_by_row: Dict[str, Dict]) -> None:
+    """original_index only, through the reorder_scenes RPC (supabase_schema.sql)."""
+    try:
+        _run(lambda supabase: supabase.rpc("reorder_scenes", {
+            "p_project_id": project_id,
+            "p_ids": list(reorders),
+            "p_indexes": list(reorders.values())
+        }).execute())
+    except RECONNECT_ERRORS:
+        raise
+    except Exception as e:
+        # Schema without the function: upsert the full rows instead
+        print(f"reorder_scenes RPC unavailable ({e}), upserting reordered rows")
+        rows = _with_content(project_id, [scenes_by_row[row_id] for row_id in reorders])
+        _run(lambda supabase: supabase.table("scenes").upsert(rows, returning=ReturnMethod.minimal).execute())
+
+def _with_content(project_id: str, rows: List[Dict]) -> List[Dict]:
+    """Full rows for an upsert; content not loaded in the session is read back first."""
+    missing = [row["id"] for row in rows if row.get("content") is None]
+    contents = _run(lambda supabase: _query_scene_contents(supabase, project_id, missing)) if missing else {}
+    return [dict(row, project_id=project_id, content=row.get("content") if row.get("content") is not None
+                 else contents[row["id"]]) for row in rows]
+
 def save_scenes(project_id: str, scenes: List[Dict]) -> bool:
-    """Save scenes for a project (replaces all existing scenes)"""
-    supabase = get_supabase_client()
-    if not supabase:
+    """
+    Save scenes for a project. Only the difference with the last saved state
+    is written: edited / new scenes are upserted, removed ones deleted and
+    moved ones re-indexed, so a one-scene edit is a one-row write.
+    Errors are raised, not shown: this runs on the save_queue thread.
+    """
+    if not is_supabase_enabled():
         return False
     
     try:
-        # Delete old scenes
-        supabase.table("scenes").delete().eq("project_id", project_id).execute()
+        changes = diff_scenes(_get_scene_snapshot(project_id), scenes)
+        if not (changes["upserts"] or changes["reorders"] or changes["renames"] or changes["deletes"]):
+            _set_scene_snapshot(project_id, changes["snapshot"])
+            return True
         
-        # Insert new scenes
-        if scenes:
-            data = [{
-                "project_id": project_id,
-                "scene_id": scene["id"],
-                "header": scene["header"],
-                "content": scene["content"],
-                "original_index": scene.get("original_index", 0)
-            } for scene in scenes]
-            
-            supabase.table("scenes").insert(data).execute()
+        if changes["upserts"]:
+            rows = [dict(row, project_id=project_id) for row in changes["upserts"]]
+            _run(lambda supabase: supabase.table("scenes").upsert(rows, returning=ReturnMethod.minimal).execute())
+        
+        # Unloaded scenes: only the changed columns, the content is not read back
+        for row_id, columns in changes["renames"].items():
+            _run(lambda supabase: supabase.table("scenes")
+                .update(columns, returning=ReturnMethod.minimal)
+                .eq("id", row_id)
+                .execute())
+        
+        if changes["reorders"]:
+            scenes_by_row = {}
+            for scene, row in zip(changes["kept"], changes["snapshot"]):
+                if row["row_id"] in changes["reorders"]:
+                    scenes_by_row[row["row_id"]] = {
+                        "id": row["row_id"], "scene_id": scene["id"], "header": scene["header"],
+                        "content": scene["content"], "original_index": row["original_index"],
+                        "content_hash": row["hash"]
+                    }
+            _reorder_scenes(project_id, changes["reorders"], scenes_by_row)
+        
+        if changes["deletes"]:
+            _run(lambda supabase: supabase.table("scenes")
+                .delete(returning=ReturnMethod.minimal)
+                .in_("id", changes["deletes"])
+                .execute())
+        
+        _set_scene_snapshot(project_id, changes["snapshot"])
         
         # Update project timestamp
         update_project(project_id)
         
         return True
     except Exception as e:
-        st.error(f"Error saving scenes: {e}")
-        return False
+        # The database may be partly updated: re-read its state next time
+        _set_scene_snapshot(project_id, None)
+        print(f"Error saving scenes: {e}")
+        raise
 
 def get_scenes(project_id: str) -> List[Dict]:
     """Get all scenes for a project"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return []
     
     try:
-        result = supabase.table("scenes")\
-            .select("*")\
-            .eq("project_id", project_id)\
-            .order("original_index")\
-            .execute()
-        
-        return result.data if result.data else []
+        rows = _run(lambda supabase: _query_scenes(supabase, project_id))
+        _set_scene_snapshot(project_id, _snapshot_from_rows(rows))
+        return rows
     except Exception as e:
         st.error(f"Error fetching scenes: {e}")
         return []
@@ -184,14 +529,13 @@ def get_scenes(project_id: str) -> List[Dict]:
 # ============================================================================
 
 def save_analysis(project_id: str, creative_report: Dict, marketing_report: str, summary: List[Dict]) -> bool:
-    """Save analysis results for a project"""
-    supabase = get_supabase_client()
-    if not supabase:
+    """Save analysis results for a project (raises on error, like save_scenes)"""
+    if not is_supabase_enabled():
         return False
     
     try:
         # Delete old analysis
-        supabase.table("analysis_results").delete().eq("project_id", project_id).execute()
+        _run(lambda supabase: supabase.table("analysis_results").delete().eq("project_id", project_id).execute())
         
         # Insert new analysis
         data = {
@@ -201,31 +545,23 @@ def save_analysis(project_id: str, creative_report: Dict, marketing_report: str,
             "summary": summary
         }
         
-        supabase.table("analysis_results").insert(data).execute()
+        _run(lambda supabase: supabase.table("analysis_results").insert(data).execute(), idempotent=False)
         
         # Update project timestamp
         update_project(project_id)
         
         return True
     except Exception as e:
-        st.error(f"Error saving analysis: {e}")
-        return False
+        print(f"Error saving analysis: {e}")
+        raise
 
 def get_analysis(project_id: str) -> Optional[Dict]:
     """Get analysis results for a project"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return None
     
     try:
-        result = supabase.table("analysis_results")\
-            .select("*")\
-            .eq("project_id", project_id)\
-            .order("created_at", desc=True)\
-            .limit(1)\
-            .execute()
-        
-        return result.data[0] if result.data else None
+        return _run(lambda supabase: _query_analysis(supabase, project_id))
     except Exception as e:
         st.error(f"Error fetching analysis: {e}")
         return None
@@ -235,14 +571,13 @@ def get_analysis(project_id: str) -> Optional[Dict]:
 # ============================================================================
 
 def save_action_plan(project_id: str, user_strategy: str, plan: List[Dict], task_completion: Dict = None) -> bool:
-    """Save action plan for a project"""
-    supabase = get_supabase_client()
-    if not supabase:
+    """Save action plan for a project (raises on error, like save_scenes)"""
+    if not is_supabase_enabled():
         return False
     
     try:
         # Delete old action plan
-        supabase.table("action_plans").delete().eq("project_id", project_id).execute()
+        _run(lambda supabase: supabase.table("action_plans").delete().eq("project_id", project_id).execute())
         
         # Insert new action plan
         data = {
@@ -252,39 +587,30 @@ def save_action_plan(project_id: str, user_strategy: str, plan: List[Dict], task
             "task_completion": task_completion or {}
         }
         
-        supabase.table("action_plans").insert(data).execute()
+        _run(lambda supabase: supabase.table("action_plans").insert(data).execute(), idempotent=False)
         
         # Update project timestamp
         update_project(project_id)
         
         return True
     except Exception as e:
-        st.error(f"Error saving action plan: {e}")
-        return False
+        print(f"Error saving action plan: {e}")
+        raise
 
 def get_action_plan(project_id: str) -> Optional[Dict]:
     """Get action plan for a project"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return None
     
     try:
-        result = supabase.table("action_plans")\
-            .select("*")\
-            .eq("project_id", project_id)\
-            .order("updated_at", desc=True)\
-            .limit(1)\
-            .execute()
-        
-        return result.data[0] if result.data else None
+        return _run(lambda supabase: _query_action_plan(supabase, project_id))
     except Exception as e:
         st.error(f"Error fetching action plan: {e}")
         return None
 
 def update_task_completion(project_id: str, task_completion: Dict) -> bool:
     """Update task completion status"""
-    supabase = get_supabase_client()
-    if not supabase:
+    if not is_supabase_enabled():
         return False
     
     try:
@@ -293,16 +619,118 @@ def update_task_completion(project_id: str, task_completion: Dict) -> bool:
             "updated_at": datetime.now().isoformat()
         }
         
-        supabase.table("action_plans")\
-            .update(data)\
-            .eq("project_id", project_id)\
-            .execute()
+        _run(lambda supabase: supabase.table("action_plans")
+            .update(data)
+            .eq("project_id", project_id)
+            .execute())
         
         return True
     except Exception as e:
         st.error(f"Error updating task completion: {e}")
         return False
 
+# ============================================================================
+# PROJECT BUNDLE (everything needed to open a project)
+# ============================================================================
+
+def _query_project(supabase, project_id: str) -> Optional[Dict]:
+    result = supabase.table("projects").select("*").eq("id", project_id).limit(1).execute()
+    return result.data[0] if result.data else None
+
+def _query_scenes(supabase, project_id: str, columns: str = "*") -> List[Dict]:
+    result = supabase.table("scenes").select(columns).eq("project_id", project_id).order("original_index").execute()
+    return result.data or []
+
+def _query_analysis(supabase, project_id: str) -> Optional[Dict]:
+    result = (supabase.table("analysis_results").select("*").eq("project_id", project_id)
+              .order("created_at", desc=True).limit(1).execute())
+    return result.data[0] if result.data else None
+
+def _query_action_plan(supabase, project_id: str) -> Optional[Dict]:
+    result = (supabase.table("action_plans").select("*").eq("project_id", project_id)
+              .order("updated_at", desc=True).limit(1).execute())
+    return result.data[0] if result.data else None
+
+BUNDLE_QUERIES = {
+    "project": _query_project,
+    "scenes": _query_scenes,
+    "analysis": _query_analysis,
+    "action_plan": _query_action_plan,
+}
+
+# Whether the get_project_bundle RPC exists (None = not tried yet) and
+# project-open timings. Kept across reloads.
+_PROJECT_LOADS = globals().get("_PROJECT_LOADS") or {
+    "rpc_available": None,
+    "loads": 0,
+    "load_seconds": 0.0,
+    "last_load_seconds": 0.0,
+    "last_method": None,
+}
+
+def _fetch_bundle_concurrently(project_id: str, scene_columns: str = "*") -> Dict:
+    """The four selects in parallel on the shared client's connection pool."""
+    queries = dict(BUNDLE_QUERIES, scenes=functools.partial(_query_scenes, columns=scene_columns))
+    with ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="project-load") as pool:
+        futures = {name: pool.submit(_run, lambda supabase, query=query: query(supabase, project_id))
+                   for name, query in queries.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def get_project_bundle(project_id: str, content_scene_limit: Optional[int] = None) -> Optional[Dict]:
+    """
+    {"project", "scenes", "analysis", "action_plan"} in one round trip via
+    the get_project_bundle RPC (supabase_schema.sql), or four concurrent
+    selects when the schema doesn't have it. None if the project is missing.
+    With content_scene_limit, scenes of projects larger than that come
+    without their content (metadata only).
+    """
+    if not is_supabase_enabled():
+        return None
+    
+    start = time.perf_counter()
+    bundle, method = None, "rpc"
+    if _PROJECT_LOADS["rpc_available"] is not False:
+        try:
+            result = _run(lambda supabase: supabase.rpc("get_project_bundle", {
+                "p_project_id": project_id,
+                "p_content_scene_limit": content_scene_limit
+            }).execute())
+            bundle = result.data or {}
+            _PROJECT_LOADS["rpc_available"] = True
+        except RECONNECT_ERRORS:
+            raise
+        except Exception as e:
+            print(f"get_project_bundle RPC unavailable ({e}), fetching concurrently")
+            _PROJECT_LOADS["rpc_available"] = False
+    if bundle is None:
+        method = "concurrent"
+        if content_scene_limit is None:
+            bundle = _fetch_bundle_concurrently(project_id)
+        else:
+            bundle = _fetch_bundle_concurrently(project_id, SCENE_METADATA_COLUMNS)
+            if len(bundle["scenes"] or []) <= content_scene_limit:
+                contents = _run(lambda supabase: _query_scene_contents(
+                    supabase, project_id, [row["id"] for row in bundle["scenes"]]))
+                for row in bundle["scenes"]:
+                    row["content"] = contents.get(row["id"])
+    
+    elapsed = time.perf_counter() - start
+    _PROJECT_LOADS.update(last_load_seconds=elapsed, last_method=method)
+    _PROJECT_LOADS["loads"] += 1
+    _PROJECT_LOADS["load_seconds"] += elapsed
+    print(f"Opened project {project_id} in {elapsed * 1000:.0f} ms ({method})")
+    
+    if not bundle.get("project"):
+        return None
+    bundle["scenes"] = bundle.get("scenes") or []
+    _set_scene_snapshot(project_id, _snapshot_from_rows(bundle["scenes"]))
+    return bundle
+
+def get_project_load_metrics() -> Dict:
+    metrics = {k: v for k, v in _PROJECT_LOADS.items() if k != "rpc_available"}
+    metrics["avg_load_seconds"] = metrics["load_seconds"] / metrics["loads"] if metrics["loads"] else 0.0
+    return metrics
+
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
@@ -310,21 +738,33 @@ def update_task_completion(project_id: str, task_completion: Dict) -> bool:
 def load_project_to_session(project_id: str) -> bool:
     """Load a project and all its data into session state"""
     try:
-        # Load project
-        project = get_project(project_id)
-        if not project:
+        # Write pending background saves of this project first, so they are read back
+        import save_queue
+        save_queue.get_queue().flush(project_id)
+        
+        # Project, scenes, analysis and action plan in one round trip;
+        # large projects come without scene content (fetched when needed)
+        bundle = get_project_bundle(project_id, content_scene_limit=SCENE_EAGER_LOAD_LIMIT)
+        if not bundle:
             return False
+        project = bundle['project']
         
         st.session_state['current_project_id'] = project_id
         st.session_state['current_project_name'] = project['name']
         
-        # Load scenes
-        scenes = get_scenes(project_id)
+        # Load scenes (rows carry the script's scene id in "scene_id")
+        scenes = bundle['scenes']
         if scenes:
-            st.session_state['scene_list'] = scenes
+            st.session_state['scene_list'] = SceneStore((Scene(
+                row["scene_id"],
+                row["header"],
+                row.get("content"),
+                row.get("original_index", 0),
+                row_id=row["id"]
+            ) for row in scenes), content_loader=functools.partial(get_scene_contents, project_id))
         
         # Load analysis
-        analysis = get_analysis(project_id)
+        analysis = bundle.get('analysis')
         if analysis:
             st.session_state['analysis_results'] = {
                 'creative': analysis['creative_report'],
@@ -334,7 +774,7 @@ def load_project_to_session(project_id: str) -> bool:
             st.session_state['analysis_report'] = analysis['creative_report']
         
         # Load action plan
-        action_plan = get_action_plan(project_id)
+        action_plan = bundle.get('action_plan')
         if action_plan:
             st.session_state['action_plan'] = action_plan['plan']
             st.session_state['user_strategy'] = action_plan['user_strategy']
@@ -345,37 +785,60 @@ def load_project_to_session(project_id: str) -> bool:
         st.error(f"Error loading project: {e}")
         return False
 
+def get_project_payload() -> Dict:
+    """
+    Snapshot of the session's saveable state, by section. Taken on the
+    script thread so it can be written later from any thread.
+    """
+    payload = {}
+    
+    if 'scene_list' in st.session_state:
+        scene_list = st.session_state['scene_list']
+        payload['scenes'] = scene_list.to_dicts() if hasattr(scene_list, 'to_dicts') else list(scene_list)
+    
+    if 'analysis_results' in st.session_state:
+        results = st.session_state['analysis_results']
+        payload['analysis'] = {
+            'creative': results.get('creative', {}),
+            'marketing': results.get('marketing', ''),
+            'summary': results.get('summary', [])
+        }
+    
+    if 'action_plan' in st.session_state:
+        payload['action_plan'] = {
+            'user_strategy': st.session_state.get('user_strategy', ''),
+            'plan': st.session_state['action_plan'],
+            'task_completion': st.session_state.get('task_completion', {})
+        }
+    
+    return payload
+
+def save_project_section(project_id: str, section: str, value) -> bool:
+    """Write one section of get_project_payload() (used by save_queue)"""
+    if section == 'scenes':
+        return save_scenes(project_id, value)
+    if section == 'analysis':
+        return save_analysis(project_id, value['creative'], value['marketing'], value['summary'])
+    if section == 'action_plan':
+        return save_action_plan(project_id, value['user_strategy'], value['plan'], value['task_completion'])
+    raise ValueError(f"Unknown project section: {section}")
+
 def save_current_project() -> bool:
-    """Save current session state to database"""
+    """Save current session state to database (blocking; auto_save uses save_queue)"""
     project_id = st.session_state.get('current_project_id')
     if not project_id:
         return False
     
     try:
-        # Save scenes
-        if 'scene_list' in st.session_state:
-            save_scenes(project_id, st.session_state['scene_list'])
-        
-        # Save analysis
-        if 'analysis_results' in st.session_state:
-            results = st.session_state['analysis_results']
-            save_analysis(
-                project_id,
-                results.get('creative', {}),
-                results.get('marketing', ''),
-                results.get('summary', [])
-            )
-        
-        # Save action plan
-        if 'action_plan' in st.session_state:
-            save_action_plan(
-                project_id,
-                st.session_state.get('user_strategy', ''),
-                st.session_state['action_plan'],
-                st.session_state.get('task_completion', {})
-            )
-        
-        return True
+        import save_queue
+        queue = save_queue.get_queue()
+        # Through the queue, so an older queued save can't overwrite this one
+        queue.submit(project_id, get_project_payload())
+        if queue.flush(project_id):
+            return True
+        # The writers run on the queue thread too, so the error is reported here
+        st.error(f"Error saving project: {queue.get_status(project_id)['error']}")
+        return False
     except Exception as e:
         st.error(f"Error saving project: {e}")
         return False
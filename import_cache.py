@@ -0,0 +1,106 @@
+"""
+On-disk cache of parsed PDF imports
+Entries are keyed by a hash of the uploaded bytes plus the parser version,
+so re-importing a known draft skips extraction and parsing entirely.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import page_store
+import script_parser
+import utils
+
+CACHE_DIR = os.path.join(utils.DATA_DIR, "import_cache")
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # 200 MB, least recently used entries go first
+
+# Modules whose source decides what an import produces
+VERSIONED_MODULES = (script_parser, page_store)
+
+_parser_version = None
+
+def get_parser_version() -> str:
+    """
+    Fingerprint of the parser and page storage source. Any change to
+    script_parser.py or page_store.py produces a new version, which
+    invalidates every cached entry.
+    """
+    global _parser_version
+    if _parser_version is None:
+        digest = hashlib.sha256()
+        for module in VERSIONED_MODULES:
+            with open(module.__file__, 'rb') as f:
+                digest.update(f.read())
+        _parser_version = digest.hexdigest()[:12]
+    return _parser_version
+
+def cache_key(file_bytes: bytes) -> str:
+    """Cache key: parser version + SHA-256 of the uploaded bytes"""
+    return f"{get_parser_version()}-{hashlib.sha256(file_bytes).hexdigest()}"
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def get_cached_import(file_bytes: bytes) -> Optional[Dict]:
+    """
+    Returns {"pages": [...], "scenes": [...]} for a known file, or None.
+    """
+    path = _entry_path(cache_key(file_bytes))
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        # Mark as recently used for LRU eviction
+        os.utime(path)
+        return entry
+    except Exception as e:
+        print(f"Import cache read error: {e}")
+        return None
+
+def save_import(file_bytes: bytes, pages: List[str], scenes: List[Dict]) -> None:
+    """Store the extracted page texts and scene list for a file"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = _entry_path(cache_key(file_bytes))
+        
+        # Unique temp file per writer: concurrent imports of the same file don't collide
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+            json.dump({"pages": pages, "scenes": scenes}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(f.name, path)
+        
+        evict()
+    except Exception as e:
+        print(f"Import cache write error: {e}")
+
+def evict(max_bytes: int = MAX_CACHE_BYTES) -> None:
+    """
+    Drop entries from older parser versions, then least recently used
+    entries until the cache fits in max_bytes.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    
+    version_prefix = f"{get_parser_version()}-"
+    entries = []
+    
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if name.endswith(".tmp"):
+            continue  # another import is still writing it
+        if not name.startswith(version_prefix):
+            os.remove(path)
+            continue
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(path)
+        total_bytes -= size
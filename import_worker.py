@@ -0,0 +1,166 @@
+"""
+Isolated import worker
+Runs PDF / Fountain / FDX parsing in a separate process so a huge or broken
+file cannot block the Streamlit script thread or exhaust the server's memory.
+The worker has a wall-clock timeout and an address-space cap, reports
+progress through a queue, and can be cancelled from the UI.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, timeout and cancel still work
+    resource = None
+
+IMPORT_TIMEOUT_SECONDS = int(os.getenv("IMPORT_TIMEOUT_SECONDS", "300"))
+IMPORT_MEMORY_LIMIT_MB = int(os.getenv("IMPORT_MEMORY_LIMIT_MB", "2048"))
+
+# spawn: never fork the multi-threaded Streamlit server
+_CONTEXT = multiprocessing.get_context("spawn")
+
+def _limit_memory(limit_mb):
+    if resource is None or not limit_mb:
+        return
+    limit = limit_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _run_import(filename, file_bytes, messages, memory_limit_mb):
+    """
+    Worker process entry point. Messages sent back:
+    ("progress", pages_done, total_pages), ("scene", scene),
+    ("done", pages or None), ("error", message)
+    """
+    # Own process group, so cancel also stops the PDF extraction pool
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    _limit_memory(memory_limit_mb)
+
+    try:
+        import screenplay_formats
+        import script_parser
+
+        if screenplay_formats.is_structured_file(filename):
+            for scene in screenplay_formats.iter_structured_scenes(filename, file_bytes):
+                messages.put(("scene", scene))
+            messages.put(("done", None))
+            return
+
+        def on_page(pages_done, total_pages):
+            messages.put(("progress", pages_done, total_pages))
+
+        pages = []
+        for scene in script_parser.iter_scenes_from_pdf(file_bytes, on_page=on_page, page_sink=pages):
+            messages.put(("scene", scene))
+        messages.put(("done", pages))
+    except MemoryError:
+        messages.put(("error", f"File vượt quá giới hạn bộ nhớ ({memory_limit_mb} MB)."))
+    except Exception as e:
+        messages.put(("error", str(e)))
+
+class ImportJob:
+    """
+    One running import. Keep it in st.session_state and call poll() on each
+    rerun; status moves from "running" to "done", "error", "timeout" or
+    "cancelled".
+    """
+
+    def __init__(self, filename, file_bytes, timeout=None, memory_limit_mb=None):
+        self.filename = filename
+        self.timeout = IMPORT_TIMEOUT_SECONDS if timeout is None else timeout
+        self.memory_limit_mb = IMPORT_MEMORY_LIMIT_MB if memory_limit_mb is None else memory_limit_mb
+        self.status = "running"
+        self.error = None
+        self.pages_done = 0
+        self.total_pages = 0
+        self.scenes = []
+        self.pages = None
+        self.started_at = time.time()
+
+        self._messages = _CONTEXT.Queue()
+        self._process = _CONTEXT.Process(
+            target=_run_import,
+            args=(filename, file_bytes, self._messages, self.memory_limit_mb),
+            daemon=True
+        )
+        self._process.start()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    @property
+    def finished(self):
+        return self.status != "running"
+
+    def _drain(self, wait=0):
+        """Read every pending message (results must be read before join)."""
+        while True:
+            try:
+                message = self._messages.get(timeout=wait) if wait else self._messages.get_nowait()
+            except queue.Empty:
+                return
+            wait = 0
+            kind = message[0]
+            if kind == "progress":
+                self.pages_done, self.total_pages = message[1], message[2]
+            elif kind == "scene":
+                self.scenes.append(message[1])
+            elif kind == "done":
+                self.pages = message[1]
+                self.status = "done"
+            elif kind == "error":
+                self.error = message[1]
+                self.status = "error"
+            if self.finished:
+                self._stop()
+                return
+
+    def poll(self, wait=0):
+        """Update progress from the worker; enforces the timeout."""
+        if self.finished:
+            return self.status
+        self._drain(wait)
+        if self.finished:
+            return self.status
+
+        if not self._process.is_alive():
+            # Exited without a result: pick up a late message, else it was killed (e.g. out of memory)
+            self._drain(wait=0.5)
+            if not self.finished:
+                self.status = "error"
+                self.error = (f"Tiến trình import dừng bất thường (mã {self._process.exitcode}), "
+                              f"có thể do vượt giới hạn bộ nhớ ({self.memory_limit_mb} MB).")
+                self._stop()
+        elif self.timeout and self.elapsed > self.timeout:
+            self.status = "timeout"
+            self.error = f"Quá thời gian xử lý ({self.timeout} giây)."
+            self._stop()
+        return self.status
+
+    def cancel(self):
+        if not self.finished:
+            self.status = "cancelled"
+        self._stop()
+
+    def _stop(self):
+        """Kill the worker and its extraction pool, release the queue."""
+        process = self._process
+        if process.is_alive():
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except (ProcessLookupError, PermissionError):
+                process.kill()
+        process.join(timeout=1)
+        self._messages.cancel_join_thread()
+        self._messages.close()
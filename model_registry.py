@@ -0,0 +1,268 @@
+"""
+Process-wide Gemini client registry
+Service clients and GenerativeModel objects are created once per API key
+(and model) and shared by every Streamlit session and thread. Nothing here
+touches genai.configure, so sessions with different keys never race on the
+library's global client.
+
+Kept out of ai_engine on purpose: "Kiểm tra kết nối" reloads ai_engine, and
+state stored here must survive that.
+
+The working model chosen for each key is also persisted to disk (by key
+hash only) with a TTL, so a restart does not cost a list_models round-trip
+on the first request. Stale entries are served while a background thread
+refreshes them.
+
+In record / replay mode (replay_backend) models are wrapped or replaced
+here, so ai_engine runs unchanged against fixtures.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+import replay_backend
+import utils
+
+# Reuse existing state if this module itself is ever reloaded
+_STATE = globals().get("_STATE") or {
+    "lock": threading.RLock(),
+    "key_locks": {},
+    "service_clients": {},   # (key_id, service) -> glm client
+    "models": {},            # (key_id, model_name) -> genai.GenerativeModel
+    "model_names": {},       # key_id -> {"model": name, "resolved_at": timestamp}
+    "disk_loaded": False,
+    "refreshing": set(),     # key_ids with a background discovery in flight
+    "metrics": {
+        "service_clients_created": 0,
+        "models_created": 0,
+        "model_reuses": 0,
+        "model_name_hits": 0,
+        "model_name_misses": 0,
+        "discoveries": 0,
+        "background_refreshes": 0,
+        "setup_seconds": 0.0,
+    },
+}
+
+DISCOVERY_CACHE_PATH = os.path.join(utils.DATA_DIR, "model_discovery.json")
+MODEL_DISCOVERY_TTL_SECONDS = int(os.getenv("MODEL_DISCOVERY_TTL_SECONDS", str(24 * 3600)))
+
+SERVICE_CLASSES = {
+    "generative": glm.GenerativeServiceClient,
+    "model": glm.ModelServiceClient,
+}
+
+def key_id(api_key):
+    """Registry key for an API key (the raw key is never used as a dict key)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def _count(name, amount=1):
+    with _STATE["lock"]:
+        _STATE["metrics"][name] += amount
+
+def key_lock(api_key):
+    """Per-key lock, e.g. so only one thread lists models for a new key."""
+    with _STATE["lock"]:
+        return _STATE["key_locks"].setdefault(key_id(api_key), threading.Lock())
+
+def get_service_client(api_key, service="generative"):
+    """Shared low-level client for one API key ("generative" or "model")."""
+    registry_key = (key_id(api_key), service)
+    client = _STATE["service_clients"].get(registry_key)
+    if client is not None:
+        return client
+
+    with _STATE["lock"]:
+        client = _STATE["service_clients"].get(registry_key)
+        if client is None:
+            start = time.perf_counter()
+            client = SERVICE_CLASSES[service](client_options={"api_key": api_key})
+            _STATE["service_clients"][registry_key] = client
+            _STATE["metrics"]["service_clients_created"] += 1
+            _STATE["metrics"]["setup_seconds"] += time.perf_counter() - start
+    return client
+
+def get_model(api_key, model_name):
+    """Shared GenerativeModel bound to this key's client."""
+    if replay_backend.mode() == "replay":
+        return replay_backend.ReplayModel(model_name)
+    
+    registry_key = (key_id(api_key), model_name)
+    model = _STATE["models"].get(registry_key)
+    if model is not None:
+        _count("model_reuses")
+        return replay_backend.wrap(model)
+
+    generative_client = get_service_client(api_key, "generative")
+    with _STATE["lock"]:
+        model = _STATE["models"].get(registry_key)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            # Bind our per-key client instead of the library's global default.
+            # GenerativeModel has no public way to pass a client; the private
+            # attribute is pinned by requirements.txt and test_model_registry.py
+            if "_client" not in vars(model):
+                raise RuntimeError("google-generativeai changed GenerativeModel._client; "
+                                   "per-key clients cannot be bound (see requirements.txt)")
+            model._client = generative_client
+            _STATE["models"][registry_key] = model
+            _STATE["metrics"]["models_created"] += 1
+        else:
+            _STATE["metrics"]["model_reuses"] += 1
+    return replay_backend.wrap(model)
+
+def list_models(api_key):
+    return genai.list_models(client=get_service_client(api_key, "model"))
+
+# ============================================================================
+# MODEL DISCOVERY (persisted per key hash)
+# ============================================================================
+
+def _load_discovery_cache():
+    """Merge the on-disk discovery cache into memory (once per process)."""
+    if _STATE["disk_loaded"]:
+        return
+    with _STATE["lock"]:
+        if _STATE["disk_loaded"]:
+            return
+        try:
+            with open(DISCOVERY_CACHE_PATH, "r", encoding="utf-8") as f:
+                for kid, entry in json.load(f).items():
+                    _STATE["model_names"].setdefault(kid, entry)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Model discovery cache unreadable: {e}")
+        _STATE["disk_loaded"] = True
+
+def _save_discovery_cache():
+    with _STATE["lock"]:
+        data = dict(_STATE["model_names"])
+    try:
+        os.makedirs(os.path.dirname(DISCOVERY_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{DISCOVERY_CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, DISCOVERY_CACHE_PATH)
+    except OSError as e:
+        print(f"Failed to save model discovery cache: {e}")
+
+def _is_fresh(entry):
+    return time.time() - entry.get("resolved_at", 0) < MODEL_DISCOVERY_TTL_SECONDS
+
+def choose_model_name(models):
+    """
+    Prioritizes 'flash' models, then 'pro', then falls back to any model
+    that supports content generation.
+    """
+    supported_models = [m for m in models if 'generateContent' in m.supported_generation_methods]
+    if not supported_models:
+        raise Exception("No models found that support content generation.")
+    for keyword in ("flash", "pro"):
+        for m in supported_models:
+            if keyword in m.name.lower():
+                return m.name
+    return supported_models[0].name
+
+def discover_model_name(api_key):
+    """Network path: list models for this key, pick one, persist it."""
+    try:
+        models = list(list_models(api_key))
+    except Exception as e:
+        raise Exception(f"Failed to list models: {e}")
+    model_name = choose_model_name(models)
+    _count("discoveries")
+    set_model_name(api_key, model_name)
+    return model_name
+
+def refresh_in_background(api_key):
+    """Re-run discovery off the request path (at most one per key at a time)."""
+    kid = key_id(api_key)
+    with _STATE["lock"]:
+        if kid in _STATE["refreshing"]:
+            return
+        _STATE["refreshing"].add(kid)
+
+    def run():
+        try:
+            get_service_client(api_key, "generative")  # warm the channel too
+            # Holding the key lock makes a concurrent request wait for this result
+            with key_lock(api_key):
+                entry = _STATE["model_names"].get(kid)
+                if entry is not None and _is_fresh(entry):
+                    return  # resolved by a request meanwhile
+                discover_model_name(api_key)
+            _count("background_refreshes")
+        except Exception as e:
+            print(f"Background model discovery failed: {e}")
+        finally:
+            with _STATE["lock"]:
+                _STATE["refreshing"].discard(kid)
+
+    threading.Thread(target=run, name="model-discovery", daemon=True).start()
+
+def warm_up(api_key):
+    """
+    Called at app start: loads the disk cache and, if this key has no fresh
+    entry, discovers its model in the background. Never blocks.
+    """
+    if not api_key or replay_backend.mode() == "replay":
+        return
+    _load_discovery_cache()
+    entry = _STATE["model_names"].get(key_id(api_key))
+    if entry is None or not _is_fresh(entry):
+        refresh_in_background(api_key)
+    elif (key_id(api_key), "generative") not in _STATE["service_clients"]:
+        # Model known from disk: only build the client, no network call
+        threading.Thread(target=get_service_client, args=(api_key, "generative"),
+                         name="model-client-warmup", daemon=True).start()
+
+def get_model_name(api_key):
+    """
+    Cached working model name for this key, or None. A stale entry is still
+    returned (the model rarely changes) and refreshed in the background.
+    """
+    if replay_backend.mode() == "replay":
+        return replay_backend.REPLAY_MODEL_NAME
+    _load_discovery_cache()
+    entry = _STATE["model_names"].get(key_id(api_key))
+    _count("model_name_hits" if entry else "model_name_misses")
+    if entry is None:
+        return None
+    if not _is_fresh(entry):
+        refresh_in_background(api_key)
+    return entry["model"]
+
+def set_model_name(api_key, model_name):
+    with _STATE["lock"]:
+        _STATE["model_names"][key_id(api_key)] = {"model": model_name, "resolved_at": time.time()}
+    _save_discovery_cache()
+
+# ============================================================================
+# MAINTENANCE
+# ============================================================================
+
+def forget(api_key):
+    """Drop everything cached for one key (e.g. after it was revoked)."""
+    kid = key_id(api_key)
+    with _STATE["lock"]:
+        _STATE["model_names"].pop(kid, None)
+        for registry in (_STATE["service_clients"], _STATE["models"]):
+            for registry_key in [k for k in registry if k[0] == kid]:
+                del registry[registry_key]
+    _save_discovery_cache()
+
+def get_metrics():
+    with _STATE["lock"]:
+        metrics = dict(_STATE["metrics"])
+        metrics["keys"] = len({k[0] for k in _STATE["service_clients"]})
+        metrics["models"] = len(_STATE["models"])
+    lookups = metrics["models_created"] + metrics["model_reuses"]
+    metrics["reuse_rate"] = metrics["model_reuses"] / lookups if lookups else 0.0
+    return metrics
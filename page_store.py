@@ -0,0 +1,95 @@
+"""
+Per-project page store
+Keeps the raw per-page text from extract_text_from_pdf in one compact,
+memory-mappable file so the parser can be re-run with different detection
+settings without reading the PDF again.
+
+File layout (little-endian):
+    8 bytes   magic b"SDPAGES1"
+    4 bytes   page count N
+    8*(N+1)   byte offsets of each page inside the text blob
+    ...       UTF-8 text blob
+"""
+
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+
+import utils
+
+MAGIC = b"SDPAGES1"
+_COUNT = struct.Struct("<I")
+HEADER_SIZE = len(MAGIC) + _COUNT.size
+
+def page_store_path(project_id: Optional[str] = None, session_id: Optional[str] = None) -> str:
+    """
+    Location of the page store for a project. Without a project each
+    session gets its own store, so concurrent local imports don't collide.
+    """
+    if project_id:
+        return os.path.join(utils.DATA_DIR, "projects", project_id, "pages.bin")
+    return os.path.join(utils.DATA_DIR, "projects", "local", session_id or "default", "pages.bin")
+
+def write_pages(path: str, pages: Iterable[str]) -> None:
+    """Write page texts to path (atomically replaces an existing store)"""
+    encoded = [page_text.encode('utf-8') for page_text in pages]
+
+    offsets = [0]
+    for page_bytes in encoded:
+        offsets.append(offsets[-1] + len(page_bytes))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_COUNT.pack(len(encoded)))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for page_bytes in encoded:
+            f.write(page_bytes)
+    os.replace(tmp_path, path)
+
+class PageStore:
+    """
+    Read-only, memory-mapped view of a page store.
+    Pages are decoded lazily, so opening a store for a long script is cheap.
+    Use as a context manager to release the mapping.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a page store: {path}")
+
+        (self._count,) = _COUNT.unpack_from(self._map, len(MAGIC))
+        self._offsets = struct.unpack_from(f"<{self._count + 1}Q", self._map, HEADER_SIZE)
+        self._blob_start = HEADER_SIZE + 8 * (self._count + 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("page index out of range")
+        start = self._blob_start + self._offsets[index]
+        stop = self._blob_start + self._offsets[index + 1]
+        return self._map[start:stop].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
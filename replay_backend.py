@@ -0,0 +1,340 @@
+"""
+Record / replay backend for Gemini
+Stands in for genai.GenerativeModel so ai_engine can be benchmarked and
+regression-tested without network:
+
+    AI_BACKEND=live     normal Gemini calls (default)
+    AI_BACKEND=record   real calls, every prompt/response/usage is appended
+                        to the fixture file
+    AI_BACKEND=replay   no network: responses come from the fixture file,
+                        with simulated latency
+
+Fixtures are JSON lines keyed by SHA-256 of prompt + generation_config, so
+a replay matches exactly what was recorded. In replay mode an unknown
+prompt raises ReplayMiss, unless synthetic responses are enabled: then a
+plausible answer is generated locally (schema-shaped JSON for structured
+prompts, Markdown text otherwise).
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import token_estimator
+import utils
+
+MODES = ("live", "record", "replay")
+
+CONFIG = {
+    "mode": os.getenv("AI_BACKEND", "live"),
+    "path": os.getenv("AI_FIXTURES_PATH", os.path.join(utils.DATA_DIR, "ai_fixtures.jsonl")),
+    # "recorded" replays the measured latency; a number is a fixed delay in seconds
+    "latency": os.getenv("AI_REPLAY_LATENCY", "recorded"),
+    "latency_scale": float(os.getenv("AI_REPLAY_LATENCY_SCALE", "1.0")),
+    "synthetic": os.getenv("AI_REPLAY_SYNTHETIC", "0") == "1",
+}
+
+REPLAY_MODEL_NAME = "models/replay"
+
+# Latency model for synthetic responses (no recording to copy from)
+SYNTHETIC_FIRST_CHUNK_SECONDS = 0.6
+SYNTHETIC_TOKENS_PER_SECOND = 150.0
+SYNTHETIC_TEXT_TOKENS = 600
+STREAM_CHUNK_CHARS = 200
+
+_STATS_LOCK = threading.Lock()
+STATS = {"recorded": 0, "replayed": 0, "synthetic": 0, "misses": 0}
+
+class ReplayMiss(LookupError):
+    pass
+
+def _count(name):
+    with _STATS_LOCK:
+        STATS[name] += 1
+
+def configure(mode=None, path=None, latency=None, latency_scale=None, synthetic=None):
+    """Switch backend at runtime (benchmarks, tests)."""
+    updates = {"mode": mode, "path": path, "latency": latency,
+               "latency_scale": latency_scale, "synthetic": synthetic}
+    if mode is not None and mode not in MODES:
+        raise ValueError(f"Unknown AI backend: {mode}")
+    CONFIG.update({k: v for k, v in updates.items() if v is not None})
+
+def mode():
+    return CONFIG["mode"]
+
+def fixture_key(prompt_text, generation_config=None):
+    digest = hashlib.sha256()
+    for part in (str(prompt_text), repr(generation_config) if generation_config is not None else ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# ============================================================================
+# FIXTURE STORE
+# ============================================================================
+
+class FixtureStore:
+    """Append-only JSON lines file; the last entry for a key wins."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def add(self, entry):
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(path=None):
+    path = path or CONFIG["path"]
+    with _STORES_LOCK:
+        if path not in _STORES:
+            _STORES[path] = FixtureStore(path)
+        return _STORES[path]
+
+# ============================================================================
+# RESPONSE OBJECTS (the attributes ai_engine reads from genai responses)
+# ============================================================================
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+class ReplayChunk:
+    def __init__(self, text):
+        self.text = text
+
+class ReplayResponse:
+    """
+    Non-streaming: the delay has already been spent. Streaming: iterating
+    yields chunks, waiting first_chunk_seconds and spreading the rest.
+    """
+
+    def __init__(self, entry, first_chunk_seconds=0.0, remaining_seconds=0.0):
+        self.text = entry["response"]
+        usage = entry.get("usage") or {}
+        self.usage_metadata = UsageMetadata(usage.get("prompt_token_count", 0),
+                                            usage.get("candidates_token_count", 0))
+        self._chunks = entry.get("chunks") or [self.text]
+        self._first_chunk_seconds = first_chunk_seconds
+        self._remaining_seconds = remaining_seconds
+
+    def __iter__(self):
+        time.sleep(self._first_chunk_seconds)
+        gap = self._remaining_seconds / max(len(self._chunks) - 1, 1)
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                time.sleep(gap)
+            yield ReplayChunk(chunk)
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+
+def _delays(entry):
+    """(first chunk, total) simulated seconds for one response."""
+    if CONFIG["latency"] == "recorded":
+        total = entry.get("latency_seconds", 0.0)
+        first = entry.get("first_chunk_seconds", total)
+    else:
+        total = first = float(CONFIG["latency"])
+    scale = CONFIG["latency_scale"]
+    return first * scale, max(total, first) * scale
+
+class ReplayModel:
+    """Drop-in for genai.GenerativeModel.generate_content, no network."""
+
+    def __init__(self, model_name=REPLAY_MODEL_NAME, store=None):
+        self.model_name = model_name
+        self.store = store
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        key = fixture_key(contents, generation_config)
+        entry = (self.store or get_store()).get(key)
+        if entry is not None:
+            _count("replayed")
+        elif CONFIG["synthetic"]:
+            entry = synthesize_entry(key, contents, generation_config)
+            _count("synthetic")
+        else:
+            _count("misses")
+            raise ReplayMiss(f"No fixture for prompt {key[:12]} ({len(str(contents))} chars)")
+
+        first, total = _delays(entry)
+        if stream:
+            return ReplayResponse(entry, first, total - first)
+        time.sleep(total)
+        return ReplayResponse(entry)
+
+# ============================================================================
+# RECORD
+# ============================================================================
+
+def _usage_dict(response):
+    try:
+        usage = response.usage_metadata
+        return {"prompt_token_count": usage.prompt_token_count,
+                "candidates_token_count": usage.candidates_token_count}
+    except Exception:
+        return None
+
+def _record(model_name, contents, generation_config, text, usage, latency, first_chunk=None, chunks=None):
+    entry = {
+        "key": fixture_key(contents, generation_config),
+        "model": model_name,
+        "prompt": str(contents),
+        "generation_config": generation_config,
+        "response": text,
+        "usage": usage,
+        "latency_seconds": round(latency, 3),
+        "recorded_at": time.time(),
+    }
+    if chunks is not None:
+        entry["chunks"] = chunks
+        entry["first_chunk_seconds"] = round(first_chunk if first_chunk is not None else latency, 3)
+    try:
+        get_store().add(entry)
+        _count("recorded")
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Failed to record fixture: {e}")
+
+class _RecordingStream:
+    """Passes chunks through and records the whole stream once it ends."""
+
+    def __init__(self, response, model_name, contents, generation_config, started):
+        self._response = response
+        self._args = (model_name, contents, generation_config)
+        self._started = started
+
+    def __iter__(self):
+        chunks = []
+        first_chunk = None
+        for chunk in self._response:
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - self._started
+            try:
+                if chunk.text:
+                    chunks.append(chunk.text)
+            except ValueError:
+                pass
+            yield chunk
+        _record(*self._args, "".join(chunks), _usage_dict(self._response),
+                time.perf_counter() - self._started, first_chunk, chunks)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+class RecordingModel:
+    """Wraps a real GenerativeModel and appends every exchange to the fixtures."""
+
+    def __init__(self, model):
+        self._model = model
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        started = time.perf_counter()
+        response = self._model.generate_content(contents, generation_config=generation_config, stream=stream, **kwargs)
+        model_name = getattr(self._model, "model_name", None)
+        if stream:
+            return _RecordingStream(response, model_name, contents, generation_config, started)
+        _record(model_name, contents, generation_config, response.text, _usage_dict(response),
+                time.perf_counter() - started)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+def wrap(model):
+    """model_registry hook: the model to hand out for the current mode."""
+    return RecordingModel(model) if CONFIG["mode"] == "record" else model
+
+# ============================================================================
+# SYNTHETIC RESPONSES (replay without fixtures, e.g. benchmarks)
+# ============================================================================
+
+WORDS = ("cảnh", "nhân vật", "nhịp", "xung đột", "hồi", "thoại", "hình ảnh", "căng thẳng",
+         "khán giả", "cao trào", "bối cảnh", "động cơ", "chi tiết", "mở đầu", "kết")
+SCENE_ID_PATTERN = re.compile(r"### SCENE_ID: (.+?) ###")
+
+def _sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+def synthetic_value(schema, rng, scene_ids, depth=0):
+    """Schema-shaped sample data; scene_id fields reuse ids from the prompt."""
+    kind = schema.get("type")
+    if kind == "object":
+        value = {}
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key == "scene_id" and scene_ids:
+                value[key] = rng.choice(scene_ids)
+            else:
+                value[key] = synthetic_value(sub_schema, rng, scene_ids, depth + 1)
+        return value
+    if kind == "array":
+        count = rng.randint(2, 4) if depth == 0 else rng.randint(1, 3)
+        return [synthetic_value(schema.get("items", {}), rng, scene_ids, depth + 1) for _ in range(count)]
+    if kind in ("integer", "number"):
+        return rng.randint(1, 100)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return " ".join(_sentence(rng) for _ in range(rng.randint(1, 3)))
+
+def synthetic_text(rng, tokens=SYNTHETIC_TEXT_TOKENS):
+    # Uncalibrated count, so the text for a key is the same on every run
+    parts = []
+    while token_estimator.count_tokens_raw("\n".join(parts)) < tokens:
+        parts.append(f"### {_sentence(rng, 4)}\n" + " ".join(_sentence(rng) for _ in range(4)))
+    return "\n\n".join(parts)
+
+def synthesize_entry(key, contents, generation_config=None):
+    """A fixture-shaped entry for an unknown prompt (deterministic per key)."""
+    rng = random.Random(key)
+    prompt = str(contents)
+    schema = (generation_config or {}).get("response_schema")
+    if schema:
+        text = json.dumps(synthetic_value(schema, rng, SCENE_ID_PATTERN.findall(prompt)), ensure_ascii=False)
+    else:
+        text = synthetic_text(rng)
+
+    output_tokens = token_estimator.count_tokens(text)
+    latency = SYNTHETIC_FIRST_CHUNK_SECONDS + output_tokens / SYNTHETIC_TOKENS_PER_SECOND
+    return {
+        "key": key,
+        "model": REPLAY_MODEL_NAME,
+        "response": text,
+        "chunks": [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""],
+        "usage": {"prompt_token_count": token_estimator.count_tokens(prompt), "candidates_token_count": output_tokens},
+        "latency_seconds": latency,
+        "first_chunk_seconds": SYNTHETIC_FIRST_CHUNK_SECONDS,
+    }
+
+def get_stats():
+    with _STATS_LOCK:
+        return dict(STATS)
@@ -0,0 +1,236 @@
+"""
+Central scheduler for Gemini requests
+Every ai_engine call goes through here: a token bucket per API key, a cap on
+requests in flight across the whole process, priority ordering (interactive
+edits before bulk analysis) and exponential backoff with jitter on
+retryable errors (429 / 5xx / timeouts).
+"""
+
+import collections
+import itertools
+import os
+import random
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+import model_registry
+
+# Priorities: lower runs first
+INTERACTIVE = 0   # refine, AI fix, brainstorm, connection test
+NORMAL = 1
+BULK = 2          # whole-script analyses, map-reduce chunks, action plan
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+BURST = int(os.getenv("GEMINI_BURST", "10"))
+MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,      # includes ResourceExhausted (429)
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+def is_retryable(error):
+    return isinstance(error, RETRYABLE_ERRORS)
+
+def backoff_delay(attempt):
+    """Full jitter: uniform(0, min(max, base * 2^attempt))."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+class TokenBucket:
+    """
+    Token bucket that never goes into debt: callers check delay() and only
+    take() a token once one is available. Not locked itself; the scheduler
+    uses it under its condition.
+    """
+
+    def __init__(self, rate_per_second, capacity, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+class RequestScheduler:
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, burst=BURST,
+                 max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES, clock=time.monotonic):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.clock = clock
+
+        self._condition = threading.Condition()
+        self._waiting = []                 # (priority, sequence, key id) tickets
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._buckets = {}
+
+        self._metrics = {
+            "requests": 0, "retries": 0, "failures": 0,
+            "max_queue_depth": 0, "by_priority": collections.Counter(),
+        }
+        self._wait_times = collections.deque(maxlen=500)
+
+    def _bucket(self, kid):
+        bucket = self._buckets.get(kid)
+        if bucket is None:
+            bucket = self._buckets.setdefault(kid, TokenBucket(self.requests_per_minute / 60.0, self.burst, self.clock))
+        return bucket
+
+    def _next_ready(self):
+        """
+        (ticket allowed to start now or None, seconds until a rate-limited
+        key refills). Tickets are served in priority, then FIFO order; a key
+        that is out of tokens holds back only its own tickets.
+        """
+        if self._in_flight >= self.max_in_flight:
+            return None, None
+        limited, refill = set(), None
+        for ticket in sorted(self._waiting):
+            kid = ticket[2]
+            if kid in limited:
+                continue
+            delay = self._bucket(kid).delay()
+            if delay == 0:
+                return ticket, None
+            limited.add(kid)
+            refill = delay if refill is None else min(refill, delay)
+        return None, refill
+
+    def _acquire(self, api_key, priority):
+        """
+        Wait until it is our turn, a slot is free and the key has a token,
+        then take both. Nothing is held while waiting.
+        """
+        started = time.monotonic()
+        ticket = (priority, next(self._sequence), model_registry.key_id(api_key))
+        with self._condition:
+            self._waiting.append(ticket)
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], len(self._waiting))
+            while True:
+                ready, refill = self._next_ready()
+                if ready == ticket:
+                    break
+                # Woken by a release/start, or when the earliest limited key refills
+                self._condition.wait(refill)
+            self._waiting.remove(ticket)
+            self._bucket(ticket[2]).take()
+            self._in_flight += 1
+            self._condition.notify_all()
+        self._wait_times.append(time.monotonic() - started)
+
+    def _count(self, name, key=None):
+        with self._condition:
+            if key is None:
+                self._metrics[name] += 1
+            else:
+                self._metrics[name][key] += 1
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def run(self, fn, api_key, priority=NORMAL):
+        """Call fn() under the limiter, retrying retryable errors with backoff."""
+        self._count("by_priority", PRIORITY_NAMES.get(priority, priority))
+        for attempt in range(self.max_retries + 1):
+            self._acquire(api_key, priority)
+            self._count("requests")
+            try:
+                return fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                error = e
+            finally:
+                self._release()
+            # Back off without holding a slot
+            self._count("retries")
+            delay = backoff_delay(attempt)
+            print(f"Gemini request failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def stream(self, fn, api_key, priority=NORMAL):
+        """
+        Like run() for streaming calls: fn() returns an iterable of chunks.
+        The slot is held until the stream is consumed; a retryable error is
+        only retried if no chunk has been yielded yet.
+        """
+        self._count("by_priority", PRIORITY_NAMES.get(priority, priority))
+        for attempt in range(self.max_retries + 1):
+            self._acquire(api_key, priority)
+            self._count("requests")
+            yielded = False
+            try:
+                for chunk in fn():
+                    yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                if yielded or not is_retryable(e) or attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                error = e
+            finally:
+                self._release()
+            self._count("retries")
+            delay = backoff_delay(attempt)
+            print(f"Gemini stream failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def get_metrics(self):
+        with self._condition:
+            queue_depth = len(self._waiting)
+            in_flight = self._in_flight
+        waits = sorted(self._wait_times)
+        return {
+            "queue_depth": queue_depth,
+            "in_flight": in_flight,
+            "max_queue_depth": self._metrics["max_queue_depth"],
+            "requests": self._metrics["requests"],
+            "retries": self._metrics["retries"],
+            "failures": self._metrics["failures"],
+            "by_priority": dict(self._metrics["by_priority"]),
+            "avg_wait_seconds": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait_seconds": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+        }
+
+# One scheduler per process, shared by every session (kept across reloads)
+scheduler = globals().get("scheduler") or RequestScheduler()
+
+def run(fn, api_key, priority=NORMAL):
+    return scheduler.run(fn, api_key, priority)
+
+def stream(fn, api_key, priority=NORMAL):
+    return scheduler.stream(fn, api_key, priority)
+
+def get_metrics():
+    return scheduler.get_metrics()
@@ -0,0 +1,141 @@
+"""
+Persistent prompt/response cache for ai_engine
+SQLite file under data/, keyed by model name + SHA-256 of the prompt.
+Entries expire after a TTL and the file is kept under a size budget by
+evicting the least recently used responses.
+"""
+
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from utils import DATA_DIR
+
+CACHE_PATH = os.path.join(DATA_DIR, "ai_response_cache.sqlite")
+CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_CACHE_BYTES = int(os.getenv("AI_CACHE_MAX_MB", "50")) * 1024 * 1024
+
+# Counters for this server process (shown in the sidebar)
+STATS = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_STATS_LOCK = threading.Lock()
+
+def _count(name, amount=1):
+    with _STATS_LOCK:
+        STATS[name] += amount
+
+def cache_key(model_name, prompt_text, extra=None):
+    """SHA-256 of model + prompt (+ generation settings, if any)."""
+    digest = hashlib.sha256()
+    for part in (model_name, prompt_text, repr(extra) if extra is not None else ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _connect(path=None):
+    path = path or CACHE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # One short-lived connection per call: analysis passes run on worker threads
+    connection = sqlite3.connect(path, timeout=10)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        " key TEXT PRIMARY KEY,"
+        " model TEXT NOT NULL,"
+        " response TEXT NOT NULL,"
+        " size INTEGER NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " last_access REAL NOT NULL,"
+        " hit_count INTEGER NOT NULL DEFAULT 0)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+    return connection
+
+@contextlib.contextmanager
+def _transaction(path=None):
+    """Commit on success, roll back on error, always close."""
+    connection = _connect(path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def get(model_name, prompt_text, extra=None, ttl=None, path=None):
+    """Returns the cached response text, or None on a miss / expired entry."""
+    ttl = CACHE_TTL_SECONDS if ttl is None else ttl
+    key = cache_key(model_name, prompt_text, extra)
+    now = time.time()
+    try:
+        with _transaction(path) as connection:
+            row = connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and ttl and now - row[1] > ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row:
+                connection.execute(
+                    "UPDATE responses SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?", (now, key)
+                )
+    except sqlite3.Error as e:
+        print(f"Response cache read error: {e}")
+        row = None
+
+    _count("hits" if row else "misses")
+    return row[0] if row else None
+
+def put(model_name, prompt_text, response_text, extra=None, max_bytes=None, path=None):
+    """Store a response, then evict LRU entries beyond the size budget."""
+    if not response_text:
+        return
+    key = cache_key(model_name, prompt_text, extra)
+    now = time.time()
+    try:
+        with _transaction(path) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response_text, len(response_text.encode("utf-8")), now, now)
+            )
+            _count("writes")
+            _evict(connection, MAX_CACHE_BYTES if max_bytes is None else max_bytes)
+    except sqlite3.Error as e:
+        print(f"Response cache write error: {e}")
+
+def _evict(connection, max_bytes):
+    # Expired entries first, then least recently used until under budget
+    if CACHE_TTL_SECONDS:
+        removed = connection.execute(
+            "DELETE FROM responses WHERE created_at < ?", (time.time() - CACHE_TTL_SECONDS,)
+        ).rowcount
+        _count("evictions", max(removed, 0))
+
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= max_bytes:
+        return
+    for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+        if total <= max_bytes:
+            break
+        connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+        _count("evictions")
+
+def get_stats(path=None):
+    """Process counters plus what is currently on disk."""
+    stats = dict(STATS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    try:
+        with _transaction(path) as connection:
+            stats["entries"], stats["bytes"] = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+    except sqlite3.Error:
+        stats["entries"], stats["bytes"] = 0, 0
+    return stats
+
+def clear(path=None):
+    try:
+        with _transaction(path) as connection:
+            connection.execute("DELETE FROM responses")
+    except sqlite3.Error as e:
+        print(f"Response cache clear error: {e}")
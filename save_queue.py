@@ -0,0 +1,194 @@
+"""
+Write-behind queue for project saves
+auto_save only hands the project's current state to this queue and returns;
+a background thread writes it to Supabase. Saves of the same project that
+arrive in a burst are coalesced (only the latest state is written), each
+section (scenes, analysis, action plan) is written only if it changed since
+the last flush, and failed flushes are retried with backoff. Pending saves
+are flushed on shutdown.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Flush once saves have been quiet for this long...
+SAVE_FLUSH_INTERVAL_SECONDS = float(os.getenv("SAVE_FLUSH_INTERVAL_SECONDS", "2"))
+# ...but never hold a save back longer than this during continuous editing
+SAVE_MAX_DELAY_SECONDS = float(os.getenv("SAVE_MAX_DELAY_SECONDS", "10"))
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+class SaveQueue:
+    """
+    writer(project_id, section, value) -> bool persists one section.
+    submit() never blocks on the network; flush() does, for explicit saves.
+    """
+
+    def __init__(self, writer, interval=SAVE_FLUSH_INTERVAL_SECONDS, max_delay=SAVE_MAX_DELAY_SECONDS):
+        self.writer = writer
+        self.interval = interval
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()   # one writer at a time (thread or explicit flush)
+        self._pending = {}                    # project_id -> pending save
+        self._status = {}                     # project_id -> last outcome + counters
+        self._digests = {}                    # (project_id, section) -> digest last written
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Producer side (script thread)
+    # ------------------------------------------------------------------
+
+    def submit(self, project_id, payload):
+        """Queue the latest state of a project ({section: value})."""
+        now = time.time()
+        with self._condition:
+            status = self._status_entry(project_id)
+            entry = self._pending.get(project_id)
+            if entry is None:
+                self._pending[project_id] = {"payload": payload, "first_at": now, "last_at": now,
+                                             "version": 1, "attempts": 0, "retry_at": None}
+            else:
+                entry.update(payload=payload, last_at=now, version=entry["version"] + 1)
+                status["coalesced"] += 1
+            status["submits"] += 1
+            self._start()
+            self._condition.notify_all()
+
+    def flush(self, project_id=None):
+        """Write pending saves now (all projects if project_id is None). Returns True if all succeeded."""
+        with self._condition:
+            project_ids = [project_id] if project_id is not None else list(self._pending)
+        return all([self._flush_project(pid) for pid in project_ids])
+
+    def discard(self, project_id):
+        """Drop pending saves of a project (e.g. it was deleted)."""
+        with self._condition:
+            self._pending.pop(project_id, None)
+            self._status.pop(project_id, None)
+            for key in [k for k in self._digests if k[0] == project_id]:
+                del self._digests[key]
+
+    def get_status(self, project_id):
+        """{"state": "saved" | "pending" | "error" | "idle", ...} for the sidebar."""
+        now = time.time()
+        with self._condition:
+            status = dict(self._status.get(project_id) or self._new_status())
+            entry = self._pending.get(project_id)
+            if entry is not None:
+                status["pending_seconds"] = now - entry["first_at"]
+                status["retry_in"] = max(entry["retry_at"] - now, 0) if entry["retry_at"] else None
+                status["state"] = "error" if entry["attempts"] else "pending"
+            else:
+                status["state"] = "saved" if status["saved_at"] else "idle"
+        return status
+
+    # ------------------------------------------------------------------
+    # Background flushing
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _new_status():
+        return {"saved_at": None, "error": None, "flushes": 0, "failures": 0,
+                "submits": 0, "coalesced": 0, "sections_written": 0, "sections_skipped": 0}
+
+    def _status_entry(self, project_id):
+        return self._status.setdefault(project_id, self._new_status())
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="save-queue", daemon=True)
+            self._thread.start()
+
+    def _due_at(self, entry):
+        if entry["retry_at"] is not None:
+            return entry["retry_at"]
+        return min(entry["last_at"] + self.interval, entry["first_at"] + self.max_delay)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.time()
+                    due = [pid for pid, entry in self._pending.items() if self._due_at(entry) <= now]
+                    if due:
+                        break
+                    next_due = min((self._due_at(entry) for entry in self._pending.values()), default=None)
+                    self._condition.wait(None if next_due is None else max(next_due - now, 0.01))
+            for project_id in due:
+                self._flush_project(project_id)
+
+    def _flush_project(self, project_id):
+        with self._flush_lock:
+            with self._condition:
+                entry = self._pending.get(project_id)
+                if entry is None:
+                    return True
+                payload, version = entry["payload"], entry["version"]
+
+            error = None
+            written = skipped = 0
+            try:
+                for section, value in payload.items():
+                    digest = _digest(value)
+                    if self._digests.get((project_id, section)) == digest:
+                        skipped += 1
+                        continue
+                    if not self.writer(project_id, section, value):
+                        error = f"Không lưu được phần '{section}'"
+                        break
+                    self._digests[(project_id, section)] = digest
+                    written += 1
+            except Exception as e:
+                error = str(e)
+
+            with self._condition:
+                status = self._status_entry(project_id)
+                status["sections_written"] += written
+                status["sections_skipped"] += skipped
+                entry = self._pending.get(project_id)
+                if error is None:
+                    status.update(saved_at=time.time(), error=None)
+                    status["flushes"] += 1
+                    if entry is not None and entry["version"] == version:
+                        del self._pending[project_id]
+                    elif entry is not None:
+                        entry.update(attempts=0, retry_at=None)  # newer state arrived meanwhile
+                else:
+                    print(f"Save queue: flush of project {project_id} failed: {error}")
+                    status.update(error=error)
+                    status["failures"] += 1
+                    if entry is not None:
+                        entry["attempts"] += 1
+                        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (entry["attempts"] - 1))
+                        entry["retry_at"] = time.time() + delay
+                self._condition.notify_all()
+            return error is None
+
+    def close(self):
+        """Flush everything still pending (called at interpreter shutdown)."""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Save queue: flush on shutdown failed: {e}")
+
+_QUEUE = None
+_QUEUE_LOCK = threading.Lock()
+
+def get_queue():
+    """Process-wide queue writing through database.save_project_section."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            import database
+            _QUEUE = SaveQueue(database.save_project_section)
+            atexit.register(_QUEUE.close)
+        return _QUEUE
@@ -0,0 +1,216 @@
+"""
+Scene model for session state
+Compact slotted scene records plus an id -> position index, so lookups by
+scene id stay O(1) no matter how long the script is.
+
+Large projects can be opened lazily: scenes then arrive without content
+(content is None) and a content_loader fetches it on demand, one page of
+scenes at a time. Loaded content that was not edited is kept in a bounded
+LRU and dropped again when it falls out.
+"""
+
+import itertools
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+# Scenes fetched together when one unloaded scene is needed
+SCENE_PAGE_SIZE = 25
+# Unedited lazily loaded scenes kept in memory
+SCENE_CACHE_SIZE = 300
+
+# Store versions are unique across stores, so a new store never matches an old key
+_VERSIONS = itertools.count(1)
+
+class Scene:
+    """
+    One scene. Supports dict-style access (scene['content']) so code written
+    against the parser's plain dicts keeps working. row_id is the database
+    row the scene was loaded from (None for scenes not loaded from Supabase);
+    content is None while it has not been loaded. Records are mutable and
+    compare by identity; compare to_dict() for equal content.
+    """
+
+    __slots__ = ("id", "header", "content", "original_index", "row_id")
+
+    def __init__(self, id: str, header: str, content: Optional[str], original_index: int = 0, row_id: Optional[str] = None):
+        self.id = id
+        self.header = header
+        self.content = content
+        self.original_index = original_index
+        self.row_id = row_id
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Scene":
+        return cls(data["id"], data["header"], data["content"], data.get("original_index", 0), data.get("row_id"))
+
+    def to_dict(self) -> Dict:
+        data = {
+            "id": self.id,
+            "header": self.header,
+            "content": self.content,
+            "original_index": self.original_index
+        }
+        if self.row_id is not None:
+            data["row_id"] = self.row_id
+        return data
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def __repr__(self) -> str:
+        return f"Scene(id={self.id!r}, header={self.header!r})"
+
+class SceneStore:
+    """
+    Ordered scene list with an id -> position index.
+    Duplicate ids resolve to the first occurrence, like a linear scan would.
+    
+    content_loader(row_ids) -> {row_id: content} fills in scenes opened
+    without content (see ensure_loaded / load_all).
+    
+    version changes whenever the scenes or their content change, for
+    values derived from the whole script (pre-flight estimates).
+    """
+
+    __slots__ = ("_scenes", "_index", "content_loader", "page_size", "cache_size", "_lru", "version")
+
+    def __init__(self, scenes: Iterable[Union[Scene, Dict]] = (), content_loader: Optional[Callable] = None,
+                 page_size: int = SCENE_PAGE_SIZE, cache_size: Optional[int] = SCENE_CACHE_SIZE):
+        self._scenes = [scene if isinstance(scene, Scene) else Scene.from_dict(scene) for scene in scenes]
+        self._index = {}
+        self._reindex()
+        self.content_loader = content_loader
+        self.page_size = page_size
+        self.cache_size = cache_size
+        # row_id -> (scene, content as loaded); evictable while unedited
+        self._lru = OrderedDict()
+        self.version = next(_VERSIONS)
+
+    def with_scenes(self, scenes: Iterable[Union[Scene, Dict]]) -> "SceneStore":
+        """A new store over `scenes` sharing this store's loader and cache."""
+        store = SceneStore(scenes, self.content_loader, self.page_size, self.cache_size)
+        store._lru = self._lru
+        return store
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict]) -> "SceneStore":
+        return cls(rows)
+
+    def to_dicts(self) -> List[Dict]:
+        """Plain dicts for JSON (utils.save_session_state) and database.save_scenes"""
+        return [scene.to_dict() for scene in self._scenes]
+
+    def _reindex(self) -> None:
+        self._index = {}
+        for position, scene in enumerate(self._scenes):
+            self._index.setdefault(str(scene.id), position)
+
+    # --- Sequence protocol (navigator, export, prompts iterate in order) ---
+
+    def __len__(self) -> int:
+        return len(self._scenes)
+
+    def __iter__(self) -> Iterator[Scene]:
+        return iter(self._scenes)
+
+    def __getitem__(self, position: int) -> Scene:
+        return self._scenes[position]
+
+    # --- Lookup by id ---
+
+    def position(self, scene_id) -> Optional[int]:
+        """Position of the first scene with this id, or None"""
+        return self._index.get(str(scene_id))
+
+    def get(self, scene_id) -> Optional[Scene]:
+        position = self._index.get(str(scene_id))
+        return None if position is None else self._scenes[position]
+
+    def __contains__(self, scene_id) -> bool:
+        return str(scene_id) in self._index
+
+    def update_content(self, scene_id, content: str) -> bool:
+        """Set the content of a scene. Returns False if the id is unknown."""
+        scene = self.get(scene_id)
+        if scene is None:
+            return False
+        scene.content = content
+        self._lru.pop(scene.row_id, None)  # edited: no longer evictable
+        self.version = next(_VERSIONS)
+        return True
+
+    def replace(self, scene_id, new_scene: Union[Scene, Dict]) -> bool:
+        """Swap a scene record in place. Returns False if the id is unknown."""
+        position = self.position(scene_id)
+        if position is None:
+            return False
+        if not isinstance(new_scene, Scene):
+            new_scene = Scene.from_dict(new_scene)
+        self._lru.pop(self._scenes[position].row_id, None)
+        self._scenes[position] = new_scene
+        if str(new_scene.id) != str(scene_id):
+            self._reindex()
+        self.version = next(_VERSIONS)
+        return True
+
+    # --- Lazy content ---
+
+    @property
+    def fully_loaded(self) -> bool:
+        return all(scene.content is not None for scene in self._scenes)
+
+    def loaded_count(self) -> int:
+        return sum(scene.content is not None for scene in self._scenes)
+
+    def _load(self, scenes: List[Scene]) -> None:
+        missing = [scene for scene in scenes if scene.content is None and scene.row_id is not None]
+        if not missing or self.content_loader is None:
+            return
+        contents = self.content_loader([scene.row_id for scene in missing])
+        for scene in missing:
+            content = contents.get(scene.row_id)
+            if content is not None:
+                scene.content = content
+                self._lru[scene.row_id] = (scene, content)
+        self.version = next(_VERSIONS)
+
+    def _evict(self) -> None:
+        while self.cache_size is not None and len(self._lru) > self.cache_size:
+            _, (scene, content) = self._lru.popitem(last=False)
+            # Only drop content that is still exactly what was loaded
+            if scene.content is content:
+                scene.content = None
+                self.version = next(_VERSIONS)
+
+    def ensure_loaded(self, position: int) -> Scene:
+        """The scene at `position` with content, loading its page if needed."""
+        scene = self._scenes[position]
+        if scene.content is None:
+            start = position - position % self.page_size
+            self._load(self._scenes[start:start + self.page_size])
+        if scene.row_id in self._lru:
+            self._lru.move_to_end(scene.row_id)
+        self._evict()
+        return scene
+
+    def load_all(self) -> None:
+        """Content of every scene (whole-script actions); nothing is evicted afterwards."""
+        self._load(self._scenes)
+        self.cache_size = None
+        self._lru.clear()
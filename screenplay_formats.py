@@ -0,0 +1,162 @@
+"""
+Native Fountain and Final Draft (FDX) import
+Structured formats already mark their scene headings, so these parsers skip
+PDF text extraction and header guessing entirely. Both stream their input and
+return the same scene dicts as script_parser.parse_scenes
+(id, header, content, original_index).
+"""
+
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from script_parser import SceneBuilder
+
+STRUCTURED_EXTENSIONS = (".fountain", ".fdx")
+
+# ============================================================================
+# FOUNTAIN
+# ============================================================================
+
+FOUNTAIN_HEADING = re.compile(r'^(?:INT\.?/EXT|INT|EXT|EST|I/E)[\. ]', re.IGNORECASE)
+FOUNTAIN_SCENE_NUMBER = re.compile(r'\s*#([\w.\-]+)#\s*$')
+FOUNTAIN_TITLE_KEY = re.compile(r'^[A-Za-z][\w ]*:')
+FOUNTAIN_NOTE = re.compile(r'\[\[.*?\]\]')
+
+def _fountain_heading(line):
+    """Split a heading line into (scene_number or None, heading)."""
+    number_match = FOUNTAIN_SCENE_NUMBER.search(line)
+    number = number_match.group(1) if number_match else None
+    heading = line[:number_match.start()] if number_match else line
+    return number, heading.strip()
+
+def iter_fountain_scenes(lines):
+    """
+    Streaming Fountain parser. `lines` is any iterable of text lines.
+    Skips the title page, boneyard (/* */), notes ([[ ]]), sections and
+    synopses; scene numbers (#12#) become scene ids.
+    """
+    builder = SceneBuilder()
+    previous_blank = True
+    in_title_page = None
+    in_boneyard = False
+
+    for raw_line in lines:
+        line = raw_line.rstrip('\r\n')
+
+        # Boneyard (may span lines)
+        if in_boneyard:
+            if '*/' not in line:
+                continue
+            line = line.split('*/', 1)[1]
+            in_boneyard = False
+        while '/*' in line:
+            before, _, after = line.partition('/*')
+            if '*/' in after:
+                line = before + after.split('*/', 1)[1]
+            else:
+                line = before
+                in_boneyard = True
+
+        line = FOUNTAIN_NOTE.sub('', line)
+        stripped = line.strip()
+
+        # Title page: "Key: value" block at the top, ends at the first blank line
+        if in_title_page is None and stripped:
+            in_title_page = bool(FOUNTAIN_TITLE_KEY.match(stripped))
+        if in_title_page:
+            if not stripped:
+                in_title_page = False
+                previous_blank = True
+            continue
+
+        if not stripped:
+            previous_blank = True
+            continue
+
+        # Sections, synopses and page breaks carry no script text
+        if stripped.startswith('#') or stripped.startswith('='):
+            previous_blank = False
+            continue
+
+        is_forced_heading = stripped.startswith('.') and not stripped.startswith('..')
+        if is_forced_heading or (previous_blank and FOUNTAIN_HEADING.match(stripped)):
+            number, heading = _fountain_heading(stripped[1:] if is_forced_heading else stripped)
+            closed_scene = builder.start_scene(number, heading)
+            if closed_scene is not None:
+                yield closed_scene
+        else:
+            # Forced action / character / lyrics and centered text markers
+            if stripped[0] in '!@~':
+                stripped = stripped[1:].strip()
+            if stripped.startswith('>') and stripped.endswith('<'):
+                stripped = stripped[1:-1].strip()
+            if stripped:
+                builder.add_line(stripped)
+
+        previous_blank = False
+
+    yield from builder.finish()
+
+# ============================================================================
+# FINAL DRAFT (FDX)
+# ============================================================================
+
+def _paragraph_text(paragraph):
+    return ''.join(''.join(text.itertext()) for text in paragraph.findall('Text'))
+
+def iter_fdx_scenes(source):
+    """
+    Streaming FDX parser built on iterparse: each body paragraph is handled
+    and discarded as soon as it closes, so the document is never held as a
+    full DOM. Title page and header/footer paragraphs are ignored.
+    "Scene Heading" paragraphs start scenes; their Number attribute is the id.
+    """
+    builder = SceneBuilder()
+    path = []
+    body = None
+
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            path.append(element.tag)
+            if path == ["FinalDraft", "Content"]:
+                body = element
+            continue
+
+        path.pop()
+        if element.tag != "Paragraph" or len(path) < 2 or path[:2] != ["FinalDraft", "Content"]:
+            continue
+
+        text = _paragraph_text(element)
+        if element.get("Type") == "Scene Heading":
+            closed_scene = builder.start_scene(element.get("Number"), ' '.join(text.split()))
+            if closed_scene is not None:
+                yield closed_scene
+        else:
+            for line in text.split('\n'):
+                if line.strip():
+                    builder.add_line(line.strip())
+
+        # Drop finished top-level paragraphs to keep memory flat
+        if len(path) == 2:
+            body.clear()
+
+    yield from builder.finish()
+
+# ============================================================================
+# DISPATCH
+# ============================================================================
+
+def is_structured_file(filename):
+    return os.path.splitext(filename)[1].lower() in STRUCTURED_EXTENSIONS
+
+def iter_structured_scenes(filename, file_bytes):
+    """Pick the parser from the file extension (.fountain / .fdx)."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".fdx":
+        return iter_fdx_scenes(io.BytesIO(file_bytes))
+    if extension == ".fountain":
+        text_stream = io.TextIOWrapper(io.BytesIO(file_bytes), encoding='utf-8-sig', errors='replace')
+        return iter_fountain_scenes(text_stream)
+    raise ValueError(f"Unsupported screenplay format: {extension}")
@@ -1,21 +1,113 @@
 import pypdf
 import io
+import os
+import functools
 import re
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_text_from_pdf(uploaded_file):
+# Parallel extraction settings. Below PARALLEL_MIN_PAGES the process start-up
+# costs more than it saves, so small drafts stay on the serial path.
+def _default_workers():
+    """PDF_EXTRACT_WORKERS (0 or unset = one per CPU); a bad value must not stop the app."""
+    try:
+        workers = int(os.getenv("PDF_EXTRACT_WORKERS") or "0")
+    except ValueError:
+        print(f"Ignoring invalid PDF_EXTRACT_WORKERS={os.getenv('PDF_EXTRACT_WORKERS')!r}")
+        workers = 0
+    return max(1, workers or os.cpu_count() or 1)
+
+PDF_EXTRACT_WORKERS = _default_workers()
+PARALLEL_MIN_PAGES = 40
+# Each worker receives several small slices so pages can be streamed in order
+SLICES_PER_WORKER = 4
+
+def read_pdf_bytes(source):
+    """
+    Returns the raw bytes of an uploaded file, file object, path or bytes.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+# Worker-process state: the PDF is sent once per worker (pool initializer),
+# each task then only carries its (start, stop) page range
+_WORKER_PDF = {"reader": None}
+
+def _init_pdf_worker(pdf_bytes):
+    _WORKER_PDF["reader"] = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+
+def _extract_page_range(start, stop):
+    """
+    Worker: extracts pages [start, stop) from the PDF opened by _init_pdf_worker.
+    """
+    pdf_reader = _WORKER_PDF["reader"]
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _page_slices(total_pages, workers):
+    slice_size = max(1, -(-total_pages // (workers * SLICES_PER_WORKER)))
+    return [(start, min(start + slice_size, total_pages)) for start in range(0, total_pages, slice_size)]
+
+def iter_pdf_pages_parallel(pdf_bytes, total_pages, workers, on_page=None):
+    """
+    Splits the page range across a process pool and yields the text of
+    every page (empty string for blank pages) in order.
+    """
+    slices = _page_slices(total_pages, workers)
+    pages_done = 0
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker, initargs=(pdf_bytes,)) as executor:
+        futures = [executor.submit(_extract_page_range, start, stop) for start, stop in slices]
+        
+        # Slices are consumed in submission order, so pages stay in order
+        for future in futures:
+            for page_text in future.result():
+                pages_done += 1
+                yield page_text
+                if on_page:
+                    on_page(pages_done, total_pages)
+
+def iter_pdf_page_texts(uploaded_file, on_page=None, workers=None, min_pages=PARALLEL_MIN_PAGES):
+    """
+    Yields the text of every PDF page, blank pages included (""), as soon
+    as it is extracted. on_page(pages_done, total_pages) is called after
+    every page. Files with at least min_pages pages are extracted by a
+    process pool of `workers` processes (default PDF_EXTRACT_WORKERS);
+    smaller files, or workers=1, use the serial path.
+    """
+    workers = workers or PDF_EXTRACT_WORKERS
+    pdf_bytes = read_pdf_bytes(uploaded_file)
+    pdf_reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(pdf_reader.pages)
+    
+    if workers > 1 and total_pages >= max(min_pages, 2):
+        yield from iter_pdf_pages_parallel(pdf_bytes, total_pages, min(workers, total_pages), on_page=on_page)
+        return
+    
+    for page_number, page in enumerate(pdf_reader.pages, start=1):
+        yield page.extract_text() or ""
+        if on_page:
+            on_page(page_number, total_pages)
+
+def iter_pdf_pages(uploaded_file, on_page=None, workers=None, min_pages=PARALLEL_MIN_PAGES):
+    """
+    Yields the text of each non-empty PDF page (see iter_pdf_page_texts).
+    """
+    for page_text in iter_pdf_page_texts(uploaded_file, on_page=on_page, workers=workers, min_pages=min_pages):
+        if page_text:
+            yield page_text
+
+def extract_text_from_pdf(uploaded_file, workers=None):
     """
     Extracts text from a PDF file uploaded via Streamlit.
     """
     try:
-        pdf_reader = pypdf.PdfReader(uploaded_file)
-        text = ""
-        
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-                
-        return text
+        return ''.join(f"{page_text}\n" for page_text in iter_pdf_pages(uploaded_file, workers=workers))
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
@@ -23,10 +115,90 @@ def clean_text(raw_text):
     """
     Pre-processing: Clean PDF artifacts.
     """
-    lines = raw_text.split('\n')
-    cleaned_lines = []
+    return '\n'.join(iter_clean_lines(raw_text))
+
+# ----------------------------------------------------------------------------
+# Scene header scanner
+# ----------------------------------------------------------------------------
+# Layer 1 (duplicated PDF numbers) and layer 2 (keywords, case-insensitive)
+# share one precompiled pattern; alternation order preserves layer priority.
+# Layer 3 stays on str.isupper()/str.isdigit() because Unicode casing rules
+# cannot be expressed exactly in `re`.
+SCENE_KEYWORDS = r'CẢNH|SCENE|PHÂN ĐOẠN|INT\.|EXT\.|NỘI\.|NGOẠI\.|I\/E\.|BỐI CẢNH'
+LAYER1_PATTERN = r'(?P<l1_header>.*?)\s+(?P<l1_id>[0-9]+[A-Z]?)\s+(?P=l1_id)\s*$'
+TRAILING_ID_PATTERN = re.compile(r'(\d+[A-Z]*)\s*$')
+STUCK_NUMBER_PATTERN = re.compile(r'([A-ZĂÂĐÊÔƠƯÁÀẢÃẠÉÈẺẼẸÍÌỈĨỊÓÒỎÕỌÚÙỦŨỤÝỲỶỸỴ]+)(\d+)')
+
+# Detection settings that can be tuned per import (see get_line_classifier)
+DEFAULT_PARSER_SETTINGS = {
+    "layer1": True,           # "...NIGHT11 11" duplicated numbers
+    "layer2": True,           # CẢNH / SCENE / INT. / EXT. ... keywords
+    "layer3": True,           # ALL CAPS lines containing a digit
+    "extra_keywords": [],     # additional layer 2 keywords (plain text)
+}
+
+@functools.lru_cache(maxsize=32)
+def _build_line_classifier(layer1, layer2, layer3, extra_keywords):
+    alternatives = []
+    if layer1:
+        alternatives.append(LAYER1_PATTERN)
+    if layer2:
+        keywords = '|'.join([SCENE_KEYWORDS] + [re.escape(k) for k in extra_keywords])
+        alternatives.append(r'(?P<l2>(?i:\s*(?:' + keywords + r')))')
+    header_pattern = re.compile('^(?:' + '|'.join(alternatives) + ')') if alternatives else None
+    
+    def classify(stripped):
+        match = header_pattern.match(stripped) if header_pattern else None
+        
+        if match is not None:
+            # LAYER 1: Duplicate number pattern (PDF error: "...NIGHT11 11")
+            if layer1 and (not layer2 or match.group('l2') is None):
+                return match.group('l1_id'), match.group('l1_header').strip()
+            
+            # LAYER 2: Standard keywords
+            id_match = TRAILING_ID_PATTERN.search(stripped)
+            if id_match:
+                clean_header = stripped[:id_match.start()].strip()
+                # Clean stuck numbers in words (e.g., "NIGHT23" -> "NIGHT")
+                clean_header = STUCK_NUMBER_PATTERN.sub(r'\1', clean_header)
+                return id_match.group(1), ' '.join(clean_header.split())
+            return None, stripped
+        
+        # LAYER 3: All caps with number (catch-all)
+        if layer3 and stripped.isupper() and any(map(str.isdigit, stripped)):
+            id_match = TRAILING_ID_PATTERN.search(stripped)
+            if id_match:
+                return id_match.group(1), stripped[:id_match.start()].strip()
+            return None, stripped
+        
+        return None
     
-    for line in lines:
+    return classify
+
+def get_line_classifier(settings=None):
+    """
+    Returns a compiled classify(stripped) function for the given detection
+    settings (see DEFAULT_PARSER_SETTINGS). Compiled scanners are cached.
+    """
+    settings = {**DEFAULT_PARSER_SETTINGS, **(settings or {})}
+    extra_keywords = tuple(k.strip() for k in settings["extra_keywords"] if k.strip())
+    return _build_line_classifier(bool(settings["layer1"]), bool(settings["layer2"]), bool(settings["layer3"]), extra_keywords)
+
+def classify_line(stripped):
+    """
+    Classify one stripped line in a single pass (default settings).
+    Returns (extracted_id, clean_header) for scene headers, None otherwise.
+    extracted_id is None when the header carries no usable number.
+    """
+    return _default_classifier(stripped)
+
+_default_classifier = get_line_classifier()
+
+def iter_clean_lines(raw_text):
+    """
+    Yield the lines clean_text() would keep, without building the joined string.
+    """
+    for line in raw_text.split('\n'):
         stripped = line.strip()
         
         # Skip empty lines
@@ -39,130 +211,232 @@ def clean_text(raw_text):
         if stripped.lower().startswith("page ") and len(stripped.split()) == 2:
             continue
             
-        cleaned_lines.append(stripped)
-    
-    return '\n'.join(cleaned_lines)
+        yield stripped
 
-def parse_scenes(full_text):
+class SceneBuilder:
     """
-    Multi-layer scene detection with real ID extraction.
-    Uses 3-layer detection strategy to catch all scene headers.
+    Incremental scene builder.
+    Feed cleaned lines in script order; each scene is returned as soon as the
+    next header closes it, so callers never need the whole script in memory.
     """
-    cleaned_text = clean_text(full_text)
-    lines = cleaned_text.split('\n')
     
-    scenes = []
-    current_scene_lines = []
-    current_header = None
-    current_scene_id = None
-    auto_counter = 0
+    def __init__(self, settings=None, first_index=0):
+        self.classify = get_line_classifier(settings)
+        # first_index > 0 resumes numbering mid-script (incremental re-parse)
+        self.scene_count = first_index
+        self.preamble_lines = []
+        self.current_scene_lines = []
+        self.current_header = None
+        self.current_scene_id = None
+        self.auto_counter = first_index
     
-    for line_idx, line in enumerate(lines):
-        stripped = line.strip()
+    def _close_current(self):
+        scene = {
+            "id": self.current_scene_id,
+            "header": self.current_header,
+            "content": '\n'.join(self.current_scene_lines).strip(),
+            "original_index": self.scene_count
+        }
+        self.scene_count += 1
+        return scene
+    
+    def feed_line(self, stripped):
+        """Consume one cleaned line. Returns the scene it closed, or None."""
+        header = self.classify(stripped)
         
-        if not stripped:
-            continue
+        if header is None:
+            self.add_line(stripped)
+            return None
         
-        is_header = False
-        extracted_id = None
-        clean_header = stripped
+        extracted_id, clean_header = header
+        return self.start_scene(extracted_id, clean_header)
+    
+    def add_line(self, stripped):
+        """Append a content line to the open scene."""
+        if self.current_header is not None:
+            # Accumulate content
+            self.current_scene_lines.append(stripped)
+        else:
+            # Text before the first header (title page, or lines that belong
+            # to the previous scene in an incremental re-parse)
+            self.preamble_lines.append(stripped)
+    
+    def start_scene(self, extracted_id, clean_header):
+        """Start a new scene. Returns the scene it closed, or None."""
+        closed_scene = self._close_current() if self.current_header is not None else None
         
-        # LAYER 1: Detect duplicate number pattern (PDF error: "...NIGHT11 11")
-        layer1_pattern = r'^(.*?)\s+([0-9]+[A-Z]?)\s+\2\s*$'
-        layer1_match = re.match(layer1_pattern, stripped)
+        # Start new scene
+        self.auto_counter += 1
         
-        if layer1_match:
-            is_header = True
-            extracted_id = layer1_match.group(2)
-            clean_header = layer1_match.group(1).strip()
-            # print(f"[LAYER 1] Detected: [{stripped}] -> ID: {extracted_id} | Header: {clean_header}")
+        # Assign ID: Use extracted ID if found, otherwise use AUTO_X
+        if extracted_id:
+            self.current_scene_id = extracted_id
+        else:
+            self.current_scene_id = f"AUTO_{self.auto_counter}"
         
-        # LAYER 2: Standard keywords
-        if not is_header:
-            layer2_pattern = r'^\s*(?:CẢNH|SCENE|PHÂN ĐOẠN|INT\.|EXT\.|NỘI\.|NGOẠI\.|I\/E\.|BỐI CẢNH).*$'
-            if re.match(layer2_pattern, stripped, re.IGNORECASE):
-                is_header = True
-                
-                # Try to extract ID from end of line
-                id_pattern = r'(\d+[A-Z]*)\s*$'
-                id_match = re.search(id_pattern, stripped)
-                
-                if id_match:
-                    extracted_id = id_match.group(1)
-                    clean_header = stripped[:id_match.start()].strip()
-                    # Clean stuck numbers in words (e.g., "NIGHT23" -> "NIGHT")
-                    clean_header = re.sub(r'([A-ZĂÂĐÊÔƠƯÁÀẢÃẠÉÈẺẼẸÍÌỈĨỊÓÒỎÕỌÚÙỦŨỤÝỲỶỸỴ]+)(\d+)', r'\1', clean_header)
-                    clean_header = ' '.join(clean_header.split())
-                else:
-                    extracted_id = None
-                    clean_header = stripped
-                
-                # print(f"[LAYER 2] Detected: [{stripped}] -> ID: {extracted_id} | Header: {clean_header}")
+        self.current_header = clean_header
+        self.current_scene_lines = []
+        return closed_scene
+    
+    def feed_text(self, raw_text):
+        """Clean a chunk of raw text (e.g. one PDF page) and yield closed scenes."""
+        for stripped in iter_clean_lines(raw_text):
+            closed_scene = self.feed_line(stripped)
+            if closed_scene is not None:
+                yield closed_scene
+    
+    def close(self):
+        """Close the last scene, if any, without the fallback."""
+        return [self._close_current()] if self.current_header is not None else []
+    
+    def finish(self):
+        """Close the last scene. Returns the remaining scenes (with fallback)."""
+        if self.current_header is not None:
+            return self.close()
         
-        # LAYER 3: All caps with number (catch-all)
-        if not is_header:
-            # Check if line is mostly uppercase and contains at least one digit
-            if stripped.isupper() and any(char.isdigit() for char in stripped):
-                is_header = True
-                
-                # Try to extract ID
-                id_pattern = r'(\d+[A-Z]*)\s*$'
-                id_match = re.search(id_pattern, stripped)
-                
-                if id_match:
-                    extracted_id = id_match.group(1)
-                    clean_header = stripped[:id_match.start()].strip()
-                else:
-                    extracted_id = None
-                    clean_header = stripped
-                
-                # print(f"[LAYER 3] Detected: [{stripped}] -> ID: {extracted_id} | Header: {clean_header}")
+        # Fallback
+        if self.scene_count == 0:
+            return [{
+                "id": "AUTO_1",
+                "header": "UNKNOWN SCENE",
+                "content": '\n'.join(self.preamble_lines),
+                "original_index": 0
+            }]
         
-        # If this is a header, save previous scene and start new one
-        if is_header:
-            # Save previous scene
-            if current_header is not None:
-                scenes.append({
-                    "id": current_scene_id,
-                    "header": current_header,
-                    "content": '\n'.join(current_scene_lines).strip(),
-                    "original_index": len(scenes)
-                })
-            
-            # Start new scene
-            auto_counter += 1
-            
-            # Assign ID: Use extracted ID if found, otherwise use AUTO_X
-            if extracted_id:
-                current_scene_id = extracted_id
-            else:
-                current_scene_id = f"AUTO_{auto_counter}"
-            
-            current_header = clean_header
-            current_scene_lines = []
-        else:
-            # Accumulate content
-            if current_header is not None:
-                current_scene_lines.append(stripped)
-    
-    # Save last scene
-    if current_header is not None:
-        scenes.append({
-            "id": current_scene_id,
-            "header": current_header,
-            "content": '\n'.join(current_scene_lines).strip(),
-            "original_index": len(scenes)
-        })
+        return []
+
+def iter_scenes_from_pages(pages, page_sink=None, settings=None):
+    """
+    Streaming parse: consumes page texts one at a time and yields scenes
+    as soon as they close. Same output as parse_scenes() on the joined text.
+    If page_sink is a list, every page text is appended to it (for caching).
+    """
+    builder = SceneBuilder(settings)
+    for page_text in pages:
+        if page_sink is not None:
+            page_sink.append(page_text)
+        yield from builder.feed_text(page_text)
+    yield from builder.finish()
+
+def iter_scenes_from_pdf(uploaded_file, on_page=None, workers=None, page_sink=None):
+    """
+    PDF -> scenes pipeline without building the full script text.
+    """
+    return iter_scenes_from_pages(iter_pdf_pages(uploaded_file, on_page=on_page, workers=workers), page_sink=page_sink)
+
+def parse_scenes(full_text, settings=None):
+    """
+    Multi-layer scene detection with real ID extraction.
+    Uses 3-layer detection strategy to catch all scene headers,
+    classifying each cleaned line once with the precompiled scanner.
+    settings toggles layers / adds keywords (see DEFAULT_PARSER_SETTINGS).
+    """
+    return list(iter_scenes_from_pages([full_text], settings=settings))
+
+# ----------------------------------------------------------------------------
+# Incremental re-parse
+# ----------------------------------------------------------------------------
+
+def _splice_region(scenes, start, stop, builder, region):
+    """
+    Replace scenes[start:stop] by region and fix up what a full parse would
+    number differently. Neighbouring scene records are updated in place.
+    """
+    result = list(scenes[:start])
+    
+    # Lines before the first header belong to the previous scene
+    if builder.preamble_lines and result:
+        previous = result[-1]
+        previous["content"] = '\n'.join(filter(None, [previous["content"]] + builder.preamble_lines))
     
-    # print(f"[SUMMARY] Total scenes detected: {len(scenes)}")
+    result.extend(region)
+    tail = scenes[stop:]
     
-    # Fallback
-    if not scenes:
+    # Scenes after the region only change when the scene count changed
+    shift = len(region) - (stop - start)
+    if shift:
+        for old_position, scene in enumerate(tail, start=stop):
+            new_position = old_position + shift
+            scene["original_index"] = new_position
+            if scene["id"] == f"AUTO_{old_position + 1}":
+                scene["id"] = f"AUTO_{new_position + 1}"
+    result.extend(tail)
+    
+    # Fallback (no header anywhere)
+    if not result:
         return [{
             "id": "AUTO_1",
             "header": "UNKNOWN SCENE",
-            "content": cleaned_text,
+            "content": '\n'.join(builder.preamble_lines),
             "original_index": 0
         }]
     
-    return scenes
+    return result
+
+def reparse_scenes(scenes, start, stop, source_text, settings=None):
+    """
+    Incremental re-parse of an edited span.
+    scenes[start:stop] are replaced by the scenes found in source_text, their
+    edited raw text (header lines included). Only that text is scanned, so the
+    cost depends on the edit, not the script length. The result equals
+    parse_scenes() of the whole edited script.
+    """
+    builder = SceneBuilder(settings, first_index=start)
+    region = list(builder.feed_text(source_text))
+    region.extend(builder.close())
+    return _splice_region(scenes, start, stop, builder, region)
+
+def _fresh_scene_id(used_ids, base_id):
+    """First unused "<base_id>.<n>" (the id of a scene split off base_id)"""
+    n = 1
+    while f"{base_id}.{n}" in used_ids:
+        n += 1
+    return f"{base_id}.{n}"
+
+def split_scene(scenes, position, content, settings=None):
+    """
+    Split one scene at the scene headings found in its content (explicit
+    "split" action in the editor). Returns the new scene list, or None when
+    content has no heading.
+    
+    The scene keeps its id, header and database row, and the lines before
+    the first heading exactly as typed (blank and number-only lines
+    included). Every heading starts a new scene inserted after it, with the
+    heading's number as id when no other scene uses it, otherwise a fresh
+    "<id>.<n>" id. Ids of the other scenes never change; only their
+    original_index shifts (updated in place).
+    """
+    classify = get_line_classifier(settings)
+    scene = scenes[position]
+    kept_lines, fragments = [], []
+    for line in content.split('\n'):
+        header = classify(line.strip()) if line.strip() else None
+        if header is not None:
+            fragments.append({"extracted_id": header[0], "header": header[1], "lines": []})
+        elif fragments:
+            fragments[-1]["lines"].append(line)
+        else:
+            kept_lines.append(line)
+    
+    if not fragments:
+        return None
+    
+    used_ids = {str(s["id"]) for s in scenes}
+    new_scenes = []
+    for offset, fragment in enumerate(fragments, start=1):
+        scene_id = fragment["extracted_id"]
+        if not scene_id or scene_id in used_ids:
+            scene_id = _fresh_scene_id(used_ids, scene["id"])
+        used_ids.add(scene_id)
+        new_scenes.append({
+            "id": scene_id,
+            "header": fragment["header"],
+            "content": '\n'.join(fragment["lines"]).strip('\n'),
+            "original_index": scene["original_index"] + offset
+        })
+    
+    scene["content"] = '\n'.join(kept_lines).strip('\n')
+    tail = list(scenes[position + 1:])
+    for scene_after in tail:
+        scene_after["original_index"] += len(new_scenes)
+    return list(scenes[:position + 1]) + new_scenes + tail
@@ -0,0 +1,266 @@
+"""
+Structured (JSON) output for ai_engine
+Response schemas for every JSON-producing prompt, a tolerant parser that
+repairs the usual model defects locally (code fences, chatter around the
+JSON, trailing commas, raw newlines inside strings, truncated output) and a
+small schema validator. Repairing locally means a malformed answer no
+longer costs a full re-generation.
+"""
+
+import json
+import re
+
+# ============================================================================
+# SCHEMAS (Gemini response_schema subset of OpenAPI)
+# ============================================================================
+
+def _section_schema():
+    return {
+        "type": "object",
+        "properties": {"summary": {"type": "string"}, "detail": {"type": "string"}},
+        "required": ["summary", "detail"],
+    }
+
+CREATIVE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "structure": _section_schema(),
+        "character": _section_schema(),
+        "tension": _section_schema(),
+        "show_vs_tell": _section_schema(),
+    },
+    "required": ["structure", "character", "tension", "show_vs_tell"],
+}
+
+SUMMARY_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"Dạng vấn đề": {"type": "string"}, "Mô tả chi tiết": {"type": "string"}},
+        "required": ["Dạng vấn đề", "Mô tả chi tiết"],
+    },
+}
+
+ACTION_PLAN_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "task_name": {"type": "string"},
+            "related_scenes": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "scene_id": {"type": "string"},
+                        "header_context": {"type": "string"},
+                        "instruction": {"type": "string"},
+                    },
+                    "required": ["scene_id", "instruction"],
+                },
+            },
+        },
+        "required": ["task_name", "related_scenes"],
+    },
+}
+
+BRAINSTORM_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"title": {"type": "string"}, "content": {"type": "string"}},
+        "required": ["title", "content"],
+    },
+}
+
+DIALOGUE_FIX_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "original": {"type": "string"},
+            "replacement": {"type": "string"},
+            "reason": {"type": "string"},
+        },
+        "required": ["original", "replacement"],
+    },
+}
+
+def generation_config(schema):
+    """generation_config for generate_content: JSON mode + declared schema."""
+    config = {"response_mime_type": "application/json"}
+    if schema is not None:
+        config["response_schema"] = schema
+    return config
+
+# ============================================================================
+# TOLERANT PARSER
+# ============================================================================
+
+FENCE_PATTERN = re.compile(r'```(?:json|JSON)?')
+CLOSERS = {"{": "}", "[": "]"}
+
+class StructuredOutputError(ValueError):
+    pass
+
+def _strip_trailing_comma(out):
+    while out and out[-1] in " \t\r\n":
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+def repair_json(text):
+    """
+    Returns candidate JSON strings, best first: the cleaned text, then
+    (for truncated output) versions cut back to the last complete element.
+    """
+    text = FENCE_PATTERN.sub("", text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise StructuredOutputError("No JSON object or array in response")
+    text = text[min(starts):]
+
+    out = []
+    stack = []
+    checkpoints = []          # (output length, open brackets) before each comma
+    openers = []              # (output length, open brackets) after each { or [
+    in_string = False
+    escaped = False
+
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+                out.append(char)
+            elif char == "\\":
+                escaped = True
+                out.append(char)
+            elif char == '"':
+                in_string = False
+                out.append(char)
+            elif char == "\n":
+                out.append("\\n")
+            elif char == "\t":
+                out.append("\\t")
+            elif char == "\r":
+                continue
+            elif ord(char) < 0x20:
+                out.append(f"\\u{ord(char):04x}")
+            else:
+                out.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in CLOSERS:
+            stack.append(char)
+            out.append(char)
+            openers.append((len(out), tuple(stack)))
+        elif char in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                break  # ignore anything after the top-level value
+        elif char == ",":
+            checkpoints.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            out.append(char)
+
+    if not in_string and not stack:
+        return ["".join(out)]
+
+    # Truncated: first try closing what is open, then cut back element by element
+    candidates = []
+    closed = out + (['"'] if in_string else [])
+    _strip_trailing_comma(closed)
+    candidates.append("".join(closed) + "".join(CLOSERS[c] for c in reversed(stack)))
+    # Dropping a partial element beats keeping it as an empty {} / []
+    for length, open_stack in list(reversed(checkpoints)) + list(reversed(openers)):
+        partial = out[:length]
+        _strip_trailing_comma(partial)
+        candidates.append("".join(partial) + "".join(CLOSERS[c] for c in reversed(open_stack)))
+    return candidates
+
+def parse_json(text):
+    """Parse model output as JSON, repairing it locally if needed."""
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    for candidate in repair_json(text or ""):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise StructuredOutputError("Response could not be repaired into valid JSON")
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+
+TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+}
+
+def coerce(data, schema):
+    """
+    Fix shape mismatches that keep the content intact: an array wrapped in
+    an object ({"tasks": [...]}), a lone object where an array is expected,
+    and numeric ids where strings are expected.
+    """
+    expected = schema.get("type")
+    if expected == "array":
+        if isinstance(data, dict):
+            only_value = next(iter(data.values())) if len(data) == 1 else None
+            data = only_value if isinstance(only_value, list) else [data]
+        if isinstance(data, list) and "items" in schema:
+            data = [coerce(item, schema["items"]) for item in data]
+    elif expected == "object" and isinstance(data, dict):
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in data:
+                data[key] = coerce(data[key], sub_schema)
+    elif expected == "string" and isinstance(data, (int, float)) and not isinstance(data, bool):
+        data = str(data)
+    return data
+
+def validate(data, schema, path="$"):
+    """Returns a list of schema violations (empty when valid)."""
+    expected = schema.get("type")
+    if expected and not TYPE_CHECKS[expected](data):
+        return [f"{path}: expected {expected}, got {type(data).__name__}"]
+
+    errors = []
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}.{key}: missing")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in data:
+                errors.extend(validate(data[key], sub_schema, f"{path}.{key}"))
+    elif expected == "array" and "items" in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+def parse_structured(text, schema):
+    """
+    parse_json + coerce + validate. Returns (data, errors); raises
+    StructuredOutputError only when no JSON can be recovered at all.
+    """
+    data = coerce(parse_json(text), schema)
+    errors = validate(data, schema)
+    if errors and isinstance(data, list) and "items" in schema:
+        # Truncated arrays: keep the complete items, drop the broken tail
+        valid_items = [item for item in data if not validate(item, schema["items"])]
+        if valid_items:
+            data, errors = valid_items, [f"$: dropped {len(data) - len(valid_items)} incomplete item(s)"]
+    return data, errors
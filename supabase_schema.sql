@@ -31,10 +31,14 @@ CREATE TABLE IF NOT EXISTS scenes (
     header TEXT NOT NULL,
     content TEXT NOT NULL,
     original_index INTEGER DEFAULT 0,
+    content_hash TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Existing installs: hash of header + content, lets the app write only changed scenes
+ALTER TABLE scenes ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Index for faster queries
 CREATE INDEX IF NOT EXISTS idx_scenes_project_id ON scenes(project_id);
 CREATE INDEX IF NOT EXISTS idx_scenes_original_index ON scenes(original_index);
@@ -207,6 +211,40 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- Re-index moved scenes in one request (database.save_scenes)
+CREATE OR REPLACE FUNCTION reorder_scenes(p_project_id UUID, p_ids UUID[], p_indexes INTEGER[])
+RETURNS VOID AS $$
+    UPDATE scenes
+    SET original_index = moved.new_index
+    FROM unnest(p_ids, p_indexes) AS moved(row_id, new_index)
+    WHERE scenes.id = moved.row_id
+      AND scenes.project_id = p_project_id;
+$$ LANGUAGE sql SECURITY INVOKER;
+
+-- Project, scenes, latest analysis and latest action plan in one request
+-- (database.load_project_to_session). Projects with more scenes than
+-- p_content_scene_limit return scenes without content (loaded on demand).
+DROP FUNCTION IF EXISTS get_project_bundle(UUID);
+CREATE OR REPLACE FUNCTION get_project_bundle(p_project_id UUID, p_content_scene_limit INTEGER DEFAULT NULL)
+RETURNS JSONB AS $$
+    WITH scene_count AS (
+        SELECT count(*) AS total FROM scenes WHERE project_id = p_project_id
+    )
+    SELECT jsonb_build_object(
+        'project', (SELECT to_jsonb(p) FROM projects p WHERE p.id = p_project_id),
+        'scenes', COALESCE((SELECT jsonb_agg(
+                                CASE WHEN p_content_scene_limit IS NULL OR scene_count.total <= p_content_scene_limit
+                                     THEN to_jsonb(s) ELSE to_jsonb(s) - 'content' END
+                                ORDER BY s.original_index)
+                            FROM scenes s WHERE s.project_id = p_project_id), '[]'::jsonb),
+        'analysis', (SELECT to_jsonb(a) FROM analysis_results a WHERE a.project_id = p_project_id
+                     ORDER BY a.created_at DESC LIMIT 1),
+        'action_plan', (SELECT to_jsonb(ap) FROM action_plans ap WHERE ap.project_id = p_project_id
+                        ORDER BY ap.updated_at DESC LIMIT 1)
+    )
+    FROM scene_count;
+$$ LANGUAGE sql STABLE SECURITY INVOKER;
+
 -- Triggers for updated_at
 CREATE TRIGGER update_projects_updated_at BEFORE UPDATE ON projects
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -235,3 +273,5 @@ CREATE TRIGGER update_action_plans_updated_at BEFORE UPDATE ON action_plans
 -- DROP TABLE IF EXISTS scenes CASCADE;
 -- DROP TABLE IF EXISTS projects CASCADE;
 -- DROP FUNCTION IF EXISTS update_updated_at_column CASCADE;
+-- DROP FUNCTION IF EXISTS reorder_scenes;
+-- DROP FUNCTION IF EXISTS get_project_bundle;
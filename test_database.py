@@ -0,0 +1,187 @@
+"""
+Tests for database.diff_scenes and _run retries (no Supabase needed)
+Run with: python -m pytest -q test_database.py
+"""
+
+import pytest
+
+import database
+
+
+def scene(scene_id, content, index, row_id=None, header=None):
+    result = {"id": scene_id, "header": header or f"CẢNH {scene_id}", "content": content, "original_index": index}
+    if row_id is not None:
+        result["row_id"] = row_id
+    return result
+
+def snapshot_of(scenes):
+    """Stored rows matching `scenes` exactly (row ids r0, r1, ...)."""
+    return [{"row_id": f"r{i}", "scene_id": s["id"], "header": s["header"],
+             "hash": database.scene_hash(s["header"], s["content"]),
+             "original_index": s["original_index"]} for i, s in enumerate(scenes)]
+
+def test_unchanged_scenes_write_nothing():
+    scenes = [scene("1", "a", 0), scene("2", "b", 1)]
+    changes = database.diff_scenes(snapshot_of(scenes), scenes)
+    assert (changes["upserts"], changes["reorders"], changes["renames"], changes["deletes"]) == ([], {}, {}, [])
+    assert [row["row_id"] for row in changes["snapshot"]] == ["r0", "r1"]
+
+def test_edit_upserts_only_that_row_and_keeps_its_id():
+    scenes = [scene("1", "a", 0), scene("2", "b", 1)]
+    snapshot = snapshot_of(scenes)
+    scenes[1]["content"] = "b edited"
+    changes = database.diff_scenes(snapshot, scenes)
+    assert [(row["id"], row["content"]) for row in changes["upserts"]] == [("r1", "b edited")]
+    assert changes["deletes"] == []
+
+def test_row_id_wins_over_scene_id():
+    # Two scenes swap their ids: row_id still pairs each with its own row
+    scenes = [scene("1", "a", 0, row_id="r0"), scene("2", "b", 1, row_id="r1")]
+    snapshot = snapshot_of(scenes)
+    scenes[0]["id"], scenes[1]["id"] = "2", "1"
+    changes = database.diff_scenes(snapshot, scenes)
+    assert [row["id"] for row in changes["upserts"]] == ["r0", "r1"]
+    assert [row["scene_id"] for row in changes["upserts"]] == ["2", "1"]
+    assert changes["deletes"] == []
+
+def test_duplicate_scene_ids_pair_up_in_order():
+    scenes = [scene("5", "a", 0), scene("5", "b", 1), scene("5", "c", 2)]
+    snapshot = snapshot_of(scenes)
+    changes = database.diff_scenes(snapshot, scenes[:2])
+    assert changes["upserts"] == []
+    assert changes["deletes"] == ["r2"]
+    assert [row["row_id"] for row in changes["snapshot"]] == ["r0", "r1"]
+
+def test_new_scene_gets_a_new_row():
+    scenes = [scene("1", "a", 0)]
+    snapshot = snapshot_of(scenes)
+    scenes.append(scene("2", "b", 1))
+    changes = database.diff_scenes(snapshot, scenes)
+    assert len(changes["upserts"]) == 1
+    new_row = changes["upserts"][0]
+    assert new_row["id"] != "r0" and new_row["scene_id"] == "2"
+    assert changes["snapshot"][1]["row_id"] == new_row["id"]
+
+def test_moved_scene_is_reindexed_not_rewritten():
+    scenes = [scene("1", "a", 0, row_id="r0"), scene("2", "b", 1, row_id="r1")]
+    snapshot = snapshot_of(scenes)
+    moved = [dict(scenes[1], original_index=0), dict(scenes[0], original_index=1)]
+    changes = database.diff_scenes(snapshot, moved)
+    assert changes["upserts"] == []
+    assert changes["reorders"] == {"r1": 0, "r0": 1}
+
+def test_deleted_scenes_are_deleted():
+    scenes = [scene("1", "a", 0), scene("2", "b", 1), scene("3", "c", 2)]
+    changes = database.diff_scenes(snapshot_of(scenes), [scenes[0], scenes[2]])
+    assert changes["deletes"] == ["r1"]
+    assert [row["scene_id"] for row in changes["snapshot"]] == ["1", "3"]
+
+def test_renamed_unloaded_scene_is_updated_without_content():
+    scenes = [scene("1", "a", 0, row_id="r0"), scene("2", "b", 1, row_id="r1")]
+    snapshot = snapshot_of(scenes)
+    lazy = [dict(s, content=None) for s in scenes]
+    lazy[1]["id"] = "2A"
+    changes = database.diff_scenes(snapshot, lazy)
+    assert changes["upserts"] == []
+    assert changes["renames"] == {"r1": {"scene_id": "2A", "header": "CẢNH 2", "original_index": 1,
+                                         "content_hash": snapshot[1]["hash"]}}
+    # The stored hash is kept: neither header nor content changed
+    assert changes["snapshot"][1]["hash"] == snapshot[1]["hash"]
+
+def test_header_change_of_unloaded_scene_clears_its_hash():
+    scenes = [scene("1", "a", 0, row_id="r0")]
+    snapshot = snapshot_of(scenes)
+    lazy = [dict(scenes[0], content=None, header="CẢNH 1 - ĐÊM")]
+    changes = database.diff_scenes(snapshot, lazy)
+    assert changes["renames"]["r0"]["header"] == "CẢNH 1 - ĐÊM"
+    assert changes["renames"]["r0"]["content_hash"] is None
+    # Once loaded, the scene is written again with a fresh hash
+    loaded = [dict(lazy[0], content="a")]
+    assert [row["id"] for row in database.diff_scenes(changes["snapshot"], loaded)["upserts"]] == ["r0"]
+
+def test_unloaded_scene_without_row_is_skipped():
+    changes = database.diff_scenes([], [scene("1", None, 0)])
+    assert changes["upserts"] == [] and changes["snapshot"] == [] and changes["kept"] == []
+
+def test_insert_is_not_retried_after_the_request_was_sent(monkeypatch):
+    monkeypatch.setattr(database, "get_supabase_client", lambda: object())
+    monkeypatch.setattr(database, "reset_supabase_client", lambda: None)
+    calls = []
+
+    def dropped(client):
+        calls.append(client)
+        raise database.httpx.RemoteProtocolError("Server disconnected")
+
+    with pytest.raises(database.httpx.RemoteProtocolError):
+        database._run(dropped, idempotent=False)
+    assert len(calls) == 1
+
+    calls.clear()
+    with pytest.raises(database.httpx.RemoteProtocolError):
+        database._run(dropped)
+    assert len(calls) == 2
+
+def test_connect_errors_are_retried_for_inserts(monkeypatch):
+    monkeypatch.setattr(database, "get_supabase_client", lambda: object())
+    monkeypatch.setattr(database, "reset_supabase_client", lambda: None)
+    attempts = []
+
+    def flaky(client):
+        attempts.append(client)
+        if len(attempts) == 1:
+            raise database.httpx.ConnectError("refused")
+        return "ok"
+
+    assert database._run(flaky, idempotent=False) == "ok"
+
+class FakeQuery:
+    """Records table(...).op(...).eq(...).execute() chains; returns no rows."""
+
+    def __init__(self, log, table):
+        self.log, self.table, self.ops = log, table, []
+
+    def __getattr__(self, name):
+        def op(*args, **kwargs):
+            self.ops.append((name, args))
+            return self
+        return op
+
+    def execute(self):
+        self.log.append((self.table, self.ops))
+        return type("Result", (), {"data": []})()
+
+class FakeClient:
+    def __init__(self):
+        self.log = []
+
+    def table(self, name):
+        return FakeQuery(self.log, name)
+
+def test_renaming_an_evicted_scene_updates_only_its_columns(monkeypatch):
+    from scene_store import Scene, SceneStore
+
+    rows = [{"id": f"r{n}", "scene_id": str(n), "header": f"CẢNH {n}", "original_index": n,
+             "content_hash": database.scene_hash(f"CẢNH {n}", f"nội dung {n}")} for n in range(3)]
+    store = SceneStore([Scene(row["scene_id"], row["header"], None, row["original_index"], row["id"]) for row in rows],
+                       content_loader=lambda ids: {row_id: f"nội dung {row_id[1:]}" for row_id in ids},
+                       page_size=1, cache_size=1)
+    store.ensure_loaded(0)
+    store.ensure_loaded(1)
+    assert store[0].content is None   # evicted
+
+    evicted = store[0]
+    store.replace("0", Scene("0A", evicted.header, None, evicted.original_index, evicted.row_id))
+
+    client = FakeClient()
+    monkeypatch.setattr(database, "is_supabase_enabled", lambda: True)
+    monkeypatch.setattr(database, "get_supabase_client", lambda: client)
+    database._set_scene_snapshot("project-1", database._snapshot_from_rows(rows))
+    try:
+        assert database.save_scenes("project-1", store.to_dicts())
+    finally:
+        database._set_scene_snapshot("project-1", None)
+
+    scene_writes = [ops for table, ops in client.log if table == "scenes"]
+    assert scene_writes == [[("update", ({"scene_id": "0A", "header": "CẢNH 0", "original_index": 0,
+                                          "content_hash": rows[0]["content_hash"]},)),
+                             ("eq", ("id", "r0"))]]
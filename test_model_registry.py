@@ -0,0 +1,22 @@
+import google.generativeai as genai
+
+import model_registry
+
+MODEL_NAME = "models/gemini-test"
+
+def test_generative_model_keeps_private_client_attribute():
+    # model_registry.get_model binds per-key clients through this attribute
+    assert "_client" in vars(genai.GenerativeModel(MODEL_NAME))
+
+def test_get_model_binds_one_client_per_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "DISCOVERY_CACHE_PATH", str(tmp_path / "model_discovery.json"))
+    try:
+        model_a = model_registry.get_model("test-key-a", MODEL_NAME)
+        model_b = model_registry.get_model("test-key-b", MODEL_NAME)
+        assert model_a._client is model_registry.get_service_client("test-key-a")
+        assert model_b._client is model_registry.get_service_client("test-key-b")
+        assert model_a._client is not model_b._client
+        assert model_registry.get_model("test-key-a", MODEL_NAME) is model_a
+    finally:
+        for api_key in ("test-key-a", "test-key-b"):
+            model_registry.forget(api_key)
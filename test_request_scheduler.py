@@ -0,0 +1,111 @@
+"""
+Tests for request_scheduler.RequestScheduler with a fake clock (no Gemini calls)
+Run with: python -m pytest -q test_request_scheduler.py
+"""
+
+import threading
+import time
+
+import request_scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+def test_waiters_run_in_priority_then_fifo_order():
+    scheduler = request_scheduler.RequestScheduler(requests_per_minute=6000, burst=100, max_in_flight=1)
+    order = []
+    scheduler._acquire("key", request_scheduler.NORMAL)   # hold the only slot
+
+    threads = []
+    for name, priority in [("bulk-1", request_scheduler.BULK), ("normal", request_scheduler.NORMAL),
+                           ("bulk-2", request_scheduler.BULK), ("interactive", request_scheduler.INTERACTIVE)]:
+        threads.append(start(scheduler.run, lambda name=name: order.append(name), "key", priority))
+        wait_until(lambda: scheduler.get_metrics()["queue_depth"] == len(threads))
+
+    scheduler._release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "normal", "bulk-1", "bulk-2"]
+
+def test_in_flight_is_capped():
+    scheduler = request_scheduler.RequestScheduler(requests_per_minute=6000, burst=100, max_in_flight=3)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def call():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    threads = [start(scheduler.run, call, "key", request_scheduler.BULK) for _ in range(12)]
+    for thread in threads:
+        thread.join(5)
+    assert peak[0] == 3
+    metrics = scheduler.get_metrics()
+    assert (metrics["requests"], metrics["in_flight"], metrics["queue_depth"]) == (12, 0, 0)
+
+def test_rate_limited_waiter_holds_no_slot():
+    clock = FakeClock()
+    scheduler = request_scheduler.RequestScheduler(requests_per_minute=60, burst=1, max_in_flight=1, clock=clock)
+    done = []
+    scheduler.run(lambda: done.append("first"), "key-a")
+
+    # key-a is out of tokens: its next call waits without taking the slot...
+    waiter = start(scheduler.run, lambda: done.append("second"), "key-a")
+    wait_until(lambda: scheduler.get_metrics()["queue_depth"] == 1)
+    assert scheduler.get_metrics()["in_flight"] == 0
+
+    # ...so another key can still run
+    scheduler.run(lambda: done.append("other key"), "key-b")
+    assert done == ["first", "other key"]
+
+    clock.now += 1.0
+    with scheduler._condition:
+        scheduler._condition.notify_all()
+    waiter.join(5)
+    assert done == ["first", "other key", "second"]
+
+def test_token_bucket_refills_without_debt():
+    clock = FakeClock()
+    bucket = request_scheduler.TokenBucket(rate_per_second=2.0, capacity=2, clock=clock)
+    bucket.take()
+    bucket.take()
+    assert bucket.delay() == 0.5
+    clock.now += 0.25
+    assert bucket.delay() == 0.25
+    clock.now += 10
+    assert bucket.delay() == 0.0 and bucket.tokens == 2
+
+def test_retryable_errors_are_retried(monkeypatch):
+    scheduler = request_scheduler.RequestScheduler(requests_per_minute=6000, burst=100, max_retries=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TimeoutError("slow")
+        return "ok"
+
+    monkeypatch.setattr(request_scheduler, "backoff_delay", lambda attempt: 0)
+    assert scheduler.run(flaky, "key") == "ok"
+    assert scheduler.get_metrics()["retries"] == 2
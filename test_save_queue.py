@@ -0,0 +1,112 @@
+"""
+Tests for save_queue.SaveQueue with a fake writer and a fake clock
+Run with: python -m pytest -q test_save_queue.py
+"""
+
+import pytest
+
+import save_queue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeWriter:
+    """Records writes; fails while `failing` is set, or runs `during_write` once."""
+
+    def __init__(self):
+        self.writes = []
+        self.failing = False
+        self.during_write = None
+
+    def __call__(self, project_id, section, value):
+        if self.during_write:
+            action, self.during_write = self.during_write, None
+            action()
+        if self.failing:
+            return False
+        self.writes.append((project_id, section, value))
+        return True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(save_queue, "time", fake)
+    return fake
+
+@pytest.fixture
+def writer():
+    return FakeWriter()
+
+@pytest.fixture
+def queue(clock, writer):
+    # Long interval: nothing is due for the background thread, tests flush explicitly
+    queue = save_queue.SaveQueue(writer, interval=3600, max_delay=3600)
+    yield queue
+    # Leave nothing for the thread to flush once the real clock is back
+    queue.discard("p1")
+
+def test_burst_of_saves_is_coalesced(queue, writer):
+    for version in range(3):
+        queue.submit("p1", {"scenes": [version]})
+    assert queue.flush("p1")
+    assert writer.writes == [("p1", "scenes", [2])]
+    status = queue.get_status("p1")
+    assert (status["state"], status["submits"], status["coalesced"]) == ("saved", 3, 2)
+
+def test_unchanged_sections_are_skipped(queue, writer):
+    queue.submit("p1", {"scenes": [1], "analysis": {"a": 1}})
+    queue.flush("p1")
+    queue.submit("p1", {"scenes": [1], "analysis": {"a": 2}})
+    queue.flush("p1")
+    assert [section for _, section, _ in writer.writes] == ["scenes", "analysis", "analysis"]
+    assert queue.get_status("p1")["sections_skipped"] == 1
+
+def test_newer_submit_during_flush_stays_pending(queue, writer):
+    writer.during_write = lambda: queue.submit("p1", {"scenes": ["newer"]})
+    queue.submit("p1", {"scenes": ["older"]})
+    assert queue.flush("p1")
+    assert queue.get_status("p1")["state"] == "pending"
+    assert queue.flush("p1")
+    assert writer.writes == [("p1", "scenes", ["older"]), ("p1", "scenes", ["newer"])]
+    assert queue.get_status("p1")["state"] == "saved"
+
+def test_failed_flush_backs_off_and_keeps_the_save(queue, writer, clock):
+    writer.failing = True
+    queue.submit("p1", {"scenes": [1]})
+    delays = []
+    for _ in range(7):
+        assert not queue.flush("p1")
+        delays.append(queue.get_status("p1")["retry_in"])
+    assert delays == [2, 4, 8, 16, 32, 60, 60]
+    status = queue.get_status("p1")
+    assert status["state"] == "error" and "scenes" in status["error"]
+
+    writer.failing = False
+    assert queue.flush("p1")
+    assert writer.writes == [("p1", "scenes", [1])]
+    assert queue.get_status("p1")["error"] is None
+
+def test_writer_exception_is_reported(queue, clock):
+    def broken_writer(project_id, section, value):
+        raise RuntimeError("network down")
+    queue.writer = broken_writer
+    queue.submit("p1", {"scenes": [1]})
+    assert not queue.flush("p1")
+    assert queue.get_status("p1")["error"] == "network down"
+
+def test_discard_forgets_the_project(queue, writer):
+    queue.submit("p1", {"scenes": [1]})
+    queue.flush("p1")
+    queue.discard("p1")
+    assert queue.get_status("p1")["state"] == "idle"
+    # Digests are dropped too, so the same state is written again
+    queue.submit("p1", {"scenes": [1]})
+    queue.flush("p1")
+    assert len(writer.writes) == 2
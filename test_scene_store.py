@@ -0,0 +1,99 @@
+"""
+Tests for scene_store.SceneStore (id index, lazy content, LRU eviction)
+Run with: python -m pytest -q test_scene_store.py
+"""
+
+from scene_store import Scene, SceneStore
+
+
+def make_scenes(count, loaded=True):
+    return [Scene(str(n), f"CẢNH {n}", f"nội dung {n}" if loaded else None, n, row_id=f"r{n}")
+            for n in range(count)]
+
+class FakeLoader:
+    """content_loader recording which row ids were fetched."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, row_ids):
+        self.calls.append(list(row_ids))
+        return {row_id: f"nội dung {row_id[1:]}" for row_id in row_ids}
+
+def test_lookup_by_id_follows_inserts_and_deletes():
+    store = SceneStore(make_scenes(3))
+    assert store.position("2") == 2 and store.get("1").header == "CẢNH 1"
+
+    inserted = store.with_scenes([store[0], Scene("0A", "CẢNH 0A", "mới"), store[1], store[2]])
+    assert inserted.position("0A") == 1
+    assert inserted.position("2") == 3
+
+    deleted = inserted.with_scenes([scene for scene in inserted if scene.id != "1"])
+    assert "1" not in deleted
+    assert deleted.get("1") is None
+    assert deleted.position("2") == 2
+
+def test_duplicate_ids_resolve_to_the_first_scene():
+    store = SceneStore([Scene("5", "A", "a"), Scene("5", "B", "b")])
+    assert store.get("5").header == "A"
+    assert store.get(5) is store[0]
+
+def test_replace_with_a_new_id_reindexes():
+    store = SceneStore(make_scenes(3))
+    assert store.replace("1", {"id": "1B", "header": "CẢNH 1B", "content": "x", "original_index": 1})
+    assert store.position("1B") == 1 and "1" not in store
+    assert not store.replace("missing", store[0])
+
+def test_unloaded_scene_is_loaded_with_its_page():
+    loader = FakeLoader()
+    store = SceneStore(make_scenes(6, loaded=False), content_loader=loader, page_size=3)
+    assert store.ensure_loaded(4).content == "nội dung 4"
+    assert loader.calls == [["r3", "r4", "r5"]]
+    assert store.loaded_count() == 3 and not store.fully_loaded
+
+def test_least_recently_used_content_is_evicted_at_capacity():
+    loader = FakeLoader()
+    store = SceneStore(make_scenes(4, loaded=False), content_loader=loader, page_size=1, cache_size=2)
+    store.ensure_loaded(0)
+    store.ensure_loaded(1)
+    store.ensure_loaded(0)        # 0 is now more recent than 1
+    store.ensure_loaded(2)
+    assert [scene.content is not None for scene in store] == [True, False, True, False]
+
+def test_evicted_scene_is_reloaded():
+    loader = FakeLoader()
+    store = SceneStore(make_scenes(3, loaded=False), content_loader=loader, page_size=1, cache_size=1)
+    store.ensure_loaded(0)
+    store.ensure_loaded(1)
+    assert store[0].content is None
+    assert store.ensure_loaded(0).content == "nội dung 0"
+    assert loader.calls == [["r0"], ["r1"], ["r0"]]
+
+def test_edited_content_is_never_evicted():
+    loader = FakeLoader()
+    store = SceneStore(make_scenes(3, loaded=False), content_loader=loader, page_size=1, cache_size=1)
+    store.ensure_loaded(0)
+    store.update_content("0", "đã sửa")
+    store.ensure_loaded(1)
+    store.ensure_loaded(2)
+    assert store[0].content == "đã sửa"
+    assert store[1].content is None
+
+def test_load_all_stops_eviction():
+    loader = FakeLoader()
+    store = SceneStore(make_scenes(5, loaded=False), content_loader=loader, page_size=2, cache_size=1)
+    store.load_all()
+    store.ensure_loaded(4)
+    assert store.fully_loaded and store.to_dicts()[0]["content"] == "nội dung 0"
+
+def test_version_changes_with_content():
+    store = SceneStore(make_scenes(2))
+    version = store.version
+    store.update_content("0", "khác")
+    assert store.version != version
+    assert store.with_scenes(list(store)).version != store.version
+
+def test_scenes_are_hashable_and_compare_by_content_explicitly():
+    first, second = Scene("1", "H", "c"), Scene("1", "H", "c")
+    assert len({first, second}) == 2
+    assert first.to_dict() == second.to_dict()
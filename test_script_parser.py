@@ -0,0 +1,320 @@
+"""
+Golden-output tests for script_parser
+Run with: python -m pytest -q test_script_parser.py
+"""
+
+import random
+import re
+
+import script_parser
+
+
+# ============================================================================
+# REFERENCE IMPLEMENTATION (parse_scenes before the single-pass scanner)
+# ============================================================================
+
+def reference_clean_text(raw_text):
+    lines = raw_text.split('\n')
+    cleaned_lines = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.isdigit():
+            continue
+        if stripped.lower().startswith("page ") and len(stripped.split()) == 2:
+            continue
+        cleaned_lines.append(stripped)
+    return '\n'.join(cleaned_lines)
+
+def reference_parse_scenes(full_text):
+    cleaned_text = reference_clean_text(full_text)
+    lines = cleaned_text.split('\n')
+
+    scenes = []
+    current_scene_lines = []
+    current_header = None
+    current_scene_id = None
+    auto_counter = 0
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        is_header = False
+        extracted_id = None
+        clean_header = stripped
+
+        layer1_match = re.match(r'^(.*?)\s+([0-9]+[A-Z]?)\s+\2\s*$', stripped)
+        if layer1_match:
+            is_header = True
+            extracted_id = layer1_match.group(2)
+            clean_header = layer1_match.group(1).strip()
+
+        if not is_header:
+            layer2_pattern = r'^\s*(?:CẢNH|SCENE|PHÂN ĐOẠN|INT\.|EXT\.|NỘI\.|NGOẠI\.|I\/E\.|BỐI CẢNH).*$'
+            if re.match(layer2_pattern, stripped, re.IGNORECASE):
+                is_header = True
+                id_match = re.search(r'(\d+[A-Z]*)\s*$', stripped)
+                if id_match:
+                    extracted_id = id_match.group(1)
+                    clean_header = stripped[:id_match.start()].strip()
+                    clean_header = re.sub(r'([A-ZĂÂĐÊÔƠƯÁÀẢÃẠÉÈẺẼẸÍÌỈĨỊÓÒỎÕỌÚÙỦŨỤÝỲỶỸỴ]+)(\d+)', r'\1', clean_header)
+                    clean_header = ' '.join(clean_header.split())
+                else:
+                    extracted_id = None
+                    clean_header = stripped
+
+        if not is_header:
+            if stripped.isupper() and any(char.isdigit() for char in stripped):
+                is_header = True
+                id_match = re.search(r'(\d+[A-Z]*)\s*$', stripped)
+                if id_match:
+                    extracted_id = id_match.group(1)
+                    clean_header = stripped[:id_match.start()].strip()
+                else:
+                    extracted_id = None
+                    clean_header = stripped
+
+        if is_header:
+            if current_header is not None:
+                scenes.append({
+                    "id": current_scene_id,
+                    "header": current_header,
+                    "content": '\n'.join(current_scene_lines).strip(),
+                    "original_index": len(scenes)
+                })
+            auto_counter += 1
+            current_scene_id = extracted_id if extracted_id else f"AUTO_{auto_counter}"
+            current_header = clean_header
+            current_scene_lines = []
+        else:
+            if current_header is not None:
+                current_scene_lines.append(stripped)
+
+    if current_header is not None:
+        scenes.append({
+            "id": current_scene_id,
+            "header": current_header,
+            "content": '\n'.join(current_scene_lines).strip(),
+            "original_index": len(scenes)
+        })
+
+    if not scenes:
+        return [{
+            "id": "AUTO_1",
+            "header": "UNKNOWN SCENE",
+            "content": cleaned_text,
+            "original_index": 0
+        }]
+
+    return scenes
+
+
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+SAMPLE_VI = """
+HEO NĂM MÓNG
+Kịch bản: Draft 1
+
+1. NGOẠI. SÂN ĐÌNH - ĐÊM11 11
+Gió rít qua hàng tre. KHẢI (30) bước chậm.
+KHẢI
+Có ai ở đó không?
+
+Page 2
+2
+CẢNH 12: NỘI. NHÀ BÀ NĂM - NGÀY12
+Bà Năm ngồi bên bếp lửa.
+BÀ NĂM
+Con về rồi đó hả?
+nội. bếp - đêm
+Ánh lửa bập bùng.
+BỐI CẢNH 14A
+PHÂN ĐOẠN 3
+EXT. RICE FIELD - DAWN 15 15
+Sương mù dày đặc.
+"""
+
+SAMPLE_EN = """
+INT. WAREHOUSE - NIGHT 1
+Rain hammers the roof.
+JOHN (40s)
+We shouldn't be here.
+   EXT. STREET - DAY23
+Cars pass.
+I/E. CAR - CONTINUOUS
+SCENE 7B
+CUT TO: 9
+CLOSE ON THE DOOR 12A 12A
+page 14
+14
+The door creaks open.
+"""
+
+WORDS = ["KHẢI", "bà", "Năm", "NIGHT", "đêm", "INT.", "EXT.", "nội.", "CẢNH", "scene",
+         "12", "12", "7B", "3a", "Page", "page", "-", "I/E.", "BỐI", "CẢNH", "Ⅻ", "²",
+         "NGÀY11", "(30)", "...", "PHÂN", "ĐOẠN", "A", "b", "  ", "\t", "\r"]
+
+
+def random_script(seed, n_lines=400):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(n_lines):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))))
+    return "\n".join(lines)
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+def test_clean_text_matches_reference():
+    for text in (SAMPLE_VI, SAMPLE_EN, random_script(1)):
+        assert script_parser.clean_text(text) == reference_clean_text(text)
+
+def test_parse_scenes_matches_reference_on_samples():
+    for text in (SAMPLE_VI, SAMPLE_EN, SAMPLE_VI + SAMPLE_EN):
+        assert script_parser.parse_scenes(text) == reference_parse_scenes(text)
+
+def test_parse_scenes_matches_reference_on_random_scripts():
+    for seed in range(200):
+        text = random_script(seed)
+        assert script_parser.parse_scenes(text) == reference_parse_scenes(text), seed
+
+def test_parse_scenes_fallback_matches_reference():
+    for text in ("", "\n\n", "just some prose\nwith no headers\n3\nPage 4"):
+        assert script_parser.parse_scenes(text) == reference_parse_scenes(text)
+
+def test_classify_line_layers():
+    assert script_parser.classify_line("1. KHU RỪNG - ĐÊM 11 11") == ("11", "1. KHU RỪNG - ĐÊM")
+    assert script_parser.classify_line("INT. HOUSE - NIGHT11 11") == ("11", "INT. HOUSE - NIGHT")
+    assert script_parser.classify_line("CẢNH 12: NỘI. NHÀ - NGÀY12") == ("12", "CẢNH 12: NỘI. NHÀ - NGÀY")
+    assert script_parser.classify_line("nội. bếp - đêm") == (None, "nội. bếp - đêm")
+    assert script_parser.classify_line("CLOSE ON 5 DOOR") == (None, "CLOSE ON 5 DOOR")
+    assert script_parser.classify_line("He opens the door.") is None
+
+def test_streaming_pages_match_parse_scenes():
+    for text in (SAMPLE_VI, SAMPLE_EN, random_script(7), "no headers here\n12"):
+        lines = text.split('\n')
+        pages = ['\n'.join(lines[i:i + 5]) for i in range(0, len(lines), 5)]
+        assert list(script_parser.iter_scenes_from_pages(pages)) == reference_parse_scenes(text)
+
+def test_scene_builder_emits_scene_when_next_header_arrives():
+    builder = script_parser.SceneBuilder()
+    assert list(builder.feed_text("INT. HOUSE - NIGHT 1\nRain.")) == []
+    closed = list(builder.feed_text("EXT. STREET - DAY 2"))
+    assert closed == [{"id": "1", "header": "INT. HOUSE - NIGHT", "content": "Rain.", "original_index": 0}]
+    assert builder.finish()[0]["id"] == "2"
+
+def test_parser_settings_toggle_layers():
+    default = script_parser.parse_scenes(SAMPLE_EN)
+    assert script_parser.parse_scenes(SAMPLE_EN, settings={}) == default
+    no_layer3 = script_parser.parse_scenes(SAMPLE_EN, settings={"layer3": False})
+    assert "CUT TO:" not in [s["header"] for s in no_layer3]
+    extra = script_parser.parse_scenes("FLASHBACK 4\nOld house.", settings={"extra_keywords": ["flashback"]})
+    assert extra[0]["id"] == "4"
+
+BODY_WORDS = ["khải", "bước", "chậm", "rain", "falls", "12a", "page", "Page 3", "  ", "(30)", "..."]
+
+def random_blocks(seed, n_blocks=30):
+    """Raw script as header-led blocks, so each block is the source of one scene."""
+    rng = random.Random(seed)
+    headers = ["INT. HOUSE - NIGHT {n}", "CẢNH {n}: NGOẠI. SÂN - ĐÊM", "EXT. ROAD - DAY",
+               "NỘI. BẾP {n} {n}", "PHÂN ĐOẠN", "CLOSE ON {n}A"]
+    blocks = []
+    for n in range(n_blocks):
+        body = [" ".join(rng.choice(BODY_WORDS) for _ in range(rng.randint(0, 6))) for _ in range(rng.randint(0, 4))]
+        blocks.append("\n".join([rng.choice(headers).format(n=n + 1)] + body))
+    return blocks
+
+def test_reparse_scenes_matches_full_parse():
+    rng = random.Random(3)
+    for seed in range(100):
+        blocks = random_blocks(seed)
+        preamble = "TITLE PAGE\nwritten by"
+        scenes = script_parser.parse_scenes("\n".join([preamble] + blocks))
+        assert len(scenes) == len(blocks)
+
+        k = rng.randrange(len(blocks))
+        edited = blocks[k].split("\n")
+        insert_at = rng.randint(0, len(edited))
+        edited[insert_at:insert_at] = rng.choice([["EXT. NEW PLACE - DAY", "new action"], ["SCENE 99"], ["just text"], []])
+        edited_block = "\n".join(edited)
+
+        expected = script_parser.parse_scenes("\n".join([preamble] + blocks[:k] + [edited_block] + blocks[k + 1:]))
+        assert script_parser.reparse_scenes(scenes, k, k + 1, edited_block) == expected, seed
+
+def test_split_scene_on_typed_header():
+    blocks = ["PHÂN ĐOẠN", "a", "EXT. ROAD - DAY", "b", "CẢNH 5", "c"]
+    scenes = script_parser.parse_scenes("\n".join(blocks))
+    result = script_parser.split_scene(scenes, 0, "a\n\n12\nINT. CAR - NIGHT\nd\nCẢNH 5\ne")
+    # Existing ids never change; new scenes get their number or a fresh id
+    assert [s["id"] for s in result] == ["AUTO_1", "AUTO_1.1", "AUTO_1.2", "AUTO_2", "5"]
+    assert [s["original_index"] for s in result] == [0, 1, 2, 3, 4]
+    # Lines before the first heading are kept exactly as typed
+    assert result[0]["content"] == "a\n\n12"
+    assert (result[1]["header"], result[1]["content"]) == ("INT. CAR - NIGHT", "d")
+    assert script_parser.split_scene(scenes, 0, "no heading here") is None
+
+SAMPLE_FOUNTAIN = """Title: Bóng Đêm
+Author: Test
+
+FADE IN:
+
+INT. NHÀ BÀ NĂM - ĐÊM #12#
+
+Bà Năm ngồi bên bếp lửa. [[ghi chú]]
+
+BÀ NĂM
+Con về rồi đó hả?
+
+/* cảnh bị bỏ
+EXT. BOGUS - DAY
+*/
+# ACT II
+= tóm tắt
+
+.FLASHBACK
+
+>THE END<
+ext. river - dawn
+"""
+
+SAMPLE_FDX = """<?xml version="1.0" encoding="UTF-8"?>
+<FinalDraft DocumentType="Script" Version="5">
+  <Content>
+    <Paragraph Type="Action"><Text>COLD OPEN</Text></Paragraph>
+    <Paragraph Number="7" Type="Scene Heading"><Text>INT. KITCHEN </Text><Text>- NIGHT</Text></Paragraph>
+    <Paragraph Type="Character"><Text>MARY</Text></Paragraph>
+    <Paragraph Type="Dialogue"><Text>Stay inside tonight.</Text></Paragraph>
+    <Paragraph Type="Scene Heading"><Text>EXT. ROAD - DAY</Text></Paragraph>
+    <Paragraph Type="Action"><Text>Rain.</Text></Paragraph>
+  </Content>
+  <TitlePage><Content><Paragraph Type="Scene Heading"><Text>NOT A SCENE</Text></Paragraph></Content></TitlePage>
+</FinalDraft>
+"""
+
+def test_fountain_import():
+    import screenplay_formats
+    scenes = list(screenplay_formats.iter_structured_scenes("a.fountain", SAMPLE_FOUNTAIN.encode("utf-8")))
+    assert [(s["id"], s["header"]) for s in scenes] == [("12", "INT. NHÀ BÀ NĂM - ĐÊM"), ("AUTO_2", "FLASHBACK")]
+    assert scenes[0]["content"] == "Bà Năm ngồi bên bếp lửa.\nBÀ NĂM\nCon về rồi đó hả?"
+    # No blank line before "ext. river" -> not a heading
+    assert scenes[1]["content"] == "THE END\next. river - dawn"
+    assert [s["original_index"] for s in scenes] == [0, 1]
+
+def test_fdx_import():
+    import screenplay_formats
+    scenes = list(screenplay_formats.iter_structured_scenes("a.FDX", SAMPLE_FDX.encode("utf-8")))
+    assert [(s["id"], s["header"]) for s in scenes] == [("7", "INT. KITCHEN - NIGHT"), ("AUTO_2", "EXT. ROAD - DAY")]
+    assert scenes[0]["content"] == "MARY\nStay inside tonight."
+    assert scenes[1]["content"] == "Rain."
+
+def test_structured_import_without_headings_falls_back():
+    import screenplay_formats
+    scenes = list(screenplay_formats.iter_structured_scenes("a.fountain", b"Just some action.\n"))
+    assert scenes == script_parser.parse_scenes("Just some action.")
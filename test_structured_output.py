@@ -0,0 +1,54 @@
+"""
+Tests for structured_output's local JSON repair and schema checks
+Run with: python -m pytest -q test_structured_output.py
+"""
+
+import json
+
+import pytest
+
+import structured_output
+
+
+def test_valid_json_is_returned_as_is():
+    assert structured_output.repair_json('{"a": [1, 2]}') == ['{"a": [1, 2]}']
+
+def test_code_fence_and_chatter_are_removed():
+    text = 'Đây là kết quả:\n```json\n{"score": 8}\n```\nHy vọng hữu ích!'
+    assert structured_output.parse_json(text) == {"score": 8}
+
+def test_trailing_commas_are_dropped():
+    assert structured_output.parse_json('{"items": [1, 2, ], "b": 3, }') == {"items": [1, 2], "b": 3}
+
+def test_raw_control_characters_in_strings_are_escaped():
+    assert structured_output.parse_json('{"text": "dòng 1\ndòng 2\tcột\r"}') == {"text": "dòng 1\ndòng 2\tcột"}
+
+def test_escaped_quotes_do_not_end_the_string():
+    assert structured_output.parse_json(r'{"line": "Anh ấy nói \"chào\" {", "n": 1}') == {"line": 'Anh ấy nói "chào" {', "n": 1}
+
+def test_truncated_output_is_closed_first():
+    candidates = structured_output.repair_json('{"tasks": [{"id": "1", "title": "Sửa cảnh')
+    assert json.loads(candidates[0]) == {"tasks": [{"id": "1", "title": "Sửa cảnh"}]}
+
+def test_truncated_output_can_be_cut_back_to_the_last_complete_element():
+    candidates = structured_output.repair_json('[{"id": "1"}, {"id": "2"}, {"id": "3", "ti')
+    parsed = [json.loads(candidate) for candidate in candidates if _is_json(candidate)]
+    assert [{"id": "1"}, {"id": "2"}] in parsed
+
+def test_no_json_raises():
+    with pytest.raises(structured_output.StructuredOutputError):
+        structured_output.repair_json("Xin lỗi, tôi không thể trả lời.")
+
+def test_parse_structured_drops_incomplete_array_items():
+    schema = {"type": "array", "items": {"type": "object", "required": ["id", "title"],
+                                         "properties": {"id": {"type": "string"}, "title": {"type": "string"}}}}
+    data, errors = structured_output.parse_structured('[{"id": 1, "title": "a"}, {"id": "2", "ti', schema)
+    assert data == [{"id": "1", "title": "a"}]
+    assert errors == ["$: dropped 1 incomplete item(s)"]
+
+def _is_json(text):
+    try:
+        json.loads(text)
+        return True
+    except json.JSONDecodeError:
+        return False
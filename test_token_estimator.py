@@ -0,0 +1,89 @@
+"""
+Tests for token_estimator calibration and budget checks (files under tmp_path)
+Run with: python -m pytest -q test_token_estimator.py
+"""
+
+import math
+
+import pytest
+
+import token_estimator
+import utils
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_estimator, "CALIBRATION_PATH", str(tmp_path / "token_calibration.json"))
+    monkeypatch.setattr(token_estimator, "SPEND_PATH", str(tmp_path / "project_spend.json"))
+    monkeypatch.setattr(token_estimator, "DEFAULT_BUDGET_USD", 0.0)
+    monkeypatch.setattr(token_estimator, "_STATE", {"calibration": None, "spend": None})
+
+def test_raw_count_weights_vietnamese_syllables():
+    assert token_estimator.count_tokens_raw("hello world") == 4
+    assert token_estimator.count_tokens_raw("chào thế giới") == 6
+    assert token_estimator.count_tokens_raw("") == 0
+
+def test_input_ratio_follows_an_ewma_of_real_usage():
+    prompt = "một hai ba bốn năm " * 20
+    raw = token_estimator.count_tokens_raw(prompt)
+    assert token_estimator.count_tokens(prompt) == raw
+
+    token_estimator.observe(prompt, input_tokens=raw * 2, output_tokens=0)
+    assert token_estimator._calibration()["input_ratio"] == pytest.approx(1.2)
+    token_estimator.observe(prompt, input_tokens=raw * 2, output_tokens=0)
+    assert token_estimator._calibration()["input_ratio"] == pytest.approx(1.36)
+    assert token_estimator.count_tokens(prompt) == int(raw * 1.36)
+
+def test_output_tokens_are_calibrated_per_kind():
+    token_estimator.observe("prompt", input_tokens=1, output_tokens=1700, kind="map")
+    assert token_estimator.estimate_call(100, "map")["output_tokens"] == 900   # 700 + 0.2 * 1000
+    assert token_estimator.estimate_call(100, "summary")["output_tokens"] == 500
+
+def test_calibration_is_persisted(tmp_path, monkeypatch):
+    token_estimator.observe("prompt", input_tokens=10, output_tokens=100, seconds=3.0, kind="refine")
+    monkeypatch.setattr(token_estimator, "_STATE", {"calibration": None, "spend": None})
+    stored = utils.load_json(token_estimator.CALIBRATION_PATH)
+    assert stored["samples"] == 1
+    assert token_estimator._calibration()["output_tokens"]["refine"] == stored["output_tokens"]["refine"]
+
+def test_combine_parallel_runs_in_waves():
+    calls = [token_estimator.estimate_call(1000, output_tokens=100) for _ in range(5)]
+    sequential = token_estimator.combine(calls)
+    parallel = token_estimator.combine(calls, parallel=True, concurrency=2)
+    assert sequential["input_tokens"] == parallel["input_tokens"] == 5000
+    assert parallel["seconds"] == pytest.approx(calls[0]["seconds"] * 3)
+    assert sequential["seconds"] == pytest.approx(calls[0]["seconds"] * 5)
+
+def test_no_budget_means_unlimited():
+    allowed, spend = token_estimator.check_budget("project-1", {"cost_usd": 1_000.0})
+    assert allowed and spend["remaining_usd"] == math.inf
+
+def test_budget_refuses_actions_over_what_is_left():
+    token_estimator.set_budget("project-1", 1.0)
+    token_estimator.record_spend("project-1", 0.9)
+    assert not token_estimator.check_budget("project-1", {"cost_usd": 0.2})[0]
+    allowed, spend = token_estimator.check_budget("project-1", {"cost_usd": 0.05})
+    assert allowed and spend["remaining_usd"] == pytest.approx(0.1)
+    # Other projects have their own ledger
+    assert token_estimator.get_spend("project-2")["spent_usd"] == 0.0
+
+def test_sessions_without_a_project_have_their_own_ledger():
+    first, second = {}, {}
+    assert token_estimator.ledger_key({"current_project_id": "project-1"}) == "project-1"
+    assert token_estimator.ledger_key(first) != token_estimator.ledger_key(second)
+    assert token_estimator.ledger_key(first) == token_estimator.ledger_key(first)
+    token_estimator.record_spend(token_estimator.ledger_key(first), 0.5)
+    assert token_estimator.get_spend(token_estimator.ledger_key(second))["spent_usd"] == 0.0
+
+def test_idle_local_entries_are_pruned(monkeypatch):
+    monkeypatch.setattr(token_estimator, "MAX_LOCAL_ENTRIES", 2)
+    now = 1_000_000.0
+    ledger = {
+        "project-1": {"spent_usd": 1.0, "updated_at": 0},
+        "local:old": {"spent_usd": 0.1, "updated_at": now - token_estimator.LOCAL_SPEND_TTL_SECONDS - 1},
+        "local:a": {"spent_usd": 0.1, "updated_at": now - 3},
+        "local:b": {"spent_usd": 0.1, "updated_at": now - 2},
+        "local:c": {"spent_usd": 0.1, "updated_at": now - 1},
+    }
+    token_estimator._prune_local(ledger, now)
+    assert sorted(ledger) == ["local:b", "local:c", "project-1"]
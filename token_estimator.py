@@ -0,0 +1,236 @@
+"""
+Local token / cost / latency estimates for Gemini calls
+A fast heuristic counter (no API call) whose bias is corrected over time:
+every finished call reports its real usage_metadata and latency, and an
+EWMA of actual / estimated tokens, output size per kind of call and output
+speed is kept in data/token_calibration.json.
+
+Also holds the per-project spend ledger used to refuse actions that would
+go over the project's budget (PROJECT_BUDGET_USD, 0 = no limit).
+"""
+
+import functools
+import math
+import os
+import re
+import threading
+import time
+
+import utils
+
+CALIBRATION_PATH = os.path.join(utils.DATA_DIR, "token_calibration.json")
+SPEND_PATH = os.path.join(utils.DATA_DIR, "project_spend.json")
+DEFAULT_BUDGET_USD = float(os.getenv("PROJECT_BUDGET_USD", "0"))   # 0 = no limit
+LOCAL_PROJECT = "local"   # prefix for sessions without a Supabase project
+# Ledger entries of sessions without a project are dropped once idle this long,
+# and only the most recent ones are kept
+LOCAL_SPEND_TTL_SECONDS = 7 * 24 * 3600
+MAX_LOCAL_ENTRIES = 50
+
+EWMA_ALPHA = 0.2
+
+# Instructions wrapped around the script text by ai_engine / character_engine
+PROMPT_OVERHEAD_TOKENS = 700
+
+# Starting points until real calls have been observed
+DEFAULT_OUTPUT_TOKENS = {
+    "map": 700,
+    "creative": 1800,
+    "marketing": 1500,
+    "summary": 500,
+    "action_plan": 1500,
+    "brainstorm": 900,
+    "dialogue_fix": 500,
+    "refine": 600,
+    "ai_fix": 700,
+    "character": 1200,
+    "other": 800,
+}
+DEFAULT_BASE_SECONDS = 1.5
+DEFAULT_SECONDS_PER_OUTPUT_TOKEN = 1 / 120
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Memoized counts: one per scene plus chunk / whole-script texts
+COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))
+
+_LOCK = threading.Lock()
+_STATE = {"calibration": None, "spend": None}
+
+# ============================================================================
+# COUNTING
+# ============================================================================
+
+@functools.lru_cache(maxsize=COUNT_CACHE_SIZE)
+def count_tokens_raw(text):
+    """
+    Uncalibrated count: ASCII words cost ~1 token per 4 characters,
+    Vietnamese syllables (diacritics) ~1 per 2.5, punctuation 1 each.
+    Memoized: the UI re-estimates the same script on every rerun.
+    """
+    tokens = 0
+    for match in TOKEN_PATTERN.finditer(text or ""):
+        word = match.group()
+        if word.isascii():
+            tokens += max(1, math.ceil(len(word) / 4))
+        else:
+            tokens += max(1, math.ceil(len(word) / 2.5))
+    return tokens
+
+def count_tokens(text):
+    """Calibrated local estimate of the prompt tokens Gemini will bill."""
+    return int(count_tokens_raw(text) * _calibration()["input_ratio"])
+
+# ============================================================================
+# CALIBRATION
+# ============================================================================
+
+def _calibration():
+    with _LOCK:
+        if _STATE["calibration"] is None:
+            stored = utils.load_json(CALIBRATION_PATH) if os.path.exists(CALIBRATION_PATH) else {}
+            _STATE["calibration"] = {
+                "input_ratio": stored.get("input_ratio", 1.0),
+                "output_tokens": {**DEFAULT_OUTPUT_TOKENS, **stored.get("output_tokens", {})},
+                "base_seconds": stored.get("base_seconds", DEFAULT_BASE_SECONDS),
+                "seconds_per_output_token": stored.get("seconds_per_output_token", DEFAULT_SECONDS_PER_OUTPUT_TOKEN),
+                "samples": stored.get("samples", 0),
+            }
+        return _STATE["calibration"]
+
+def _ewma(old, new):
+    return old + EWMA_ALPHA * (new - old)
+
+def _save(path, data):
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        utils.save_json(tmp_path, data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Failed to save {path}: {e}")
+
+def observe(prompt_text, input_tokens, output_tokens, seconds=None, kind="other"):
+    """Feed one finished call (usage_metadata + wall time) into the calibration."""
+    raw = count_tokens_raw(prompt_text)
+    calibration = _calibration()
+    with _LOCK:
+        if raw and input_tokens:
+            calibration["input_ratio"] = _ewma(calibration["input_ratio"], input_tokens / raw)
+        if output_tokens:
+            previous = calibration["output_tokens"].get(kind, DEFAULT_OUTPUT_TOKENS["other"])
+            calibration["output_tokens"][kind] = _ewma(previous, output_tokens)
+            if seconds:
+                per_token = max(seconds - calibration["base_seconds"], 0) / output_tokens
+                calibration["seconds_per_output_token"] = _ewma(calibration["seconds_per_output_token"], per_token)
+        calibration["samples"] += 1
+        snapshot = dict(calibration, output_tokens=dict(calibration["output_tokens"]))
+    _save(CALIBRATION_PATH, snapshot)
+
+# ============================================================================
+# ESTIMATES
+# ============================================================================
+
+def cost_usd(input_tokens, output_tokens):
+    return input_tokens / 1_000_000 * utils.PRICE_INPUT_1M + output_tokens / 1_000_000 * utils.PRICE_OUTPUT_1M
+
+def estimate_call(prompt_tokens, kind="other", output_tokens=None):
+    """One call: prompt_tokens is already a (calibrated) count."""
+    calibration = _calibration()
+    if output_tokens is None:
+        output_tokens = int(calibration["output_tokens"].get(kind, DEFAULT_OUTPUT_TOKENS["other"]))
+    return {
+        "calls": 1,
+        "input_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": cost_usd(prompt_tokens, output_tokens),
+        "seconds": calibration["base_seconds"] + output_tokens * calibration["seconds_per_output_token"],
+    }
+
+def estimate_text_call(text, kind="other", output_tokens=None):
+    """A call whose prompt is `text` plus the usual instructions."""
+    return estimate_call(count_tokens(text) + PROMPT_OVERHEAD_TOKENS, kind, output_tokens)
+
+def combine(estimates, parallel=False, concurrency=None):
+    """
+    Totals for several calls. Tokens and cost always add up; time adds up
+    when sequential, or runs in waves of `concurrency` when parallel.
+    """
+    estimates = list(estimates)
+    total = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "seconds": 0.0}
+    for estimate in estimates:
+        for key in ("calls", "input_tokens", "output_tokens", "cost_usd"):
+            total[key] += estimate[key]
+    if not estimates:
+        return total
+    if not parallel:
+        total["seconds"] = sum(e["seconds"] for e in estimates)
+    else:
+        waves = math.ceil(len(estimates) / (concurrency or len(estimates)))
+        total["seconds"] = max(e["seconds"] for e in estimates) * waves
+    return total
+
+def with_rate_limit(estimate, requests_per_minute, burst):
+    """Calls beyond the scheduler's burst wait for the token bucket."""
+    throttled = max(estimate["calls"] - burst, 0) * 60.0 / requests_per_minute
+    return dict(estimate, seconds=max(estimate["seconds"], throttled))
+
+# ============================================================================
+# PER-PROJECT SPEND & BUDGET
+# ============================================================================
+
+def _ledger():
+    with _LOCK:
+        if _STATE["spend"] is None:
+            _STATE["spend"] = utils.load_json(SPEND_PATH) if os.path.exists(SPEND_PATH) else {}
+            _prune_local(_STATE["spend"])
+        return _STATE["spend"]
+
+def _prune_local(ledger, now=None):
+    """Drop entries of past sessions without a project (their ids are never reused)."""
+    now = time.time() if now is None else now
+    local = sorted((key for key in ledger if key.startswith(f"{LOCAL_PROJECT}:")),
+                   key=lambda key: ledger[key].get("updated_at", 0), reverse=True)
+    for position, key in enumerate(local):
+        if position >= MAX_LOCAL_ENTRIES or now - ledger[key].get("updated_at", 0) > LOCAL_SPEND_TTL_SECONDS:
+            del ledger[key]
+
+def ledger_key(state):
+    """Ledger entry of a session: its open project, else its own local entry."""
+    return state.get('current_project_id') or f"{LOCAL_PROJECT}:{utils.get_session_id(state)}"
+
+def _project_entry(project_id):
+    ledger = _ledger()
+    with _LOCK:
+        return ledger.setdefault(project_id or LOCAL_PROJECT, {"spent_usd": 0.0, "budget_usd": DEFAULT_BUDGET_USD})
+
+def _update_entry(project_id, **changes):
+    entry = _project_entry(project_id)
+    with _LOCK:
+        entry.update(changes, updated_at=time.time())
+        snapshot = {k: dict(v) for k, v in _STATE["spend"].items()}
+    _save(SPEND_PATH, snapshot)
+
+def record_spend(project_id, usd):
+    """Called by utils.update_cost_session after every billed call."""
+    entry = _project_entry(project_id)
+    with _LOCK:
+        entry["spent_usd"] += usd
+        entry["updated_at"] = time.time()
+        _prune_local(_STATE["spend"])
+        snapshot = {k: dict(v) for k, v in _STATE["spend"].items()}
+    _save(SPEND_PATH, snapshot)
+
+def get_spend(project_id):
+    """{"spent_usd", "budget_usd", "remaining_usd"}; budget 0 means unlimited."""
+    entry = dict(_project_entry(project_id))
+    budget = entry.get("budget_usd") or 0.0
+    entry["remaining_usd"] = budget - entry["spent_usd"] if budget else math.inf
+    return entry
+
+def set_budget(project_id, usd):
+    _update_entry(project_id, budget_usd=max(float(usd), 0.0))
+
+def check_budget(project_id, estimate):
+    """Returns (allowed, spend) for running an action with this estimate."""
+    spend = get_spend(project_id)
+    return estimate["cost_usd"] <= spend["remaining_usd"], spend
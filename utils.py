@@ -1,5 +1,7 @@
 import os
 import json
+import threading
+import uuid
 
 DATA_DIR = "data"
 PROJECTS_FILE = os.path.join(DATA_DIR, "projects.json")
@@ -25,12 +27,21 @@ def load_json(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def get_session_id(state):
+    """Stable id of one browser session, for per-session files when no project is open."""
+    if not state.get('local_session_id'):
+        state['local_session_id'] = uuid.uuid4().hex
+    return state['local_session_id']
+
 import streamlit as st
 
 # Pricing for Gemini 2.5 Flash (Estimated)
 PRICE_INPUT_1M = 0.075   # $0.075 / 1M tokens
 PRICE_OUTPUT_1M = 0.30   # $0.30 / 1M tokens
 
+# Analysis passes can finish on different threads at the same time
+_COST_LOCK = threading.Lock()
+
 def update_cost_session(input_tokens, output_tokens):
     """Accumulate cost into session state"""
     # 1. Calculate current cost
@@ -38,24 +49,29 @@ def update_cost_session(input_tokens, output_tokens):
     cost_out = (output_tokens / 1_000_000) * PRICE_OUTPUT_1M
     total_new_cost = cost_in + cost_out
 
-    # 2. Initialize if not exists
-    if 'cost_stats' not in st.session_state:
-        st.session_state['cost_stats'] = {
-            'total_input': 0,
-            'total_output': 0,
-            'total_usd': 0.0,
-            'request_count': 0
-        }
+    with _COST_LOCK:
+        # 2. Initialize if not exists
+        if 'cost_stats' not in st.session_state:
+            st.session_state['cost_stats'] = {
+                'total_input': 0,
+                'total_output': 0,
+                'total_usd': 0.0,
+                'request_count': 0
+            }
 
-    # 3. Accumulate
-    stats = st.session_state['cost_stats']
-    stats['total_input'] += input_tokens
-    stats['total_output'] += output_tokens
-    stats['total_usd'] += total_new_cost
-    stats['request_count'] += 1
+        # 3. Accumulate
+        stats = st.session_state['cost_stats']
+        stats['total_input'] += input_tokens
+        stats['total_output'] += output_tokens
+        stats['total_usd'] += total_new_cost
+        stats['request_count'] += 1
+        
+        # 4. Auto-save
+        save_session_state(st.session_state)
     
-    # 4. Auto-save
-    save_session_state(st.session_state)
+    # 5. Per-project spend (budget checks before expensive actions)
+    import token_estimator
+    token_estimator.record_spend(token_estimator.ledger_key(st.session_state), total_new_cost)
 
 def save_session_state(state_dict):
     """Save current session state to file. Accepts a dictionary of state."""
@@ -64,6 +80,14 @@ def save_session_state(state_dict):
         keys_to_save = ['scene_list', 'analysis_results', 'analysis_report', 'action_plan', 'user_strategy', 'cost_stats']
         data = {k: state_dict.get(k) for k in keys_to_save if state_dict.get(k) is not None}
         
+        # SceneStore -> plain dicts for JSON. A lazily opened project without all
+        # its content is not written: it reloads from the database instead
+        if hasattr(data.get('scene_list'), 'to_dicts'):
+            if data['scene_list'].fully_loaded:
+                data['scene_list'] = data['scene_list'].to_dicts()
+            else:
+                data.pop('scene_list')
+        
         save_json(SESSION_FILE, data)
     except Exception as e:
         print(f"Error saving session: {e}")